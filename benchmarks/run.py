@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: benchmarks.run
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+This script drives :py:class:`cnxman.serial.SerialConnection` through a stand-in for a real serial device (a
+pseudo-terminal pair or pyserial's ``loop://`` URL) and writes what it measures as JSON, so that results from different
+releases can be compared.
+
+.. code-block:: bash
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline results.json   # Exits with 1 if anything got noticeably worse.
+
+The ``memory`` benchmark doesn't need a device at all:  it measures what a connection costs to keep around, and what a
+data signal costs to send (as a keyword-argument signal and as a reusable :py:class:`cnxman.events.Event`).
+"""
+
+import argparse
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import cnxman
+from cnxman.basics import ConnectionManager, ManagerState
+from cnxman.events import dispatcher, Event
+from cnxman.framing import FixedSizeFrameDecoder
+from cnxman.scheduling import Backoff, Scheduler
+from cnxman.serial import SerialConnection
+
+HIGHER_IS_BETTER = 'higher'  #: a metric for which bigger numbers are better
+LOWER_IS_BETTER = 'lower'  #: a metric for which smaller numbers are better
+
+#: the direction in which each metric improves
+DIRECTIONS = {
+    'bytes_per_sec': HIGHER_IS_BETTER,
+    'cpu_sec_per_mb': LOWER_IS_BETTER,
+    'p50_us': LOWER_IS_BETTER,
+    'p90_us': LOWER_IS_BETTER,
+    'p99_us': LOWER_IS_BETTER,
+    'max_us': LOWER_IS_BETTER,
+    'mean_ms': LOWER_IS_BETTER,
+    'max_ms': LOWER_IS_BETTER,
+    'bytes_per_connection': LOWER_IS_BETTER,
+    'send_ns': LOWER_IS_BETTER,
+    'send_bytes': LOWER_IS_BETTER,
+    'send_event_ns': LOWER_IS_BETTER,
+    'send_event_bytes': LOWER_IS_BETTER,
+}
+
+
+class Transport(object):
+    """
+    This is a stand-in for a serial device:  it gives us a port to which a :py:class:`SerialConnection` can connect and
+    a way to send bytes to it.
+    """
+    def __init__(self, kind: str):
+        """
+
+        :param kind: ``'pty'`` (a pseudo-terminal pair) or ``'loop'`` (pyserial's ``loop://`` URL)
+        :type kind:  ``str``
+        """
+        self.kind = kind
+        self._master = self._slave = None
+        if kind == 'pty':
+            self._master, self._slave = os.openpty()
+            self.port = os.ttyname(self._slave)
+        else:
+            self.port = 'loop://'
+
+    def writer(self, connection: SerialConnection) -> Callable[[bytes], None]:
+        """
+        Get a function that sends bytes to the connection.
+        """
+        if self._master is None:
+            # A loopback port hears whatever is written to it.
+            return connection.serial.write
+
+        def write(data: bytes):
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._master, view):]
+        return write
+
+    def close(self):
+        if self._master is not None:
+            os.close(self._master)
+            os.close(self._slave)
+
+
+def percentile(ordered: List[float], fraction: float) -> float:
+    """
+    Get a percentile (by the nearest-rank method) from a sorted list.
+    """
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def bench_throughput(transport: Transport, megabytes: float, chunk_size: int = 4096) -> Dict[str, float]:
+    """
+    Push a lot of data through a connection as fast as we can.
+    """
+    total = int(megabytes * (1 << 20))
+    received = [0]
+    done = threading.Event()
+
+    def on_data(data):
+        received[0] += len(data)
+        if received[0] >= total:
+            done.set()
+
+    connection = SerialConnection(transport.port)
+    dispatcher.connect(on_data, signal=SerialConnection.Signals.DATA_RECEIVED, sender=connection)
+    connection.try_connect()
+    write = transport.writer(connection)
+    payload = bytes(range(256)) * (chunk_size // 256 + 1)
+    cpu, start = time.process_time(), time.perf_counter()
+    writer = threading.Thread(target=lambda: [write(payload[:min(chunk_size, total - sent)])
+                                              for sent in range(0, total, chunk_size)],
+                              daemon=True)
+    writer.start()
+    done.wait(600)
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    connection.teardown()
+    return {
+        'bytes': received[0],
+        'bytes_per_sec': received[0] / elapsed,
+        'cpu_sec_per_mb': cpu / (received[0] / (1 << 20)),
+    }
+
+
+def bench_latency(transport: Transport, messages: int, interval: float = 0.0005) -> Dict[str, float]:
+    """
+    Send small, timestamped messages one at a time and measure how long each takes to reach a frame subscriber.
+    """
+    latencies = []
+    done = threading.Event()
+
+    def on_frame(frame):
+        latencies.append((time.perf_counter_ns() - int.from_bytes(frame, 'little')) / 1000)
+        if len(latencies) >= messages:
+            done.set()
+
+    connection = SerialConnection(transport.port, frame_decoder=FixedSizeFrameDecoder(8))
+    dispatcher.connect(on_frame, signal=SerialConnection.Signals.FRAME_RECEIVED, sender=connection)
+    connection.try_connect()
+    write = transport.writer(connection)
+    for _ in range(messages):
+        write(time.perf_counter_ns().to_bytes(8, 'little'))
+        time.sleep(interval)
+    done.wait(60)
+    connection.teardown()
+    ordered = sorted(latencies)
+    return {
+        'messages': len(ordered),
+        'p50_us': percentile(ordered, 0.50),
+        'p90_us': percentile(ordered, 0.90),
+        'p99_us': percentile(ordered, 0.99),
+        'max_us': ordered[-1],
+    }
+
+
+def bench_reconnect(transport: Transport, attempts: int) -> Dict[str, float]:
+    """
+    Pull the port out from under a managed connection and measure how long the manager takes to get it back.
+    """
+    scheduler = Scheduler()
+    connection = SerialConnection(transport.port)
+    manager = ConnectionManager(connection, backoff=Backoff(initial=0, jitter=0), scheduler=scheduler)
+    manager.connect()
+    times = []
+    for _ in range(attempts):
+        port = connection.serial
+        start = time.perf_counter()
+        port.close()
+        # We're back when the manager says so and the connection has a new port.
+        while not (manager.state is ManagerState.CONNECTED
+                   and connection.serial is not port and connection.serial is not None):
+            time.sleep(0.0001)
+        times.append((time.perf_counter() - start) * 1000)
+    manager.teardown()
+    scheduler.stop()
+    return {
+        'attempts': len(times),
+        'mean_ms': sum(times) / len(times),
+        'max_ms': max(times),
+    }
+
+
+def bench_memory(connections: int, events: int) -> Dict[str, float]:
+    """
+    Measure how much memory a connection takes up, and how long sending a data signal takes (and how much memory is
+    allocated while it's being sent).
+    """
+    # How much does it cost to keep a connection around?
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [SerialConnection('loop://') for _ in range(connections)]
+    bytes_per_connection = (tracemalloc.get_traced_memory()[0] - before) / len(kept)
+    tracemalloc.stop()
+    del kept
+
+    # How much does it cost to send a signal to a receiver that wants the data?
+    sender = SerialConnection('loop://')
+    signal = SerialConnection.Signals.DATA_RECEIVED
+
+    def on_data(data):
+        pass
+    dispatcher.connect(on_data, signal=signal, sender=sender)
+    data = b'x' * 64
+    event = Event(signal=signal, sender=sender)
+
+    def send():
+        dispatcher.send(signal=signal, sender=sender, data=data)
+
+    def send_event():
+        event.data, event.timestamp = data, time.monotonic_ns()
+        dispatcher.send_event(event)
+
+    def cost(function: Callable[[], None]) -> Dict[str, float]:
+        function()  # (The first one works out the route.)
+        start = time.perf_counter_ns()
+        for _ in range(events):
+            function()
+        elapsed = (time.perf_counter_ns() - start) / events
+        # The high-water mark while a signal is being sent is what it allocated along the way.
+        allocated = 0
+        if hasattr(tracemalloc, 'reset_peak'):  # (It's new in Python 3.9.)
+            tracemalloc.start()
+            samples = min(events, 1000)
+            for _ in range(samples):
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                function()
+                allocated += tracemalloc.get_traced_memory()[1] - current
+            tracemalloc.stop()
+            allocated /= samples
+        return {'ns': elapsed, 'bytes': allocated}
+
+    sent, sent_event = cost(send), cost(send_event)
+    dispatcher.disconnect_sender(sender)
+    return {
+        'bytes_per_connection': bytes_per_connection,
+        'send_ns': sent['ns'],
+        'send_bytes': sent['bytes'],
+        'send_event_ns': sent_event['ns'],
+        'send_event_bytes': sent_event['bytes'],
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Compare results to a baseline.
+
+    :return: a description of each metric that got worse by more than the tolerance
+    """
+    regressions = []
+    for name, metrics in baseline.get('results', {}).items():
+        for metric, before in metrics.items():
+            after = results.get(name, {}).get(metric)
+            direction = DIRECTIONS.get(metric)
+            if after is None or direction is None or not before:
+                continue
+            change = (after - before) / before
+            if (direction == HIGHER_IS_BETTER and change < -tolerance) or \
+                    (direction == LOWER_IS_BETTER and change > tolerance):
+                regressions.append('{name}.{metric}: {before:.6g} -> {after:.6g} ({change:+.1%})'.format(
+                    name=name, metric=metric, before=before, after=after, change=change))
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark cnxman serial connections.')
+    parser.add_argument('--transport', choices=['pty', 'loop'], default='pty' if hasattr(os, 'openpty') else 'loop',
+                        help='the stand-in for a serial device')
+    parser.add_argument('--megabytes', type=float, default=8, help='how much data to push for throughput')
+    parser.add_argument('--messages', type=int, default=2000, help='how many messages to time for latency')
+    parser.add_argument('--reconnects', type=int, default=50, help='how many times to time reconnecting')
+    parser.add_argument('--connections', type=int, default=10000, help='how many connections to weigh')
+    parser.add_argument('--events', type=int, default=200000, help='how many data signals to time')
+    parser.add_argument('--only', action='append', choices=['throughput', 'latency', 'reconnect', 'memory'],
+                        help='run only the named benchmark (may be repeated)')
+    parser.add_argument('--output', help='where to write the results (the default is standard output)')
+    parser.add_argument('--baseline', help='results from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='how much worse (as a fraction) a metric may get before it counts as a regression')
+    args = parser.parse_args(argv)
+
+    benchmarks = {
+        'throughput': lambda t: bench_throughput(t, megabytes=args.megabytes),
+        'latency': lambda t: bench_latency(t, messages=args.messages),
+        'reconnect': lambda t: bench_reconnect(t, attempts=args.reconnects),
+        'memory': lambda t: bench_memory(connections=args.connections, events=args.events),
+    }
+    results = {}
+    for name, benchmark in benchmarks.items():
+        if args.only and name not in args.only:
+            continue
+        transport = Transport(args.transport)
+        try:
+            # Anything the library prints is part of what it costs, but we don't want to read it.
+            with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+                results[name] = benchmark(transport)
+        finally:
+            transport.close()
+    report = {
+        'cnxman': cnxman.__version__,
+        'python': platform.python_version(),
+        # (platform.platform() may start a subprocess, which we'd rather not do with listener threads about.)
+        'platform': '{system}-{release}-{machine}'.format(system=platform.system(),
+                                                           release=platform.release(),
+                                                           machine=platform.machine()),
+        'transport': args.transport,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION {r}'.format(r=regression), file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
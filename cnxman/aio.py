@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.aio
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Connections and connection managers for the :py:mod:`asyncio` crowd.
+"""
+
+from abc import ABCMeta, abstractmethod
+import asyncio
+from cnxman.basics import BaseConnectionManager, Connection, ConnectionException, ManagerState
+from .events import dispatcher
+from .framing import FrameDecoder
+from .logging import loggable_class as loggable
+from .metrics import registry
+from .scheduling import Backoff, CircuitBreaker
+from .serial import SerialConnection
+# pyserial isn't imported until we open a port.  (Type checkers can have it now.)
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import serial as pyserial
+
+
+class AsyncConnection(object):
+    """
+    Extend this class to define a logical connection to something that is driven by an :py:mod:`asyncio` event loop.
+    The expectations are the same as those we have of a :py:class:`cnxman.basics.Connection`, except that the methods
+    are coroutines and must not block the loop.
+
+    :seealso:  :py:func:`AsyncConnection.try_connect`
+    :seealso:  :py:func:`AsyncConnection.disconnect`
+    :seealso:  :py:func:`AsyncConnection.teardown`
+    """
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    async def try_connect(self) -> bool:
+        """
+        Override this method to define the logic by which a connection is made.
+
+        :return: ``True`` if and only if the connection attempt is successful, otherwise ``False``.
+        :rtype:  ``bool``
+        """
+        pass
+
+    @abstractmethod
+    async def disconnect(self):
+        """
+        Override this method to take the steps required to gracefully disconnect.
+        """
+        pass
+
+    @abstractmethod
+    async def teardown(self):
+        """
+        Override this method to release resources when requested.
+        """
+        pass
+
+    def raise_alarm(self):
+        """
+        Raise the alarm to notify anyone who might be interested (like an :py:class:`AsyncConnectionManager`) that
+        there is trouble with the connection.
+
+        :seealso:  :py:attr:`cnxman.basics.Connection.Signals.RAISE_ALARM`
+        """
+        dispatcher.send(signal=Connection.Signals.RAISE_ALARM, sender=self)
+
+
+class AsyncConnectionManager(object):
+    """
+    This object establishes and maintains an :py:class:`AsyncConnection`.  It moves through the same states as a
+    :py:class:`cnxman.basics.ConnectionManager` (and signals each one it enters, with the same
+    :py:attr:`cnxman.basics.BaseConnectionManager.Signals.STATE_CHANGED` signal), backs off and asks a circuit breaker
+    before each attempt to reconnect just as it does, but it never blocks: while it's recovering, it waits for its
+    next attempt in a task on the event loop.
+    """
+    def __init__(self,
+                 connection: AsyncConnection,
+                 backoff: Backoff = None,
+                 breaker: CircuitBreaker = None):
+        """
+
+        :param connection: the connection to manage
+        :type connection:  :py:class:`AsyncConnection`
+        :param backoff: decides how long we wait between attempts to reconnect
+        :type backoff:  :py:class:`cnxman.scheduling.Backoff`
+        :param breaker: the breaker we ask before each attempt to reconnect (the default is the shared breaker)
+        :type breaker:  :py:class:`cnxman.scheduling.CircuitBreaker`
+        """
+        self._connection = connection
+        self._backoff = backoff if backoff is not None else Backoff()
+        self._breaker = breaker if breaker is not None else CircuitBreaker.default()
+        self._attempts = 0  # the number of attempts we've made to recover since we were last connected
+        self._state = ManagerState.READY
+        self._loop: asyncio.AbstractEventLoop = None  # the loop on which we're running
+        self._recovery: asyncio.Task = None  # the task that's waiting to reconnect (if we're recovering)
+        # We want to be notified if the connection raises the alarm.
+        dispatcher.connect(self._handle_connection_raise_alarm,
+                           signal=Connection.Signals.RAISE_ALARM,
+                           sender=self._connection)
+
+    @property
+    def connection(self) -> AsyncConnection:
+        """
+        This is the connection we're managing.
+
+        :rtype: :py:class:`AsyncConnection`
+        """
+        return self._connection
+
+    @property
+    def state(self) -> ManagerState:
+        """
+        This is the manager's current state.
+
+        :rtype: :py:class:`cnxman.basics.ManagerState`
+        """
+        return self._state
+
+    @property
+    def attempts(self) -> int:
+        """
+        This is the number of attempts we've made to recover since we were last connected.
+
+        :rtype: ``int``
+        """
+        return self._attempts
+
+    def _enter(self, state: ManagerState):
+        """
+        Enter a state (and let anybody who's interested know).
+        """
+        previous, self._state = self._state, state
+        dispatcher.send(signal=BaseConnectionManager.Signals.STATE_CHANGED, sender=self, state=state, previous=previous)
+
+    def _require(self, action: str, *states: ManagerState):
+        """
+        Make sure we're in one of the given states.
+
+        :raises ConnectionException: if we're not
+        """
+        if self._state not in states:
+            raise ConnectionException(message='Cannot {action} while {state}.'.format(action=action,
+                                                                                      state=self._state.value),
+                                      inner=None)
+
+    async def connect(self):
+        """
+        Let's get connected.
+        """
+        self._require('connect', ManagerState.READY, ManagerState.RECOVERING)
+        self._loop = asyncio.get_running_loop()
+        self._cancel_recovery()
+        self._enter(ManagerState.CONNECTING)
+        connected = await self._connection.try_connect() if self._connection is not None else False
+        # If somebody raised the alarm (or tore us down) while we were waiting, they've already decided what's next.
+        if self._state is not ManagerState.CONNECTING:
+            return
+        if connected:
+            self._attempts = 0
+            self._enter(ManagerState.CONNECTED)
+        else:
+            self._start_recovery()
+
+    async def disconnect(self):
+        """
+        Release the connection.
+        """
+        self._require('disconnect', ManagerState.CONNECTED, ManagerState.RECOVERING)
+        self._cancel_recovery()
+        self._enter(ManagerState.DISCONNECTED)
+        await self._connection.disconnect()
+
+    async def teardown(self):
+        """
+        Release any resources held by the connection.
+        """
+        self._require('tear down',
+                      ManagerState.READY, ManagerState.CONNECTING, ManagerState.CONNECTED,
+                      ManagerState.RECOVERING, ManagerState.DISCONNECTED)
+        self._cancel_recovery()
+        connected = self._state in (ManagerState.CONNECTING, ManagerState.CONNECTED)
+        self._enter(ManagerState.TORNDOWN)
+        dispatcher.disconnect(self._handle_connection_raise_alarm,
+                              signal=Connection.Signals.RAISE_ALARM,
+                              sender=self._connection)
+        if self._connection is not None:
+            if connected:
+                await self._connection.disconnect()
+            await self._connection.teardown()
+
+    def _handle_connection_raise_alarm(self):
+        """
+        This is a handler for the connection's 'raise alarm' signal.  (The alarm may be raised on any thread, so we
+        pass it along to the loop.)
+
+        :seealso:  :py:class:`cnxman.basics.Connection.Signals`
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._raise_alarm)
+
+    def _raise_alarm(self):
+        """
+        There is trouble with the connection.  If we thought everything was fine, it's time to recover.
+        """
+        if self._state in (ManagerState.CONNECTING, ManagerState.CONNECTED):
+            self._start_recovery()
+
+    def _start_recovery(self):
+        """
+        Go into the 'recovering' state and schedule the next attempt to connect (unless we've run out of attempts).
+        """
+        self._enter(ManagerState.RECOVERING)
+        self._attempts += 1
+        if not self._backoff.exhausted(self._attempts):
+            self._recovery = self._loop.create_task(self._recover(self._backoff.delay(self._attempts)))
+
+    def _cancel_recovery(self):
+        """
+        Cancel the pending attempt to reconnect (if there is one).
+        """
+        if self._recovery is not None and self._recovery is not asyncio.current_task():
+            self._recovery.cancel()
+        self._recovery = None
+
+    async def _recover(self, delay: float):
+        """
+        Wait a bit, then try to reconnect (once the breaker lets us).
+        """
+        await asyncio.sleep(delay)
+        breaker = self._breaker
+        while not breaker.acquire():
+            # Too many attempts are under way (or too many have failed), so we wait our turn.
+            await asyncio.sleep(breaker.retry_after())
+        try:
+            if self._state is ManagerState.RECOVERING:
+                await self.connect()
+        finally:
+            breaker.release(success=self._state is ManagerState.CONNECTED)
+
+
+@loggable()
+class AsyncSerialConnection(AsyncConnection):
+    """
+    This is a serial connection that reads through an :py:mod:`asyncio` event loop instead of a listener thread, so a
+    single thread can service as many ports as you like.  It sends the same signals a :py:class:`cnxman.serial.SerialConnection`
+    sends, and you can also iterate over the data it receives (``async for chunk in connection``).
+
+    Ports that have a file descriptor are watched with the loop's reader callbacks.  Ports that don't (like
+    ``loop://`` URLs) are polled.
+    """
+    Signals = SerialConnection.Signals  #: the signals sent by serial connections
+
+    def __init__(self,
+                 port: str,
+                 baudrate: int = 9600,
+                 bytesize: int = 8,
+                 parity: str = 'N',
+                 stopbits: int = 1,
+                 chunk_size: int = 4096,
+                 frame_decoder: FrameDecoder = None,
+                 queue_size: int = 256,
+                 poll_interval: float = 0.01):
+        """
+
+        :param port: the serial port (or a `pyserial URL <https://pythonhosted.org/pyserial/url_handlers.html>`_)
+        :type port:  ``str``
+        :param baudrate: the baud rate
+        :type baudrate:  ``int``
+        :param bytesize: the number of data bits (e.g. ``serial.EIGHTBITS``)
+        :type bytesize:  ``int``
+        :param parity: the parity checking setting (e.g. ``serial.PARITY_NONE``)
+        :type parity:  ``str``
+        :param stopbits: the number of stop bits (e.g. ``serial.STOPBITS_ONE``)
+        :type stopbits:  ``int``
+        :param chunk_size: the most bytes we read (and deliver) at once
+        :type chunk_size:  ``int``
+        :param frame_decoder: the decoder that turns received data into frames (if you want frames)
+        :type frame_decoder:  :py:class:`cnxman.framing.FrameDecoder`
+        :param queue_size: the number of chunks held for iteration before the oldest are dropped
+        :type queue_size:  ``int``
+        :param poll_interval: how often (in seconds) we check ports that have no file descriptor
+        :type poll_interval:  ``float``
+        """
+        super().__init__()
+        self._port = port  # To what port are we connecting?
+        self._baudrate = baudrate  # What's the rate on the port?
+        self._bytesize = bytesize  # How much is a byte?
+        self._parity = parity  # What's the parity on the port?
+        self._stopbits = stopbits  # How many stop bits?
+        self._chunk_size = chunk_size  # How much do we read at once?
+        self._frame_decoder = frame_decoder  # the decoder that turns received data into frames
+        self._queue_size = queue_size  # How many chunks do we hold for iteration?
+        self._poll_interval = poll_interval  # How often do we check ports that have no file descriptor?
+        self._serial: 'pyserial.Serial' = None  # the open serial port
+        self._loop: asyncio.AbstractEventLoop = None  # the loop that's watching the port
+        self._reader_fd: int = None  # the file descriptor the loop is watching (if there is one)
+        self._poller: asyncio.Task = None  # the task that polls the port (if there's no file descriptor)
+        self._chunks: asyncio.Queue = None  # the chunks waiting to be picked up by an iterator
+        self._dropped = 0  # the number of chunks dropped because nobody picked them up
+
+    @property
+    def serial(self) -> 'pyserial.Serial or None':
+        """
+        This is the open serial port (if there is one).
+
+        :rtype: :py:class:`pyserial.Serial`
+        """
+        return self._serial
+
+    @property
+    def dropped(self) -> int:
+        """
+        This is the number of chunks dropped because no iterator picked them up in time.
+
+        :rtype: ``int``
+        """
+        return self._dropped
+
+    async def try_connect(self) -> bool:
+        """
+        Attempt to connect to the serial port.
+
+        :return: ``True`` if and only if the connection attempt is successful, otherwise ``False``.
+        :rtype:  ``bool``
+        """
+        # If we're already connected, there's nothing more to do here.
+        if self._serial is not None and self._serial.is_open:
+            return True
+        self._loop = asyncio.get_running_loop()
+        import serial as pyserial
+        try:
+            # A timeout of zero means reads never block.
+            serial = pyserial.serial_for_url(self._port,
+                                             baudrate=self._baudrate,
+                                             bytesize=self._bytesize,
+                                             parity=self._parity,
+                                             stopbits=self._stopbits,
+                                             timeout=0,
+                                             do_not_open=True)
+            serial.open()
+        except pyserial.SerialException:
+            self.logger.exception('Could not open serial port %s.', self._port)
+            return False
+        self._serial = serial
+        # Any partial frame left over from a previous connection is no good to us now.
+        if self._frame_decoder is not None:
+            self._frame_decoder.reset()
+        self._chunks = asyncio.Queue(maxsize=self._queue_size)
+        # If the port has a file descriptor, the loop can tell us when there's something to read.
+        try:
+            self._reader_fd = serial.fileno()
+        except (AttributeError, OSError):
+            self._reader_fd = None
+        if self._reader_fd is not None:
+            self._loop.add_reader(self._reader_fd, self._handle_readable)
+        else:
+            self._poller = self._loop.create_task(self._poll())
+        return True
+
+    async def disconnect(self):
+        """
+        Disconnect from the serial port.
+        """
+        self._close()
+
+    async def teardown(self):
+        """
+        Release the serial port entirely.
+        """
+        self._close()
+
+    def _close(self):
+        """
+        Stop watching the port, close it, and let any iterators know there's nothing more to come.
+        """
+        if self._reader_fd is not None:
+            self._loop.remove_reader(self._reader_fd)
+            self._reader_fd = None
+        if self._poller is not None:
+            if self._poller is not asyncio.current_task():
+                self._poller.cancel()
+            self._poller = None
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except OSError:  # (pyserial's SerialException is an OSError.)
+                pass
+            self._serial = None
+            self._enqueue(None)
+
+    def _handle_readable(self):
+        """
+        This is the loop's callback for when the port has data waiting.
+        """
+        try:
+            data = self._serial.read(self._chunk_size)
+        except OSError:
+            self._close()
+            self.raise_alarm()
+            return
+        if data:
+            self._deliver(data)
+
+    async def _poll(self):
+        """
+        Check the port for data every so often (for ports that have no file descriptor).
+        """
+        while True:
+            try:
+                waiting = self._serial.in_waiting
+                data = self._serial.read(min(waiting, self._chunk_size)) if waiting else None
+            except OSError:
+                self._close()
+                self.raise_alarm()
+                return
+            if data:
+                self._deliver(data)
+                # (However fast the data's coming, everybody else on the loop gets a turn.)
+                await asyncio.sleep(0)
+            else:
+                await asyncio.sleep(self._poll_interval)
+
+    def _deliver(self, data: bytes):
+        """
+        Send received data along to anybody who's interested.
+        """
+        dispatcher.send(signal=SerialConnection.Signals.DATA_RECEIVED, sender=self, data=data)
+        if self._frame_decoder is not None:
+            frames = self._frame_decoder.feed(data)
+            if frames and registry.enabled:
+                registry.counter('cnxman_frames_received_total', 'frames decoded by serial connections',
+                                 connection=self._port).inc(len(frames))
+            for frame in frames:
+                dispatcher.send(signal=SerialConnection.Signals.FRAME_RECEIVED, sender=self, frame=frame)
+        self._enqueue(data)
+
+    def _enqueue(self, chunk: bytes or None):
+        """
+        Queue a chunk for iteration, making room by dropping the oldest chunk if we must.
+        """
+        if self._chunks.full():
+            self._chunks.get_nowait()
+            self._dropped += 1
+        self._chunks.put_nowait(chunk)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        chunks = self._chunks
+        if chunks is None:
+            raise StopAsyncIteration
+        chunk = await chunks.get()
+        # A chunk of 'None' means the port has been closed.
+        if chunk is None:
+            raise StopAsyncIteration
+        return chunk
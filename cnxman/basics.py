@@ -6,19 +6,30 @@
 .. moduleauthor:: Pat Daburu <pat@daburu.net>
 
 This module contains the base classes and basic utilities.
+
+:py:class:`ConnectionManager` (whose state machine is built with Automat) is defined in :py:mod:`cnxman.methodical`,
+which isn't imported until somebody asks for it here, so that the rest of this module loads quickly.
 """
 
 from abc import ABCMeta, abstractmethod
-from automat import MethodicalMachine
 from enum import Enum
+from .events import dispatcher
+from .metrics import registry
+from .scheduling import Backoff, CircuitBreaker, ScheduledCall, Scheduler
+import threading
 import time
-from pydispatch import dispatcher
+# Only type checkers need these (and subscriptions aren't imported until somebody subscribes).
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .buffers import OverflowPolicy
+    from .subscriptions import Subscription
 
 
 class ConnectionException(Exception):
     """
     Raised when an error occurs within a connection.
     """
+
     def __init__(self, message: str, inner: Exception):
         """
 
@@ -53,6 +64,18 @@ class ConnectionException(Exception):
             inner=ex)  # TODO: Improve this!
 
 
+class ManagerState(Enum):
+    """
+    These are the states through which a connection manager moves.
+    """
+    READY = 'ready'  # We haven't connected yet, but we're ready to try.
+    CONNECTING = 'connecting'  # We're trying to connect.
+    CONNECTED = 'connected'  # We're connected.
+    RECOVERING = 'recovering'  # We're waiting to try to reconnect.
+    DISCONNECTED = 'disconnected'  # The connection has been disconnected.
+    TORNDOWN = 'torndown'  # The connection manager has been torn down.  It's over.
+
+
 #@loggable
 class Connection(object):
     """
@@ -65,14 +88,18 @@ class Connection(object):
     :seealso:  :py:func:`Connection.try_connect`
     :seealso:  :py:func:`Connection.disconnect`
     :seealso:  :py:func:`Connection.teardown`
+
+    Connections don't have a ``__dict__`` unless a subclass asks for one (by not declaring ``__slots__``), which keeps
+    thousands of them small.
     """
     __metaclass__ = ABCMeta
+    __slots__ = ('__weakref__',)  # (The event bus keeps weak references to connections.)
 
     class Signals(Enum):
         """
         These are the used by connection objects.
 
-        :seealso:  :py:func:`pydispatch.dispatcher`
+        :seealso:  :py:data:`cnxman.events.dispatcher`
         """
         RAISE_ALARM = 'raise-alarm'  # Something has gone awry with the connection.
 
@@ -100,40 +127,286 @@ class Connection(object):
         """
         pass
 
+    def shutdown(self, timeout: float = None) -> bool:
+        """
+        Release the connection's resources gracefully, finishing up what's in flight (like data that has been read but
+        not yet passed along) first.  Override this method if your connection has anything in flight; the default just
+        tears the connection down.
+
+        :param timeout: the longest time (in seconds) it may take (``None`` means as long as it takes)
+        :type timeout:  ``float``
+        :return: ``True`` if nothing was lost, or ``False`` if time ran out
+        :rtype:  ``bool``
+        """
+        self.teardown()
+        return True
+
+    def subscribe(self,
+                  max_chunks: int = 1024,
+                  max_bytes: int = None,
+                  policy: 'OverflowPolicy' = None,
+                  name: str = None,
+                  signal=None) -> 'Subscription':
+        """
+        Subscribe to the data the connection receives.  The subscriber gets a bounded queue of its own, so it can't hold
+        up the thread that reads the connection (or the other subscribers) however slow it is.
+
+        :param max_chunks: the most chunks the subscriber's queue holds
+        :type max_chunks:  ``int``
+        :param max_bytes: the most bytes the subscriber's queue holds (``None`` means there's no limit but the number
+            of chunks)
+        :type max_bytes:  ``int``
+        :param policy: what happens to a chunk when the subscriber's queue is full (the default is
+            :py:attr:`cnxman.buffers.OverflowPolicy.DROP_OLDEST`)
+        :type policy:  :py:class:`cnxman.buffers.OverflowPolicy`
+        :param name: the subscriber's name (in metrics)
+        :type name:  ``str``
+        :param signal: the signal whose ``data`` (or ``frame``) the subscriber wants (the default is the
+            ``DATA_RECEIVED`` member of the connection's ``Signals``)
+        :return: the subscription (which you can iterate over, with ``for`` or ``async for``, and should close when
+            you're finished with it)
+        :rtype:  :py:class:`cnxman.subscriptions.Subscription`
+        :raises ValueError: if the connection doesn't send data
+        """
+        from .buffers import OverflowPolicy
+        from .subscriptions import subscribe
+        return subscribe(self,
+                         max_chunks=max_chunks,
+                         max_bytes=max_bytes,
+                         policy=policy if policy is not None else OverflowPolicy.DROP_OLDEST,
+                         name=name,
+                         signal=signal)
+
+    @property
+    def name(self) -> str:
+        """
+        This is the name by which the connection is known (in its metrics, for example).  Override this property to
+        give your connections more helpful names than the name of their class.
+
+        :rtype: ``str``
+        """
+        return type(self).__name__
+
     def raise_alarm(self):
         """
-        Raise the alarm to notify anyone who might be interested (like a :py:class:`ConnectionManager`) that there is
-        trouble with the connection.
+        Raise the alarm to notify anyone who might be interested (like a :py:class:`BaseConnectionManager`) that there
+        is trouble with the connection.
         """
+        if registry.enabled:
+            registry.counter('cnxman_alarms_raised_total', 'alarms raised by connections', connection=self.name).inc()
         dispatcher.send(signal=Connection.Signals.RAISE_ALARM, sender = self)
 
 
-class ConnectionManager(object):
+class TransitionError(ConnectionException):
+    """
+    Raised when a :py:class:`FastConnectionManager` is asked to do something it can't do in its current state.
+    """
+
+    def __init__(self, state: ManagerState, input_: str):
+        """
+
+        :param state: the manager's state
+        :type state:  :py:class:`ManagerState`
+        :param input_: what the manager was asked to do
+        :type input_:  ``str``
+        """
+        super().__init__(message='Cannot {input} while {state}.'.format(input=input_.strip('_').replace('_', ' '),
+                                                                         state=state.value),
+                         inner=None)
+        self.state = state  #: the manager's state
+        self.input = input_  #: what the manager was asked to do
+
+
+class BaseConnectionManager(object):
     """
-    Extend this class to create your own object with the know-how to establish and maintain a connection to something.
+    This is the behaviour the connection managers have in common, whichever engine drives their state machines.
+
+    :seealso:  :py:class:`cnxman.methodical.ConnectionManager`
+    :seealso:  :py:class:`FastConnectionManager`
     """
     __metaclass__ = ABCMeta
-    _machine = MethodicalMachine()  # This is the class state machine.
 
-    def __init__(self, connection: Connection):
+    class Signals(Enum):
+        """
+        These are the signals sent by connection managers.
+
+        :seealso:  :py:data:`cnxman.events.dispatcher`
+        """
+        STATE_CHANGED = 'state-changed'  # The manager has entered a new state.
+
+    #: the exceptions raised when a manager is asked to do something it can't do in its current state
+    _invalid_transition = TransitionError
+
+    def __init__(self,
+                 connection: Connection,
+                 backoff: Backoff = None,
+                 scheduler: Scheduler = None,
+                 min_interval: float = 0.0,
+                 breaker: CircuitBreaker = None):
+        """
+
+        :param connection: the connection to manage
+        :type connection:  :py:class:`Connection`
+        :param backoff: decides how long we wait between attempts to reconnect
+        :type backoff:  :py:class:`cnxman.scheduling.Backoff`
+        :param scheduler: the scheduler that makes our attempts to reconnect (the default is the shared scheduler)
+        :type scheduler:  :py:class:`cnxman.scheduling.Scheduler`
+        :param min_interval: the shortest time (in seconds) between the starts of two attempts to connect, however
+            soon the connection raises the alarm again (so a connection that keeps dropping as soon as it's made can't
+            keep us reconnecting flat out)
+        :type min_interval:  ``float``
+        :param breaker: the breaker we ask before each attempt to reconnect (the default is the shared breaker, which
+            caps the number of attempts under way at once across every manager that uses it)
+        :type breaker:  :py:class:`cnxman.scheduling.CircuitBreaker`
+        """
+        if min_interval < 0:
+            raise ValueError('The minimum interval cannot be negative.')
         self._connection = connection
+        self._state = ManagerState.READY  # the state the machine is in
+        self._state_since = time.monotonic()  # when we entered the state
+        self._backoff = backoff if backoff is not None else Backoff()
+        self._scheduler = scheduler  # Until we need to recover, we don't need a scheduler.
+        self._attempts = 0  # the number of attempts we've made to recover since we were last connected
+        self._pending_recovery: ScheduledCall = None  # our next attempt to reconnect (if there is one)
+        self._min_interval = min_interval  # the shortest time between the starts of two attempts to connect
+        self._last_attempt: float = None  # when we last started an attempt to connect
+        self._breaker = breaker if breaker is not None else CircuitBreaker.default()
+        self._alarm_lock = threading.Lock()  # held while we're answering an alarm
+        self._state_changed = threading.Condition()  # notified whenever we enter a state
+        self._teardown_requested = False  # Should we tear down as soon as the attempt to connect under way is over?
         # We want to be notified if the connection raises the alarm.
         dispatcher.connect(self._handle_connection_raise_alarm,
                            signal=Connection.Signals.RAISE_ALARM,
                            sender=self._connection)
 
-    @_machine.state(initial=True)
-    def ready(self):
-        """We haven't connected yet, but we're ready to try."""
+    @property
+    def connection(self) -> Connection:
+        """
+        This is the connection we're managing.
+
+        :rtype: :py:class:`Connection`
+        """
+        return self._connection
+
+    @property
+    def state(self) -> ManagerState:
+        """
+        This is the manager's current state.  (If you'd like to hear about changes as they happen, connect to the
+        :py:attr:`BaseConnectionManager.Signals.STATE_CHANGED` signal.)
+
+        :rtype: :py:class:`ManagerState`
+        """
+        return self._state
+
+    @property
+    def attempts(self) -> int:
+        """
+        This is the number of attempts we've made to recover since we were last connected.
+
+        :rtype: ``int``
+        """
+        return self._attempts
 
-    @_machine.input()
+    @abstractmethod
     def connect(self):
         """Let's get connected."""
 
-    @_machine.output()
-    def _connect(self):
+    @abstractmethod
+    def disconnect(self):
+        """Release the connection."""
+
+    @abstractmethod
+    def teardown(self):
+        """Release any resources held by the connection."""
+
+    def shutdown(self, timeout: float = None) -> bool:
         """
-        This is the output method mapped to the :py:func:`ConnectionManager.connect` input method.
+        Tear down the connection gracefully (letting it finish what's in flight) within a deadline.
+
+        :param timeout: the longest time (in seconds) it may take (``None`` means as long as it takes)
+        :type timeout:  ``float``
+        :return: ``True`` if the connection finished up in time
+        :rtype:  ``bool``
+
+        :seealso:  :py:func:`Connection.shutdown`
+        """
+        if self._state is ManagerState.TORNDOWN:
+            return True
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        # If an attempt to connect is under way, we wait to see how it goes.
+        with self._state_changed:
+            while self._state is ManagerState.CONNECTING:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                self._state_changed.wait(remaining)
+        if self._state is ManagerState.CONNECTING:
+            # We ran out of time, so we'll tear down whenever the attempt is over.  (If it's over already, we do it
+            # ourselves.)
+            self._teardown_requested = True
+            if self._state is ManagerState.CONNECTING:
+                return False
+        # If we're connected, the connection has things to finish up.  (Otherwise, there's nothing to wait for.)
+        finished = (self._connection.shutdown(timeout=max(0.0, deadline - time.monotonic())
+                                              if deadline is not None else None)
+                    if self._state is ManagerState.CONNECTED else True)
+        try:
+            self.teardown()
+        except self._invalid_transition:
+            pass  # (We were never connected, so there's nothing for us to tear down.)
+        return finished
+
+    @abstractmethod
+    def _raise_alarm(self):
+        """There is trouble with the connection.  Raise the alarm!"""
+
+    @abstractmethod
+    def _silence_alarm(self):
+        """Everything is fine with the connection."""
+
+    def _enter(self, state: ManagerState):
+        """
+        Keep track of the state we're entering (and let anybody who's interested know).
+
+        :param state: the state we're entering
+        :type state:  :py:class:`ManagerState`
+        """
+        now = time.monotonic()
+        previous = self._state
+        if registry.enabled:
+            name = self._connection.name if self._connection is not None else None
+            registry.histogram('cnxman_manager_state_seconds', 'time managers spent in each state',
+                               connection=name, state=previous.value).observe(now - self._state_since)
+            registry.counter('cnxman_manager_transitions_total', 'states entered by managers',
+                             connection=name, state=state.value).inc()
+        self._state = state
+        self._state_since = now
+        with self._state_changed:
+            self._state_changed.notify_all()
+        dispatcher.send(signal=BaseConnectionManager.Signals.STATE_CHANGED, sender=self, state=state, previous=previous)
+
+    def _handle_connection_raise_alarm(self):
+        """
+        This is a handler for the connection's 'raise alarm' signal.  Alarms that arrive while we're already recovering
+        (or while we're answering another one) are coalesced:  one alarm is as good as many.
+
+        :seealso:  :py:class:`Connection.Signals`
+        """
+        if self._state is ManagerState.RECOVERING or not self._alarm_lock.acquire(blocking=False):
+            if registry.enabled:
+                registry.counter('cnxman_alarms_coalesced_total', 'alarms that were already being answered',
+                                 connection=self._connection.name).inc()
+            return
+        try:
+            self._raise_alarm()
+        except self._invalid_transition:
+            pass  # We're not connected (or trying to be), so there's nothing to recover.
+        finally:
+            self._alarm_lock.release()
+
+    def _do_connect(self):
+        """
+        Try to connect, and raise or silence the alarm depending on how it goes.
         """
         # If there is no function to call, we simply cannot connect, so...
         if self._connection is None:
@@ -141,109 +414,167 @@ class ConnectionManager(object):
             return
         else:
             # Give it a try!
+            self._last_attempt = time.monotonic()
             connected = self._connection.try_connect()
             # How'd it go?
             if connected:
                 self._silence_alarm()  # Great!
             else:
                 self._raise_alarm()  # OK.  Not so great.
+            # If somebody shut us down while we were trying, we're done.
+            if self._teardown_requested:
+                try:
+                    self.teardown()
+                except self._invalid_transition:
+                    pass  # (They got to it before we did.)
 
-    @_machine.input()
-    def _raise_alarm(self):
+    def _do_recover(self):
         """
-        There is trouble with the connection.  Raise the alarm!
+        Schedule the next attempt to recover the connection (unless we've run out of attempts).
         """
+        self._attempts += 1
+        if self._backoff.exhausted(self._attempts):
+            return
+        if registry.enabled:
+            registry.counter('cnxman_reconnect_attempts_total', 'attempts to reconnect scheduled by managers',
+                             connection=self._connection.name if self._connection is not None else None).inc()
+        if self._scheduler is None:
+            self._scheduler = Scheduler.default()
+        delay = self._backoff.delay(self._attempts)
+        # However keen the backoff is, we don't start attempts closer together than the minimum interval.
+        if self._min_interval and self._last_attempt is not None:
+            delay = max(delay, self._last_attempt + self._min_interval - time.monotonic())
+        self._pending_recovery = self._scheduler.call_later(delay, self._retry)
+
+    def _retry(self):
+        """
+        This is called by the scheduler when it's time for our next attempt to reconnect.
+        """
+        self._pending_recovery = None
+        # If somebody moved us along in the meantime, we're not recovering anymore.
+        if self._state is not ManagerState.RECOVERING:
+            return
+        breaker = self._breaker
+        if not breaker.acquire():
+            # Too many attempts are under way (or too many have failed), so we'll wait our turn.  (This doesn't count
+            # as an attempt.)
+            if registry.enabled:
+                registry.counter('cnxman_reconnects_deferred_total', 'attempts to reconnect held back by the breaker',
+                                 connection=self._connection.name).inc()
+            self._pending_recovery = self._scheduler.call_later(breaker.retry_after(), self._retry)
+            return
+        try:
+            self.connect()
+        except self._invalid_transition:
+            pass  # Somebody moved us along in the meantime, so we're not recovering anymore.
+        finally:
+            breaker.release(success=self._state is ManagerState.CONNECTED)
 
-    @_machine.input()
-    def _silence_alarm(self):
+    def _do_cancel_recovery(self):
         """
-        Everything is fine with the connection.
+        Cancel the next attempt to recover the connection (if there is one).
         """
+        if self._pending_recovery is not None:
+            self._pending_recovery.cancel()
+            self._pending_recovery = None
 
-    def _handle_connection_raise_alarm(self):
+    def _do_reset_attempts(self):
         """
-        This is a handler for the connection's 'raise alarm' signal.
-
-        :seealso:  :py:class:`Connection.Signals`
+        We're connected, so start counting attempts to recover from scratch next time.
         """
-        self._raise_alarm()
-
-    @_machine.state()
-    def connecting(self):
-        """We're trying to connect."""
+        self._attempts = 0
 
-    @_machine.state()
-    def connected(self):
-        """We're connected."""
-
-    @_machine.state()
-    def recovering(self):
-        """We're waiting to try to reconnect."""
-
-    # TODO: Improve the _recover method!
-    @_machine.output()
-    def _recover(self):
+    def _do_disconnect(self):
         """
-        Attempt to recover the connection.
+        Disconnect the connection.
         """
-        print("Waiting to retry.")
-        time.sleep(5)
-        print("Here we go.")
-        self.connect()
-
-    @_machine.state()
-    def disconnected(self):
-        """The connection has been disconnected."""
+        self._connection.disconnect()
 
-    @_machine.input()
-    def disconnect(self):
+    def _do_teardown(self):
         """
-        Release the connection.
+        Tear down the connection.
         """
+        self._connection.teardown()
 
-    @_machine.output()
-    def _disconnect(self):
-        """
-        This is the output method mapped to the :py:func:`ConnectionManager.disconnect` input method.
-        """
-        self._connection.disconnect()
 
-    @_machine.state(terminal=True)
-    def torndown(self):
-        """The connection manager has been torn down.  It's over."""
+class FastConnectionManager(BaseConnectionManager):
+    """
+    This connection manager moves through the same states (and does the same things along the way) as a
+    :py:class:`cnxman.methodical.ConnectionManager`, but its state machine is a precomputed table:  each input is a
+    dictionary lookup and a loop over the actions it triggers, with none of a framework's wrappers in between.  Use it
+    for managers that are poked often (by a heartbeat, say).  Where a :py:class:`cnxman.methodical.ConnectionManager`
+    raises :py:class:`automat.NoTransition`, this one raises :py:class:`TransitionError`.
+    """
+    _B = BaseConnectionManager  # (just to keep the table below readable)
+    #: For each state and input, the state we enter (``None`` if we stay put) and the actions we take.
+    _transitions = {
+        ManagerState.READY: {
+            'connect': (ManagerState.CONNECTING, (_B._do_connect,)),
+        },
+        ManagerState.CONNECTING: {
+            '_silence_alarm': (ManagerState.CONNECTED, (_B._do_reset_attempts,)),
+            '_raise_alarm': (ManagerState.RECOVERING, (_B._do_recover,)),
+        },
+        ManagerState.RECOVERING: {
+            'connect': (ManagerState.CONNECTING, (_B._do_cancel_recovery, _B._do_connect)),
+            '_raise_alarm': (None, ()),
+            'disconnect': (ManagerState.DISCONNECTED, (_B._do_cancel_recovery, _B._do_disconnect)),
+            'teardown': (ManagerState.TORNDOWN, (_B._do_cancel_recovery, _B._do_disconnect, _B._do_teardown)),
+        },
+        ManagerState.CONNECTED: {
+            'disconnect': (ManagerState.DISCONNECTED, (_B._do_disconnect,)),
+            'teardown': (ManagerState.TORNDOWN, (_B._do_disconnect, _B._do_teardown)),
+            '_raise_alarm': (ManagerState.RECOVERING, (_B._do_recover,)),
+            '_silence_alarm': (None, ()),
+        },
+        ManagerState.DISCONNECTED: {
+            'teardown': (ManagerState.TORNDOWN, (_B._do_teardown,)),
+        },
+        ManagerState.TORNDOWN: {},
+    }
+    del _B
+
+    def _fire(self, input_: str):
+        """
+        Feed an input to the state machine.
+
+        :param input_: the input
+        :type input_:  ``str``
+        :raises TransitionError: if there's no transition for the input from the current state
+        """
+        try:
+            state, actions = self._transitions[self._state][input_]
+        except KeyError:
+            raise TransitionError(self._state, input_) from None
+        if state is not None:
+            self._enter(state)
+        for action in actions:
+            action(self)
+
+    def connect(self):
+        """Let's get connected."""
+        self._fire('connect')
+
+    def disconnect(self):
+        """Release the connection."""
+        self._fire('disconnect')
 
-    @_machine.input()
     def teardown(self):
-        """
-        Release any resources held by the connection.
-        """
+        """Release any resources held by the connection."""
+        self._fire('teardown')
 
-    @_machine.output()
-    def _teardown(self):
-        """
-        This is the output method mapped to the :py:func:`ConnectionManager.teardown` input method.
-        """
-        self._connection.teardown()
+    def _raise_alarm(self):
+        """There is trouble with the connection.  Raise the alarm!"""
+        self._fire('_raise_alarm')
+
+    def _silence_alarm(self):
+        """Everything is fine with the connection."""
+        self._fire('_silence_alarm')
 
-    # From the 'ready' state, we can connect.
-    ready.upon(connect, enter=connecting, outputs=[_connect])
-    # From the 'connecting' state, we can either go into an "everything's OK" state by silencing any alarms...
-    connecting.upon(_silence_alarm, enter=connected, outputs=[])
-    # ...or we can raise the alarm.
-    connecting.upon(_raise_alarm, enter=recovering, outputs=[_recover])
-    # From the 'recovering' state, we can try to connect.
-    recovering.upon(connect, enter=connecting, outputs=[_connect])
-    # If we're recovering, we don't need to change state if the alarm sounds because we're already in a recovery
-    # condition.
-    recovering.upon(_raise_alarm, enter=recovering, outputs=[])
-    # When we're connected, we can, of course, go to the 'disconnected' state.
-    connected.upon(disconnect, enter=disconnected, outputs=[_disconnect])
-    # When we're connected, we can go right to the 'torndown' state if requested.
-    connected.upon(teardown, enter=torndown, outputs=[_disconnect, _teardown])
-    # When we're in the 'connected' state, raising an alarm puts us into the 'recovering' state.
-    connected.upon(_raise_alarm, enter=recovering, outputs=[_recover])
-    # When we're in the 'connected' state, silencing an alarm puts us into the 'connected' state.
-    connected.upon(_silence_alarm, enter=connected, outputs=[])
-    # From the 'disconnected' state, we can to the 'torndown' state.
-    disconnected.upon(teardown, enter=torndown, outputs=[_teardown])
 
+def __getattr__(name: str):
+    # Automat takes a while to import, so we don't import it until somebody wants a ConnectionManager.
+    if name == 'ConnectionManager':
+        from .methodical import ConnectionManager
+        return ConnectionManager
+    raise AttributeError('module {module!r} has no attribute {name!r}'.format(module=__name__, name=name))
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.buffers
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Somewhere to put the data while it waits its turn.
+"""
+
+from enum import Enum
+import threading
+import time
+
+
+class OverflowPolicy(Enum):
+    """
+    These are the things a buffer can do when there's no room for new data.
+    """
+    BLOCK = 'block'  # Wait for room.
+    DROP_OLDEST = 'drop-oldest'  # Make room by throwing away the oldest data.
+    DROP_NEWEST = 'drop-newest'  # Throw away the new data.
+
+
+class RingBuffer(object):
+    """
+    This is a bounded, preallocated byte ring buffer that hands data from exactly one producer thread to exactly one
+    consumer thread.
+
+    The producer only ever moves the write position and the consumer only ever moves the read position, so the data
+    path takes no locks.  (Events are used only to wake a side that has gone to sleep waiting for the other.)  When the
+    policy is :py:attr:`OverflowPolicy.DROP_OLDEST` the producer never waits and may overwrite data the consumer is
+    copying out; the producer announces the region it's about to overwrite first, so the consumer can tell afterwards
+    which bytes it can trust and count the rest as dropped.
+    """
+    def __init__(self, capacity: int, policy: OverflowPolicy = OverflowPolicy.BLOCK):
+        """
+
+        :param capacity: the size of the buffer (in bytes)
+        :type capacity:  ``int``
+        :param policy: what to do when there's no room for new data
+        :type policy:  :py:class:`OverflowPolicy`
+        """
+        if capacity < 1:
+            raise ValueError('The capacity must be at least 1.')
+        self._capacity = capacity
+        self._policy = policy
+        self._buffer = bytearray(capacity)  # the storage (allocated once, up front)
+        self._write_pos = 0  # the total number of bytes ever written (only the producer moves it)
+        self._reserved_pos = 0  # the write position the producer is about to reach (only the producer moves it)
+        self._read_pos = 0  # the total number of bytes ever read or dropped (only the consumer moves it)
+        self._dropped_newest = 0  # the bytes the producer has thrown away (only the producer counts them)
+        self._dropped_oldest = 0  # the bytes the producer has overwritten (only the consumer counts them)
+        self._high_water_mark = 0  # the most bytes we've ever held at once
+        self._closed = False
+        self._reader_waiting = False  # Is the consumer asleep?
+        self._writer_waiting = False  # Is the producer asleep?
+        self._readable = threading.Event()  # set when there may be something to read
+        self._writable = threading.Event()  # set when there may be room to write
+
+    @property
+    def capacity(self) -> int:
+        """
+        This is the size of the buffer (in bytes).
+
+        :rtype: ``int``
+        """
+        return self._capacity
+
+    @property
+    def policy(self) -> OverflowPolicy:
+        """
+        This is what the buffer does when there's no room for new data.
+
+        :rtype: :py:class:`OverflowPolicy`
+        """
+        return self._policy
+
+    @property
+    def closed(self) -> bool:
+        """
+        Has the buffer been closed?
+
+        :rtype: ``bool``
+        """
+        return self._closed
+
+    @property
+    def available(self) -> int:
+        """
+        This is the number of bytes waiting to be read.
+
+        :rtype: ``int``
+        """
+        return min(self._capacity, self._write_pos - self._read_pos)
+
+    @property
+    def written(self) -> int:
+        """
+        This is the number of bytes ever written to the buffer (which is where the next byte written will be).
+
+        :rtype: ``int``
+        """
+        return self._write_pos
+
+    @property
+    def consumed(self) -> int:
+        """
+        This is the number of bytes ever read from the buffer (or overwritten before they could be).
+
+        :rtype: ``int``
+        """
+        return self._read_pos
+
+    @property
+    def dropped(self) -> int:
+        """
+        This is the number of bytes that have been dropped because the buffer was full.
+
+        :rtype: ``int``
+        """
+        return self._dropped_newest + self._dropped_oldest
+
+    @property
+    def high_water_mark(self) -> int:
+        """
+        This is the largest number of bytes the buffer has held at once.
+
+        :rtype: ``int``
+        """
+        return self._high_water_mark
+
+    def close(self):
+        """
+        Close the buffer.  Nothing more may be written, but the consumer may still read whatever is left.
+        """
+        self._closed = True
+        self._readable.set()
+        self._writable.set()
+
+    def write(self, data, timeout: float = None) -> int:
+        """
+        Write data to the buffer.  (Call this from the producer thread only.)
+
+        :param data: the data (``bytes``, ``bytearray`` or :py:class:`memoryview`)
+        :param timeout: the longest time (in seconds) to wait for room if the policy is to block
+        :type timeout:  ``float``
+        :return: the number of bytes written
+        :rtype:  ``int``
+        """
+        if self._closed:
+            return 0
+        with memoryview(data) as view:
+            size = len(view)
+            if size == 0:
+                return 0
+            if self._policy is OverflowPolicy.DROP_NEWEST:
+                written = self._write_or_drop(view)
+            elif self._policy is OverflowPolicy.DROP_OLDEST:
+                written = self._write_over(view)
+            else:
+                written = self._write_or_wait(view, timeout)
+        # Keep track of how full we've been.
+        used = min(self._capacity, self._write_pos - self._read_pos)
+        if used > self._high_water_mark:
+            self._high_water_mark = used
+        return written
+
+    def _write_or_drop(self, view: memoryview) -> int:
+        size = len(view)
+        if size > self._capacity - (self._write_pos - self._read_pos):
+            self._dropped_newest += size
+            return 0
+        self._put(view)
+        return size
+
+    def _write_over(self, view: memoryview) -> int:
+        size = len(view)
+        # If the data won't fit even in an empty buffer, only the end of it survives.
+        if size > self._capacity:
+            self._dropped_newest += size - self._capacity
+            view = view[size - self._capacity:]
+        # Tell the consumer which bytes we're about to overwrite before we overwrite them.
+        self._reserved_pos = self._write_pos + len(view)
+        self._put(view)
+        return size
+
+    def _write_or_wait(self, view: memoryview, timeout: float or None) -> int:
+        size = len(view)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        written = 0
+        while written < size:
+            free = self._capacity - (self._write_pos - self._read_pos)
+            if free > 0:
+                end = written + min(free, size - written)
+                self._put(view[written:end])
+                written = end
+                continue
+            # There's no room, so wait for the consumer to make some.
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if self._closed or (remaining is not None and remaining <= 0):
+                break
+            self._writer_waiting = True
+            self._writable.clear()
+            if self._capacity - (self._write_pos - self._read_pos) == 0:
+                self._writable.wait(remaining)
+            self._writer_waiting = False
+        return written
+
+    def _put(self, view: memoryview):
+        """
+        Copy data into the buffer and publish it to the consumer.
+        """
+        size = len(view)
+        offset = self._write_pos % self._capacity
+        first = min(size, self._capacity - offset)
+        self._buffer[offset:offset + first] = view[:first]
+        if first < size:
+            self._buffer[:size - first] = view[first:]
+        self._reserved_pos = self._write_pos = self._write_pos + size
+        if self._reader_waiting:
+            self._readable.set()
+
+    def read(self, max_size: int = None, timeout: float = None) -> bytes:
+        """
+        Read data from the buffer, waiting for some to arrive if there is none.  (Call this from the consumer thread
+        only.)
+
+        :param max_size: the most bytes to read (the default is all of them)
+        :type max_size:  ``int``
+        :param timeout: the longest time (in seconds) to wait for data
+        :type timeout:  ``float``
+        :return: the data, which is empty if we timed out or the buffer is closed and empty
+        :rtype:  ``bytes``
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            if self._write_pos == self._read_pos:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if self._closed or (remaining is not None and remaining <= 0):
+                    return b''
+                self._reader_waiting = True
+                self._readable.clear()
+                if self._write_pos == self._read_pos and not self._closed:
+                    self._readable.wait(remaining)
+                self._reader_waiting = False
+                continue
+            data = self._get(max_size)
+            if data:
+                return data
+
+    def _get(self, max_size: int or None) -> bytes:
+        """
+        Copy the oldest data out of the buffer and release its space to the producer.
+        """
+        capacity = self._capacity
+        read_pos = self._read_pos
+        write_pos = self._write_pos
+        # Anything the producer has lapped is gone.
+        if write_pos - read_pos > capacity:
+            self._dropped_oldest += write_pos - capacity - read_pos
+            read_pos = write_pos - capacity
+        size = write_pos - read_pos if max_size is None else min(max_size, write_pos - read_pos)
+        offset = read_pos % capacity
+        first = min(size, capacity - offset)
+        data = bytes(self._buffer[offset:offset + first])
+        if first < size:
+            data += self._buffer[:size - first]
+        # If the producer started overwriting what we were copying, we can't trust those bytes.
+        if self._policy is OverflowPolicy.DROP_OLDEST:
+            lost = self._reserved_pos - capacity - read_pos
+            if lost > 0:
+                lost = min(lost, size)
+                self._dropped_oldest += lost
+                data = data[lost:]
+        self._read_pos = read_pos + size
+        if self._writer_waiting:
+            self._writable.set()
+        return data
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.capture
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+What exactly did the device say, and when?
+
+A capture file starts with an eight-byte signature (``CNXCAP1`` and a newline) followed by a record for each chunk of
+data, one after another.  Each record is a little-endian header (the 8-byte :py:func:`time.monotonic_ns` timestamp
+and the 4-byte length of the data) followed by the data itself.  Files are only ever appended to, and a record that was
+cut short (because the process died in the middle of writing it, say) is ignored when the file is read.
+
+:seealso:  :py:class:`cnxman.replay.ReplayConnection`
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+TYPE_CHECKING = False  # (typing is only needed for the annotations.)
+if TYPE_CHECKING:
+    from typing import Iterator, Tuple
+
+SIGNATURE = b'CNXCAP1\n'  #: the bytes at the start of every capture file
+_RECORD = struct.Struct('<QI')  # the timestamp (in nanoseconds) and the length of the data
+
+
+class CaptureWriter(object):
+    """
+    This object appends chunks of data, with timestamps, to a capture file.
+    """
+    def __init__(self, path: str, buffer_size: int = 65536):
+        """
+
+        :param path: the path to the capture file (which is created if it doesn't exist)
+        :type path:  ``str``
+        :param buffer_size: the number of bytes we hold in memory before they're written to the file
+        :type buffer_size:  ``int``
+        """
+        self._path = path
+        self._file = open(path, 'ab', buffering=buffer_size)
+        # A new file needs a signature.  (An old one had better have one already.)
+        if self._file.tell() == 0:
+            self._file.write(SIGNATURE)
+        else:
+            with open(path, 'rb') as f:
+                if f.read(len(SIGNATURE)) != SIGNATURE:
+                    self._file.close()
+                    raise ValueError('{path} is not a capture file.'.format(path=path))
+        self._lock = threading.Lock()
+        self._records = 0  # the number of records we've written
+
+    @property
+    def path(self) -> str:
+        """
+        This is the path to the capture file.
+
+        :rtype: ``str``
+        """
+        return self._path
+
+    @property
+    def records(self) -> int:
+        """
+        This is the number of records we've written.
+
+        :rtype: ``int``
+        """
+        return self._records
+
+    @property
+    def closed(self) -> bool:
+        """
+        Has the writer been closed?
+
+        :rtype: ``bool``
+        """
+        return self._file.closed
+
+    def write(self, data: bytes, timestamp: int = None):
+        """
+        Append a chunk of data to the file.
+
+        :param data: the data
+        :type data:  ``bytes``
+        :param timestamp: when the data arrived, in nanoseconds (the default is now, according to
+            :py:func:`time.monotonic_ns`)
+        :type timestamp:  ``int``
+        """
+        header = _RECORD.pack(time.monotonic_ns() if timestamp is None else timestamp, len(data))
+        with self._lock:
+            self._file.write(header)
+            self._file.write(data)
+            self._records += 1
+
+    def flush(self):
+        """
+        Write whatever we're holding to the file.
+        """
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """
+        Flush and close the file.
+        """
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CaptureReader(object):
+    """
+    This object reads the records in a capture file (which it maps into memory).
+    """
+    def __init__(self, path: str):
+        """
+
+        :param path: the path to the capture file
+        :type path:  ``str``
+        """
+        self._path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < len(SIGNATURE) or f.read(len(SIGNATURE)) != SIGNATURE:
+                raise ValueError('{path} is not a capture file.'.format(path=path))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @property
+    def path(self) -> str:
+        """
+        This is the path to the capture file.
+
+        :rtype: ``str``
+        """
+        return self._path
+
+    def __iter__(self) -> 'Iterator[Tuple[int, bytes]]':
+        """
+        Read the records.
+
+        :return: an iterator over the ``(timestamp, data)`` of each record
+        """
+        buffer = self._map
+        size = len(buffer)
+        offset = len(SIGNATURE)
+        while offset + _RECORD.size <= size:
+            timestamp, length = _RECORD.unpack_from(buffer, offset)
+            offset += _RECORD.size
+            # If the record was cut short, that's the end.
+            if offset + length > size:
+                return
+            yield timestamp, buffer[offset:offset + length]
+            offset += length
+
+    def close(self):
+        """
+        Release the file.
+        """
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.events
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Did you hear that?
+
+This module provides the in-process event bus through which cnxman objects send their signals.  It offers the same
+``connect``/``disconnect``/``send`` API as `PyDispatcher <http://pydispatcher.sourceforge.net/>`_ (so
+``from cnxman.events import dispatcher`` is a drop-in replacement for ``from pydispatch import dispatcher``), but it
+does its homework when receivers are connected rather than every time a signal is sent:  each receiver's signature is
+inspected once, and the receivers for each signal/sender pair are looked up once and remembered until somebody
+connects or disconnects.
+
+Signals that are sent many times a second (like the data a serial port delivers) can go out as an :py:class:`Event`
+instead, a slotted record the sender fills in and reuses, so that sending one doesn't allocate anything.
+
+.. code-block:: python
+
+    event = Event(signal=SerialConnection.Signals.DATA_RECEIVED, sender=connection)
+    ...
+    event.data, event.timestamp = data, time.monotonic_ns()
+    dispatcher.send_event(event)
+"""
+
+import threading
+from types import MethodType
+import weakref
+# The typing module is slow to import, and only type checkers need it here.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable, Dict, List, Tuple
+
+
+class _Marker(object):
+    """
+    This is a named placeholder (like :py:data:`Any`).
+    """
+    def __init__(self, name: str):
+        self._name = name
+
+    def __repr__(self):
+        return self._name
+
+
+Any = _Marker('Any')  #: Connect with this to receive any signal (or signals from any sender).
+Anonymous = _Marker('Anonymous')  #: This is the sender of signals sent without one.
+
+
+class Event(object):
+    """
+    This is a signal, filled in by its sender.  Senders keep one and reuse it, so receivers must take what they need
+    from it before they return (and must not keep the event itself).
+
+    :seealso:  :py:func:`EventBus.send_event`
+    """
+    __slots__ = ('signal', 'sender', 'data', 'timestamp')
+
+    def __init__(self, signal=Any, sender=Anonymous, data=None, timestamp: int = 0):
+        """
+
+        :param signal: the signal
+        :param sender: the sender
+        :param data: the payload (a chunk of received data, say)
+        :param timestamp: when it happened, in nanoseconds (according to whatever clock the sender likes to use)
+        :type timestamp:  ``int``
+        """
+        self.signal = signal  #: the signal
+        self.sender = sender  #: the sender
+        self.data = data  #: the payload
+        self.timestamp = timestamp  #: when it happened, in nanoseconds
+
+    def __repr__(self):
+        return 'Event(signal={signal!r}, sender={sender!r}, timestamp={timestamp})'.format(
+            signal=self.signal, sender=self.sender, timestamp=self.timestamp)
+
+
+class Receiver(object):
+    """
+    This is a receiver that has been connected to the bus.  It knows (because we worked it out when it was connected)
+    which of the signal's arguments the receiver wants, so it can be called directly.
+    """
+    __slots__ = ('_function', '_ref', '_key', '_all', '_names', '_signal', '_sender')
+
+    def __init__(self, function: 'Callable', weak: bool = True, on_dead: 'Callable' = None):
+        """
+
+        :param function: the function (or method, or other callable) to be called
+        :param weak: Should we hold only a weak reference to the receiver?
+        :type weak:  ``bool``
+        :param on_dead: a function to call (with this object) if a weakly-referenced receiver is garbage-collected
+        """
+        self._key = Receiver.key(function)
+        self._function = None
+        self._ref = None
+        if weak:
+            callback = (lambda _: on_dead(self)) if on_dead is not None else None
+            try:
+                self._ref = (weakref.WeakMethod(function, callback) if isinstance(function, MethodType)
+                             else weakref.ref(function, callback))
+            except TypeError:
+                self._function = function  # Some things (like builtins) can't be weakly referenced.
+        else:
+            self._function = function
+        # Figure out which arguments the receiver accepts.  (The inspect module is slow to import, so we wait until we
+        # need it.)
+        import inspect
+        try:
+            parameters = inspect.signature(function).parameters.values()
+        except (TypeError, ValueError):
+            parameters = []
+        self._all = any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters)
+        names = [p.name for p in parameters
+                 if p.kind in (inspect.Parameter.POSITIONAL_OR_KEYWORD, inspect.Parameter.KEYWORD_ONLY)]
+        self._signal = 'signal' in names
+        self._sender = 'sender' in names
+        self._names = tuple(n for n in names if n not in ('signal', 'sender'))
+
+    @staticmethod
+    def key(function: 'Callable'):
+        """
+        Get the key that identifies a receiver (so that, for example, two bound-method objects for the same method of
+        the same object are recognized as the same receiver).
+        """
+        if isinstance(function, MethodType):
+            return id(function.__self__), id(function.__func__)
+        return id(function)
+
+    @property
+    def function(self) -> 'Callable or None':
+        """
+        This is the receiver (or ``None`` if it has been garbage-collected).
+        """
+        return self._function if self._ref is None else self._ref()
+
+    def __call__(self, signal, sender, named: dict):
+        function = self._function if self._ref is None else self._ref()
+        if function is None:
+            return None
+        if self._all:
+            return function(signal=signal, sender=sender, **named)
+        arguments = {name: named[name] for name in self._names if name in named}
+        if self._signal:
+            arguments['signal'] = signal
+        if self._sender:
+            arguments['sender'] = sender
+        return function(**arguments)
+
+    def deliver(self, event: Event):
+        """
+        Call the receiver with an :py:class:`Event`'s arguments (which are its ``data``, its ``timestamp`` and the
+        ``event`` itself).
+        """
+        function = self._function if self._ref is None else self._ref()
+        if function is None:
+            return None
+        # Most receivers want the data (or the event) and nothing else, and those we can call without building a
+        # dictionary of arguments.
+        if not (self._all or self._signal or self._sender):
+            names = self._names
+            if names == ('data',):
+                return function(data=event.data)
+            if names == ('event',):
+                return function(event=event)
+            if not names:
+                return function()
+        return self(event.signal, event.sender, {'data': event.data, 'timestamp': event.timestamp, 'event': event})
+
+
+class EventBus(object):
+    """
+    This is an in-process event bus.  Receivers are connected to a signal (or :py:data:`Any` signal) from a sender (or
+    :py:data:`Any` sender), and are called directly, on the sending thread, when a matching signal is sent.
+
+    Receivers are passed only those of the signal's arguments that appear in their signatures (plus ``signal`` and
+    ``sender`` if they ask for them), or all of them if they accept ``**kwargs``.
+    """
+    Any = Any  #: Connect with this to receive any signal (or signals from any sender).
+    Anonymous = Anonymous  #: This is the sender of signals sent without one.
+
+    def __init__(self):
+        self._lock = threading.RLock()  # This is only taken to connect and disconnect.
+        self._connections: 'Dict[tuple, List[Receiver]]' = {}  # the receivers for each (signal, sender key)
+        # the senders we're watching (so we can forget them), or holding on to (so their IDs aren't reused)
+        self._senders: 'Dict[int, object]' = {}
+        self._routes: 'Dict[tuple, Tuple[Receiver, ...]]' = {}  # the receivers for each (signal, sender key) sent
+
+    @staticmethod
+    def _sender_key(sender):
+        return sender if sender is Any else id(sender)
+
+    def connect(self, receiver: 'Callable', signal=Any, sender=Any, weak: bool = True):
+        """
+        Connect a receiver to a signal.
+
+        :param receiver: the function (or method, or other callable) to call when the signal is sent
+        :param signal: the signal (or :py:data:`Any` signal)
+        :param sender: the sender (or :py:data:`Any` sender)
+        :param weak: Should we hold only a weak reference to the receiver?  (If so, the receiver is disconnected
+            automatically when it's garbage-collected.)
+        :type weak:  ``bool``
+        """
+        with self._lock:
+            key = (signal, self._sender_key(sender))
+            # Connecting the same receiver twice replaces the first connection.
+            self._remove(key, Receiver.key(receiver))
+            self._connections.setdefault(key, []).append(
+                Receiver(receiver, weak=weak, on_dead=lambda r: self._forget_receiver(key, r)))
+            # If this is a sender we haven't seen, we want to forget about it when it's gone.
+            if sender is not Any and id(sender) not in self._senders:
+                try:
+                    self._senders[id(sender)] = weakref.finalize(sender, self._forget_sender, id(sender))
+                except TypeError:
+                    # This sender can't be weakly referenced, so we keep it alive (until its last receiver is
+                    # disconnected) lest another object be given its ID and hear its signals.
+                    self._senders[id(sender)] = sender
+            self._routes = {}
+
+    def disconnect(self, receiver: 'Callable' = Any, signal=Any, sender=Any, weak: bool = True):
+        """
+        Disconnect a receiver from a signal.
+
+        :param receiver: the receiver (or :py:data:`Any` to disconnect every receiver of the signal from the sender)
+        :param signal: the signal (or :py:data:`Any` signal) given when the receiver was connected
+        :param sender: the sender (or :py:data:`Any` sender) given when the receiver was connected
+        :param weak: (This is accepted for compatibility and ignored.)
+        """
+        with self._lock:
+            key = (signal, self._sender_key(sender))
+            if receiver is Any:
+                self._connections.pop(key, None)
+            else:
+                self._remove(key, Receiver.key(receiver))
+            self._release_sender(key[1])
+            self._routes = {}
+
+    def disconnect_sender(self, sender):
+        """
+        Disconnect every receiver of every signal from a sender.
+
+        :param sender: the sender
+        """
+        with self._lock:
+            self._drop_sender(id(sender))
+
+    def send(self, signal=Any, sender=Anonymous, **named) -> 'List[Tuple[Callable, object]]':
+        """
+        Send a signal, calling each of the receivers connected to it.
+
+        :param signal: the signal
+        :param sender: the sender
+        :param named: the signal's arguments
+        :return: each receiver that was called, and what it returned (just as PyDispatcher reports them)
+        :rtype:  ``list``
+        """
+        routes = self._routes
+        try:
+            receivers = routes[(signal, id(sender))]
+        except KeyError:
+            receivers = routes[(signal, id(sender))] = self._route(signal, sender)
+        responses = []
+        for receiver in receivers:
+            function = receiver.function
+            if function is not None:
+                responses.append((function, receiver(signal, sender, named)))
+        return responses
+
+    def send_event(self, event: Event):
+        """
+        Send an :py:class:`Event`.  Receivers connected to its signal from its sender are called just as they would be
+        by :py:func:`EventBus.send`, with the event's ``data`` and ``timestamp`` (and the ``event`` itself, for those
+        that ask for it) as the signal's arguments.  (So that sending one doesn't allocate anything, the receivers'
+        responses aren't collected.)
+
+        :param event: the event
+        :type event:  :py:class:`Event`
+        """
+        signal, sender = event.signal, event.sender
+        routes = self._routes
+        try:
+            receivers = routes[(signal, id(sender))]
+        except KeyError:
+            receivers = routes[(signal, id(sender))] = self._route(signal, sender)
+        for receiver in receivers:
+            receiver.deliver(event)
+
+    def receivers(self, signal=Any, sender=Anonymous) -> 'List[Callable]':
+        """
+        Get the (live) receivers that would be called if a signal were sent.
+
+        :param signal: the signal
+        :param sender: the sender
+        :rtype: ``list``
+        """
+        functions = (receiver.function for receiver in self._route(signal, sender))
+        return [function for function in functions if function is not None]
+
+    def _route(self, signal, sender) -> 'Tuple[Receiver, ...]':
+        """
+        Work out which receivers get a signal from a sender (in the order PyDispatcher would call them).
+        """
+        connections = self._connections
+        receivers = []
+        seen = set()
+        for key in ((signal, id(sender)), (Any, id(sender)), (signal, Any), (Any, Any)):
+            for receiver in connections.get(key, ()):
+                if receiver._key not in seen:
+                    seen.add(receiver._key)
+                    receivers.append(receiver)
+        return tuple(receivers)
+
+    def _remove(self, key: tuple, receiver_key):
+        receivers = self._connections.get(key)
+        if receivers:
+            receivers[:] = [r for r in receivers if r._key != receiver_key]
+            if not receivers:
+                del self._connections[key]
+
+    def _forget_receiver(self, key: tuple, receiver: Receiver):
+        """
+        This is called when a weakly-referenced receiver has been garbage-collected.
+        """
+        with self._lock:
+            receivers = self._connections.get(key)
+            if receivers and receiver in receivers:
+                receivers.remove(receiver)
+                if not receivers:
+                    del self._connections[key]
+                    self._release_sender(key[1])
+            self._routes = {}
+
+    def _forget_sender(self, sender_id: int):
+        """
+        This is called when a sender has been garbage-collected.
+        """
+        with self._lock:
+            self._drop_sender(sender_id)
+
+    def _release_sender(self, sender_key):
+        """
+        Stop holding on to a sender that can't be weakly referenced once nobody's listening to it any more.
+        """
+        held = self._senders.get(sender_key)
+        if held is None or isinstance(held, weakref.finalize):
+            return
+        if not any(k[1] == sender_key for k in self._connections):
+            del self._senders[sender_key]
+
+    def _drop_sender(self, sender_id: int):
+        for key in [k for k in self._connections if k[1] == sender_id]:
+            del self._connections[key]
+        held = self._senders.pop(sender_id, None)
+        if isinstance(held, weakref.finalize):
+            held.detach()
+        self._routes = {}
+
+
+dispatcher = EventBus()  #: This is the bus through which cnxman sends its signals.
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.framing
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Raw bytes go in, whole frames come out.
+"""
+
+from abc import ABCMeta, abstractmethod
+# (We only need typing for the annotations, and it's slow to import.)
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import List
+
+
+class FrameDecoder(metaclass=ABCMeta):
+    """
+    Extend this class to define a framing protocol.  A frame decoder is fed data incrementally (in whatever chunks it
+    happens to arrive) and hands back each complete frame exactly once.  Partial frames are kept in a single reusable
+    buffer until the rest of the frame arrives.
+
+    :seealso:  :py:func:`FrameDecoder.feed`
+    """
+
+    def __init__(self, max_frame_size: int = 65536):
+        """
+
+        :param max_frame_size: the size (in bytes) beyond which a partial frame is discarded
+        :type max_frame_size:  ``int``
+        """
+        self._max_frame_size = max_frame_size  # How big can a frame get before we give up on it?
+        self._buffer = bytearray()  # the bytes we've received but haven't yet framed
+        self._scanned = 0  # how far into the buffer we've already looked (so we don't look again)
+        self._discarding = False  # Are we throwing bytes away until the next frame boundary?
+        self._discarded = 0  # the number of bytes we've thrown away
+
+    @property
+    def max_frame_size(self) -> int:
+        """
+        This is the size (in bytes) beyond which a partial frame is discarded.
+
+        :rtype: ``int``
+        """
+        return self._max_frame_size
+
+    @property
+    def discarded(self) -> int:
+        """
+        This is the number of bytes discarded because they could not be framed.
+
+        :rtype: ``int``
+        """
+        return self._discarded
+
+    @property
+    def pending(self) -> int:
+        """
+        This is the number of bytes waiting for the rest of their frame.
+
+        :rtype: ``int``
+        """
+        return len(self._buffer)
+
+    def reset(self):
+        """
+        Forget any partial frame (for example, when the underlying connection is re-established).
+        """
+        self._buffer.clear()
+        self._scanned = 0
+        self._discarding = False
+
+    def feed(self, data) -> 'List[bytes]':
+        """
+        Feed data to the decoder.
+
+        :param data: the data (``bytes``, ``bytearray`` or :py:class:`memoryview`)
+        :return: the frames completed by this data, in the order they were received
+        :rtype:  ``list`` of ``bytes``
+        """
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        consumed = self._decode(buffer, frames)
+        # Drop the bytes we've framed.  (Deleting from the front of a bytearray doesn't move the rest of it.)
+        if consumed:
+            del buffer[:consumed]
+            self._scanned = max(0, self._scanned - consumed)
+        # If the partial frame has grown too big, it's not going to end well.
+        if len(buffer) > self._max_frame_size:
+            self._discarded += len(buffer)
+            self.reset()
+            self._discarding = True
+        return frames
+
+    @abstractmethod
+    def _decode(self, buffer: bytearray, frames: 'List[bytes]') -> int:
+        """
+        Override this method to find the complete frames in the buffer.
+
+        :param buffer: the buffered data
+        :type buffer:  ``bytearray``
+        :param frames: the list to which complete frames are appended
+        :type frames:  ``list``
+        :return: the number of bytes (from the start of the buffer) that have been consumed
+        :rtype:  ``int``
+        """
+        pass
+
+    @abstractmethod
+    def encode(self, payload: bytes) -> bytes:
+        """
+        Override this method to wrap a payload in a frame that this decoder understands.
+
+        :param payload: the payload
+        :type payload:  ``bytes``
+        :return: the framed payload
+        :rtype:  ``bytes``
+        """
+        pass
+
+
+class DelimitedFrameDecoder(FrameDecoder):
+    """
+    This decoder splits data into frames separated by a delimiter (like a newline).
+    """
+    def __init__(self, delimiter: bytes = b'\n', strip: bool = True, max_frame_size: int = 65536):
+        """
+
+        :param delimiter: the byte sequence that marks the end of a frame
+        :type delimiter:  ``bytes``
+        :param strip: Should the delimiter be removed from the frames?
+        :type strip:  ``bool``
+        :param max_frame_size: the size (in bytes) beyond which a partial frame is discarded
+        :type max_frame_size:  ``int``
+        """
+        super().__init__(max_frame_size=max_frame_size)
+        if not delimiter:
+            raise ValueError('The delimiter cannot be empty.')
+        self._delimiter = bytes(delimiter)
+        self._strip = strip
+
+    def _decode(self, buffer: bytearray, frames: 'List[bytes]') -> int:
+        delimiter = self._delimiter
+        width = len(delimiter)
+        start = 0
+        # Pick up the search where we left off last time (allowing for a delimiter split across chunks).
+        index = buffer.find(delimiter, max(0, self._scanned - width + 1))
+        while index >= 0:
+            end = index + width
+            # If we've been discarding bytes, the first delimiter brings us back in sync.
+            if self._discarding:
+                self._discarded += end
+                self._discarding = False
+            else:
+                frames.append(bytes(buffer[start:index if self._strip else end]))
+            start = end
+            index = buffer.find(delimiter, start)
+        self._scanned = len(buffer)
+        return start
+
+    def encode(self, payload: bytes) -> bytes:
+        return bytes(payload) + self._delimiter
+
+
+class FixedSizeFrameDecoder(FrameDecoder):
+    """
+    This decoder splits data into frames of a fixed size.
+    """
+    def __init__(self, size: int):
+        """
+
+        :param size: the size of each frame
+        :type size:  ``int``
+        """
+        if size < 1:
+            raise ValueError('The frame size must be at least 1.')
+        super().__init__(max_frame_size=size)
+        self._size = size
+
+    def _decode(self, buffer: bytearray, frames: 'List[bytes]') -> int:
+        size = self._size
+        end = len(buffer) - len(buffer) % size
+        with memoryview(buffer) as view:
+            for start in range(0, end, size):
+                frames.append(bytes(view[start:start + size]))
+        return end
+
+    def encode(self, payload: bytes) -> bytes:
+        if len(payload) != self._size:
+            raise ValueError('The payload must be exactly {size} bytes.'.format(size=self._size))
+        return bytes(payload)
+
+
+class LengthPrefixedFrameDecoder(FrameDecoder):
+    """
+    This decoder reads frames that begin with a fixed-width, unsigned length header.
+    """
+    def __init__(self,
+                 header_size: int = 2,
+                 byteorder: str = 'big',
+                 include_header: bool = False,
+                 max_frame_size: int = 65536):
+        """
+
+        :param header_size: the width (in bytes) of the length header
+        :type header_size:  ``int``
+        :param byteorder: the byte order of the length header (``'big'`` or ``'little'``)
+        :type byteorder:  ``str``
+        :param include_header: Does the length in the header count the header itself?
+        :type include_header:  ``bool``
+        :param max_frame_size: the size (in bytes) beyond which a frame is discarded
+        :type max_frame_size:  ``int``
+        """
+        super().__init__(max_frame_size=max_frame_size)
+        if header_size < 1:
+            raise ValueError('The header size must be at least 1.')
+        self._header_size = header_size
+        self._byteorder = byteorder
+        self._include_header = include_header
+
+    def _decode(self, buffer: bytearray, frames: 'List[bytes]') -> int:
+        header_size = self._header_size
+        available = len(buffer)
+        start = 0
+        with memoryview(buffer) as view:
+            while available - start >= header_size:
+                length = int.from_bytes(view[start:start + header_size], self._byteorder)
+                payload_start = start + header_size
+                end = start + length if self._include_header else payload_start + length
+                # A length we can't honor means the stream is corrupt, so throw away what we have.
+                if end < payload_start or end - start > self._max_frame_size:
+                    self._discarded += available - start
+                    return available
+                if end > available:
+                    break
+                frames.append(bytes(view[payload_start:end]))
+                start = end
+        return start
+
+    def encode(self, payload: bytes) -> bytes:
+        length = len(payload) + (self._header_size if self._include_header else 0)
+        return length.to_bytes(self._header_size, self._byteorder) + bytes(payload)
+
+
+class SlipFrameDecoder(FrameDecoder):
+    """
+    This decoder reads frames encoded with the Serial Line Internet Protocol (`RFC 1055
+    <https://tools.ietf.org/html/rfc1055>`_).
+    """
+    END = 0xC0  #: the byte that marks the end of a frame
+    ESC = 0xDB  #: the escape byte
+    ESC_END = 0xDC  #: an escaped ``END`` byte follows the escape byte
+    ESC_ESC = 0xDD  #: an escaped ``ESC`` byte follows the escape byte
+
+    def _decode(self, buffer: bytearray, frames: 'List[bytes]') -> int:
+        start = 0
+        index = buffer.find(self.END, self._scanned)
+        while index >= 0:
+            if self._discarding:
+                self._discarded += index + 1
+                self._discarding = False
+            # Back-to-back END bytes just mean an empty frame, which we don't report.
+            elif index > start:
+                frame = bytes(buffer[start:index])
+                if self.ESC in frame:
+                    frame = frame.replace(b'\xdb\xdc', b'\xc0').replace(b'\xdb\xdd', b'\xdb')
+                frames.append(frame)
+            start = index + 1
+            index = buffer.find(self.END, start)
+        self._scanned = len(buffer)
+        return start
+
+    def encode(self, payload: bytes) -> bytes:
+        return bytes(payload).replace(b'\xdb', b'\xdb\xdd').replace(b'\xc0', b'\xdb\xdc') + b'\xc0'
+
+
+class CobsFrameDecoder(FrameDecoder):
+    """
+    This decoder reads zero-delimited frames encoded with Consistent Overhead Byte Stuffing (COBS).  Frames that
+    cannot be decoded are discarded.
+    """
+    def _decode(self, buffer: bytearray, frames: 'List[bytes]') -> int:
+        start = 0
+        index = buffer.find(0, self._scanned)
+        with memoryview(buffer) as view:
+            while index >= 0:
+                if self._discarding:
+                    self._discarded += index + 1
+                    self._discarding = False
+                elif index > start:
+                    frame = self._unstuff(view[start:index])
+                    if frame is None:
+                        self._discarded += index - start
+                    else:
+                        frames.append(frame)
+                start = index + 1
+                index = buffer.find(0, start)
+        self._scanned = len(buffer)
+        return start
+
+    @staticmethod
+    def _unstuff(encoded: memoryview) -> bytes or None:
+        """
+        Decode a single COBS-encoded frame (without its trailing zero).
+
+        :param encoded: the encoded frame
+        :type encoded:  :py:class:`memoryview`
+        :return: the decoded frame, or ``None`` if the frame is malformed
+        """
+        decoded = bytearray()
+        length = len(encoded)
+        index = 0
+        while index < length:
+            code = encoded[index]
+            end = index + code
+            if end > length:
+                return None
+            decoded += encoded[index + 1:end]
+            index = end
+            # Every block except a full one (or the last one) stands in for a zero.
+            if code < 0xFF and index < length:
+                decoded.append(0)
+        return bytes(decoded)
+
+    def encode(self, payload: bytes) -> bytes:
+        encoded = bytearray()
+        payload = bytes(payload)
+        block_start = 0
+        while True:
+            # A block runs up to the next zero, but can't hold more than 254 bytes.
+            zero = payload.find(0, block_start, block_start + 254)
+            if zero < 0:
+                block_end = min(len(payload), block_start + 254)
+                encoded.append(block_end - block_start + 1)
+                encoded += payload[block_start:block_end]
+                if block_end == len(payload):
+                    break
+                # A full block isn't followed by a zero, so we pick up right where it ended.
+                block_start = block_end
+            else:
+                encoded.append(zero - block_start + 1)
+                encoded += payload[block_start:zero]
+                block_start = zero + 1
+        encoded.append(0)
+        return bytes(encoded)
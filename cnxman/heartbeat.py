@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.heartbeat
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Are you still there?
+
+A port can stay open long after the device on the other end has stopped talking.  A :py:class:`HeartbeatMonitor`
+notices, and raises the connection's alarm (which a connection manager answers by reconnecting) when a connection
+fails a probe of your choosing or goes quiet for too long.
+
+.. code-block:: python
+
+    monitor = HeartbeatMonitor()
+    for connection in connections:
+        monitor.watch(connection, silence=30)  # Nothing for 30 seconds?  Something's wrong.
+
+Every heartbeat is a call waiting in a single :py:class:`cnxman.scheduling.Scheduler`, so watching thousands of
+connections costs thousands of entries in a heap rather than thousands of threads.
+"""
+
+import threading
+import time
+from .basics import Connection
+from .events import dispatcher
+from .metrics import registry
+from .scheduling import ScheduledCall, Scheduler
+# typing is slow to import, and only the annotations need it.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable, Dict
+
+
+class Heartbeat(object):
+    """
+    This is a connection's heartbeat:  the probe we run and the silence we tolerate, and when we last heard from it.
+
+    :seealso:  :py:func:`HeartbeatMonitor.watch`
+    """
+    def __init__(self,
+                 connection: Connection,
+                 scheduler: Scheduler,
+                 interval: float,
+                 probe: 'Callable[[Connection], bool]' = None,
+                 silence: float = None,
+                 signal=None):
+        """
+
+        :param connection: the connection
+        :type connection:  :py:class:`cnxman.basics.Connection`
+        :param scheduler: the scheduler that runs our checks
+        :type scheduler:  :py:class:`cnxman.scheduling.Scheduler`
+        :param interval: how often (in seconds) we run the probe
+        :type interval:  ``float``
+        :param probe: a function that's passed the connection and returns ``True`` if all is well
+        :param silence: how long (in seconds) the connection may go without any activity
+        :type silence:  ``float``
+        :param signal: the signal the connection sends when there's activity
+        """
+        self._connection = connection
+        self._scheduler = scheduler
+        self._interval = interval
+        self._probe = probe
+        self._silence = silence
+        self._signal = signal
+        self._lock = threading.Lock()
+        self._last_activity = time.monotonic()  # when we last heard from the connection
+        self._next_probe = self._last_activity + interval  # when we next run the probe
+        self._alarms = 0  # the number of alarms we've raised
+        self._call: ScheduledCall = None  # our next check
+        self._cancelled = False
+        if signal is not None:
+            dispatcher.connect(self._handle_activity, signal=signal, sender=connection)
+
+    @property
+    def connection(self) -> Connection:
+        """
+        This is the connection.
+
+        :rtype: :py:class:`cnxman.basics.Connection`
+        """
+        return self._connection
+
+    @property
+    def interval(self) -> float:
+        """
+        This is how often (in seconds) we run the probe.
+
+        :rtype: ``float``
+        """
+        return self._interval
+
+    @property
+    def silence(self) -> float or None:
+        """
+        This is how long (in seconds) the connection may go without any activity (if we're listening for silence).
+
+        :rtype: ``float``
+        """
+        return self._silence
+
+    @property
+    def last_activity(self) -> float:
+        """
+        This is when (according to :py:func:`time.monotonic`) we last heard from the connection.
+
+        :rtype: ``float``
+        """
+        return self._last_activity
+
+    @property
+    def alarms(self) -> int:
+        """
+        This is the number of alarms we've raised.
+
+        :rtype: ``int``
+        """
+        return self._alarms
+
+    def beat(self):
+        """
+        Note that we've heard from the connection.
+        """
+        self._last_activity = time.monotonic()
+
+    def start(self):
+        """
+        Schedule the first check.
+        """
+        self._schedule()
+
+    def cancel(self):
+        """
+        Stop checking the connection.
+        """
+        with self._lock:
+            self._cancelled = True
+            if self._call is not None:
+                self._call.cancel()
+                self._call = None
+        if self._signal is not None:
+            dispatcher.disconnect(self._handle_activity, signal=self._signal, sender=self._connection)
+
+    def _handle_activity(self):
+        """
+        This is a handler for the connection's activity signal.
+        """
+        self._last_activity = time.monotonic()
+
+    def _schedule(self):
+        """
+        Schedule the next check for whenever the next thing is due:  the probe, or the end of the silence we tolerate.
+        """
+        when = self._next_probe if self._probe is not None else None
+        if self._silence is not None:
+            quiet_until = self._last_activity + self._silence
+            when = quiet_until if when is None else min(when, quiet_until)
+        with self._lock:
+            if not self._cancelled:
+                self._call = self._scheduler.call_at(when, self._check)
+
+    def _check(self):
+        """
+        Run whatever checks are due.  (This is called by the scheduler.)
+        """
+        now = time.monotonic()
+        reason = None
+        if self._probe is not None and now >= self._next_probe:
+            self._next_probe = now + self._interval
+            try:
+                healthy = self._probe(self._connection)
+            except Exception:
+                healthy = False
+            if not healthy:
+                reason = 'probe'
+        if reason is None and self._silence is not None and now - self._last_activity >= self._silence:
+            reason = 'silence'
+        if reason is not None:
+            # Whatever happens next (a reconnection, probably), the silence starts over from here.
+            self._last_activity = time.monotonic()
+            self._alarms += 1
+            if registry.enabled:
+                registry.counter('cnxman_heartbeat_failures_total', 'heartbeats that raised the alarm',
+                                 connection=self._connection.name, reason=reason).inc()
+            try:
+                self._connection.raise_alarm()
+            except Exception:
+                pass  # (The manager may not be in a state to hear it, but that's no reason to stop listening.)
+        self._schedule()
+
+
+class HeartbeatMonitor(object):
+    """
+    This object keeps a heartbeat for each of the connections it watches, and raises a connection's alarm when its
+    probe fails or it's been quiet for too long.  All the checks are made by one scheduler.
+    """
+    def __init__(self, scheduler: Scheduler = None):
+        """
+
+        :param scheduler: the scheduler that runs the checks (the default is the shared scheduler, whose worker
+            threads run the probes)
+        :type scheduler:  :py:class:`cnxman.scheduling.Scheduler`
+        """
+        self._scheduler = scheduler if scheduler is not None else Scheduler.default()
+        self._heartbeats: 'Dict[Connection, Heartbeat]' = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heartbeats)
+
+    def __contains__(self, connection: Connection):
+        return connection in self._heartbeats
+
+    def watch(self,
+              connection: Connection,
+              interval: float = 5.0,
+              probe: 'Callable[[Connection], bool]' = None,
+              silence: float = None,
+              signal=None) -> Heartbeat:
+        """
+        Start watching a connection.  (If we were already watching it, the old heartbeat is replaced.)
+
+        :param connection: the connection
+        :type connection:  :py:class:`cnxman.basics.Connection`
+        :param interval: how often (in seconds) we run the probe
+        :type interval:  ``float``
+        :param probe: a function that's passed the connection and returns ``True`` if all is well (it runs on the
+            scheduler's threads, so it shouldn't take long)
+        :param silence: how long (in seconds) the connection may go without any activity before we raise the alarm
+        :type silence:  ``float``
+        :param signal: the signal the connection sends when there's activity (the default is the ``DATA_RECEIVED``
+            member of the connection's ``Signals``, if it has one); you can also call :py:func:`HeartbeatMonitor.beat`
+        :return: the connection's heartbeat
+        :rtype:  :py:class:`Heartbeat`
+        """
+        if probe is None and silence is None:
+            raise ValueError('A heartbeat needs a probe, a tolerance for silence, or both.')
+        if interval <= 0 or (silence is not None and silence <= 0):
+            raise ValueError('The interval and the silence must be positive.')
+        if silence is not None and signal is None:
+            signal = getattr(getattr(connection, 'Signals', None), 'DATA_RECEIVED', None)
+        heartbeat = Heartbeat(connection, self._scheduler,
+                              interval=interval, probe=probe, silence=silence, signal=signal)
+        with self._lock:
+            previous = self._heartbeats.get(connection)
+            self._heartbeats[connection] = heartbeat
+        if previous is not None:
+            previous.cancel()
+        heartbeat.start()
+        return heartbeat
+
+    def unwatch(self, connection: Connection):
+        """
+        Stop watching a connection.
+
+        :param connection: the connection
+        :type connection:  :py:class:`cnxman.basics.Connection`
+        """
+        with self._lock:
+            heartbeat = self._heartbeats.pop(connection, None)
+        if heartbeat is not None:
+            heartbeat.cancel()
+
+    def beat(self, connection: Connection):
+        """
+        Note that we've heard from a connection.
+
+        :param connection: the connection
+        :type connection:  :py:class:`cnxman.basics.Connection`
+        """
+        heartbeat = self._heartbeats.get(connection)
+        if heartbeat is not None:
+            heartbeat.beat()
+
+    def heartbeat(self, connection: Connection) -> Heartbeat or None:
+        """
+        Get a connection's heartbeat.
+
+        :param connection: the connection
+        :type connection:  :py:class:`cnxman.basics.Connection`
+        :return: the heartbeat (or ``None`` if we're not watching the connection)
+        :rtype:  :py:class:`Heartbeat`
+        """
+        return self._heartbeats.get(connection)
+
+    def stop(self):
+        """
+        Stop watching all the connections.
+        """
+        with self._lock:
+            heartbeats = list(self._heartbeats.values())
+            self._heartbeats.clear()
+        for heartbeat in heartbeats:
+            heartbeat.cancel()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.hub
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+One thread, many ports.
+
+A :py:class:`cnxman.serial.SerialConnection` normally reads its port on a listener thread of its own, which is fine
+for a handful of ports but not for a gateway with hundreds of them.  Give the connections a :py:class:`SerialHub`
+instead and they're all read from the hub's threads (of which there is one, unless you ask for more).
+
+.. code-block:: python
+
+    hub = SerialHub()
+    connections = [SerialConnection(port, hub=hub) for port in ports]
+"""
+
+from collections import deque
+import os
+import selectors
+import socket
+import threading
+import time
+from .events import dispatcher, Event
+from .logging import loggable_class as loggable
+from .metrics import registry, SIZE_BUCKETS
+from .serial import SerialListener
+from .tracing import tracer
+# The hub never opens a port itself, so only type checkers need pyserial (and typing).
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable, Dict, List
+    import serial as pyserial
+
+
+@loggable(logger_name='cnxman.hub.SerialHub')
+class _HubLoop(threading.Thread):
+    """
+    This is one of a hub's threads.  It waits on a selector for any of its ports to become readable (and polls the
+    ports that don't have file descriptors).
+    """
+    def __init__(self, name: str, chunk_size: int, poll_interval: float):
+        super().__init__(name=name)
+        # Threads of this type run as daemons.
+        self.daemon = True
+        self._chunk_size = chunk_size  # the most bytes we read at once
+        self._poll_interval = poll_interval  # how often we poll ports that don't have file descriptors
+        self._selector = selectors.DefaultSelector()
+        # We write to one end of this pair to wake the selector when there's work for us.
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+        self._pending = deque()  # the functions we've been asked to call on this thread
+        self._polled: 'List[pyserial.Serial]' = []  # the ports that don't have file descriptors
+        # This is the event we fill in (and send) each time we read from one of our ports.
+        self._data_event = Event(signal=SerialListener.Signals.DATA_RECEIVED)
+        self._ports = 0  # the number of ports we're servicing
+        self._closed = False
+
+    @property
+    def ports(self) -> int:
+        """
+        This is the number of ports we're servicing.
+        """
+        return self._ports
+
+    def submit(self, fn: 'Callable[[], None]'):
+        """
+        Call a function on this thread (and wait until it has been called).
+        """
+        if threading.current_thread() is self or not self.is_alive():
+            fn()
+            return
+        done = threading.Event()
+
+        def call():
+            try:
+                fn()
+            finally:
+                done.set()
+        self._pending.append(call)
+        self._wake()
+        # If the thread stops before it gets to us, we'll do it ourselves.
+        while not done.wait(0.1):
+            if not self.is_alive():
+                fn()
+                return
+
+    def add(self, serial: 'pyserial.Serial'):
+        """
+        Start servicing a port.
+        """
+        try:
+            fd = serial.fileno()
+        except (AttributeError, OSError):
+            fd = None  # (Some ports, like 'loop://' URLs, have no file descriptor.)
+        if fd is None:
+            self._polled.append(serial)
+        else:
+            self._selector.register(fd, selectors.EVENT_READ, serial)
+        self._ports += 1
+
+    def remove(self, serial: 'pyserial.Serial'):
+        """
+        Stop servicing a port.
+        """
+        if serial in self._polled:
+            self._polled.remove(serial)
+        else:
+            for key in list(self._selector.get_map().values()):
+                if key.data is serial:
+                    self._selector.unregister(key.fileobj)
+                    break
+            else:
+                return  # We weren't servicing this port (anymore).
+        self._ports -= 1
+
+    def close(self):
+        """
+        Stop the thread.
+        """
+        self._closed = True
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_writer.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass  # There's already a wake-up waiting (or we've been closed).
+
+    def _read(self, serial: 'pyserial.Serial', fd: int = None):
+        """
+        Read whatever a port has for us and send it along.
+        """
+        try:
+            if fd is not None:
+                data = os.read(fd, self._chunk_size)
+                # A readable descriptor with nothing to read has reached the end.
+                if not data:
+                    raise EOFError('The port closed.')
+            else:
+                waiting = serial.in_waiting
+                if not waiting:
+                    return
+                data = serial.read(min(waiting, self._chunk_size))
+        except (BlockingIOError, InterruptedError):
+            return
+        except Exception:
+            # The port is no good to us anymore.
+            self.logger.error('Could not read from %s.', serial.port, exc_info=True)
+            self.remove(serial)
+            if registry.enabled:
+                registry.counter('cnxman_serial_read_errors_total', 'errors serial listeners ran into',
+                                 port=serial.port).inc()
+            dispatcher.send(signal=SerialListener.Signals.READ_ERROR, sender=serial)
+            return
+        if registry.enabled:
+            registry.counter('cnxman_serial_reads_total', 'chunks read by serial listeners', port=serial.port).inc()
+            registry.counter('cnxman_serial_bytes_read_total', 'bytes read by serial listeners',
+                             port=serial.port).inc(len(data))
+            registry.histogram('cnxman_serial_chunk_bytes', 'the sizes of the chunks serial listeners read',
+                               buckets=SIZE_BUCKETS, port=serial.port).observe(len(data))
+        trace = tracer.begin(serial.port, len(data)) if tracer.enabled else None
+        event = self._data_event
+        event.sender, event.data, event.timestamp = serial, data, time.monotonic_ns()
+        if trace is not None:
+            trace.dispatch = time.perf_counter_ns()
+        try:
+            dispatcher.send_event(event)
+        except Exception:
+            # One port's troubles are no reason to stop servicing the others.
+            self.logger.error('A subscriber to %s failed.', serial.port, exc_info=True)
+        event.sender = event.data = None
+        if trace is not None:
+            tracer.finish(trace)
+
+    def run(self):
+        """
+        Service the ports until we're closed.
+        """
+        while not self._closed:
+            while self._pending:
+                self._pending.popleft()()
+            for key, _ in self._selector.select(self._poll_interval if self._polled else None):
+                if key.fileobj is self._wake_reader:
+                    try:
+                        while self._wake_reader.recv(4096):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                else:
+                    self._read(key.data, key.fd)
+            for serial in list(self._polled):
+                self._read(serial)
+        # Anybody still waiting on us can stop waiting.
+        while self._pending:
+            self._pending.popleft()()
+        self._selector.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+
+
+class SerialHub(object):
+    """
+    This object reads any number of serial ports on a small, fixed number of threads.  The signals it sends for each
+    port look just like the ones a :py:class:`cnxman.serial.SerialListener` sends, except that the sender is the
+    port itself.
+
+    :seealso:  :py:class:`cnxman.serial.SerialConnection`
+    """
+    def __init__(self, threads: int = 1, chunk_size: int = 4096, poll_interval: float = 0.01):
+        """
+
+        :param threads: the number of threads that service the ports
+        :type threads:  ``int``
+        :param chunk_size: the maximum number of bytes delivered in a single data signal
+        :type chunk_size:  ``int``
+        :param poll_interval: how often (in seconds) ports that don't have file descriptors (like ``loop://`` URLs)
+            are polled
+        :type poll_interval:  ``float``
+        """
+        if threads < 1:
+            raise ValueError('A hub needs at least one thread.')
+        if chunk_size < 1:
+            raise ValueError('The chunk size must be at least 1.')
+        self._threads = threads  # the most threads we'll start
+        self._chunk_size = chunk_size  # the most bytes we'll send along in one signal
+        self._poll_interval = poll_interval  # how often we poll ports without file descriptors
+        self._loops: 'List[_HubLoop]' = []  # the threads we've started so far
+        self._assignments: 'Dict[int, _HubLoop]' = {}  # the thread servicing each port (by the port's ID)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def threads(self) -> int:
+        """
+        This is the number of threads that service the ports.
+
+        :rtype: ``int``
+        """
+        return self._threads
+
+    @property
+    def ports(self) -> int:
+        """
+        This is the number of ports the hub is servicing.
+
+        :rtype: ``int``
+        """
+        return len(self._assignments)
+
+    def register(self, serial: 'pyserial.Serial'):
+        """
+        Start reading a port.  (The port should have a read timeout of ``0``.)
+
+        :param serial: the port
+        :type serial:  :py:class:`pyserial.Serial`
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The hub has been closed.')
+            if id(serial) in self._assignments:
+                return
+            # The port goes to the least busy thread (and we start another thread if we're allowed to).
+            if len(self._loops) < self._threads:
+                loop = _HubLoop(name='cnxman-hub-{n}'.format(n=len(self._loops)),
+                                chunk_size=self._chunk_size,
+                                poll_interval=self._poll_interval)
+                self._loops.append(loop)
+                loop.start()
+            else:
+                loop = min(self._loops, key=lambda l: l.ports)
+            self._assignments[id(serial)] = loop
+        loop.submit(lambda: loop.add(serial))
+
+    def unregister(self, serial: 'pyserial.Serial'):
+        """
+        Stop reading a port.  Once this method returns, the hub won't touch the port again.
+
+        :param serial: the port
+        :type serial:  :py:class:`pyserial.Serial`
+        """
+        with self._lock:
+            loop = self._assignments.pop(id(serial), None)
+        if loop is not None:
+            loop.submit(lambda: loop.remove(serial))
+
+    def close(self):
+        """
+        Stop the hub's threads.  (The ports themselves are left as they are.)
+        """
+        with self._lock:
+            self._closed = True
+            loops, self._loops = self._loops, []
+            self._assignments.clear()
+        for loop in loops:
+            loop.close()
+        for loop in loops:
+            if loop is not threading.current_thread():
+                loop.join()
@@ -6,12 +6,135 @@
 .. moduleauthor:: Pat Daburu <pat@daburu.net>
 
 Dear diary...
+
+cnxman's classes log through the standard :py:mod:`logging` module, under the ``cnxman`` logger.  Their messages are
+formatted lazily (so a level nobody is listening to costs next to nothing), and each class's logger passes its records
+through :py:data:`rate_limit`, so a port that fails the same way a thousand times a second doesn't log a thousand
+messages a second.
+
+Logging handlers do their work on the thread that logs, and a slow handler (a file on a busy disk, say) would hold up
+the thread that reads the port.  :py:class:`BackgroundLogging` hands the records to your handlers on a thread of their
+own instead.
+
+.. code-block:: python
+
+    with BackgroundLogging(logging.FileHandler('cnxman.log'), level=logging.INFO):
+        ...
 """
-import logging
+
+from collections import OrderedDict
+import threading
+import time
+# The logging module is slow to import, and plenty of programs never log anything, so we only import it for the
+# annotations (and wait until somebody actually logs something to import it for real).
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import logging
 
 # TODO: This module should eventually be broken out so it may be reused in other projects.
 
 
+class RateLimitFilter(object):
+    """
+    This logging filter lets a burst of identical messages through in each period and holds back the rest.  The first
+    message let through after some have been held back says how many there were (and has a ``suppressed`` attribute
+    with the count, for handlers that would rather have the number).
+
+    Messages are identical if they come from the same logger, at the same level, with the same format string and the
+    same source, so the same error from two different ports isn't counted together.  The source is the record's
+    ``source`` attribute (if you log with ``extra={'source': ...}``) or else its first argument (which, in cnxman's own
+    messages, is the port or connection).  The other arguments are apt to change from one record to the next, so they
+    don't count.
+    """
+    _max_keys = 4096  # the most messages we keep track of (after which we forget the one we saw least recently)
+
+    def __init__(self, burst: int = 10, period: float = 60.0):
+        """
+
+        :param burst: the number of identical messages let through in each period
+        :type burst:  ``int``
+        :param period: the length (in seconds) of each period
+        :type period:  ``float``
+        """
+        if burst < 1:
+            raise ValueError('The burst must be at least 1.')
+        if period <= 0:
+            raise ValueError('The period must be positive.')
+        self.burst = burst  #: the number of identical messages let through in each period
+        self.period = period  #: the length (in seconds) of each period
+        self._counts = OrderedDict()  # [the start of the period, messages let through, messages held back] for each message
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """
+        Forget every message we've seen.
+        """
+        with self._lock:
+            self._counts.clear()
+
+    def filter(self, record: 'logging.LogRecord') -> bool:
+        """
+        Should the record be logged?
+
+        :param record: the record
+        :type record:  :py:class:`logging.LogRecord`
+        :rtype: ``bool``
+        """
+        source = getattr(record, 'source', None)
+        if source is None:
+            args = record.args
+            source = args[0] if isinstance(args, tuple) and args else None
+        key = (record.name, record.levelno, record.msg, source)
+        now = time.monotonic()
+        with self._lock:
+            try:
+                counts = self._counts.get(key)
+            except TypeError:
+                return True  # (A message we can't tell apart from the others isn't one we can hold back.)
+            if counts is None:
+                if len(self._counts) >= self._max_keys:
+                    self._counts.popitem(last=False)
+                self._counts[key] = [now, 1, 0]
+                suppressed = 0
+            else:
+                self._counts.move_to_end(key)
+                if now - counts[0] >= self.period:
+                    suppressed = counts[2]
+                    counts[:] = now, 1, 0
+                elif counts[1] < self.burst:
+                    counts[1] += 1
+                    suppressed = 0
+                else:
+                    counts[2] += 1
+                    return False
+        record.suppressed = suppressed
+        if suppressed:
+            record.msg, record.args = '%s (%d more like this were suppressed)', (record.getMessage(), suppressed)
+        return True
+
+
+rate_limit = RateLimitFilter()  #: This is the filter through which every cnxman class's logger passes its records.
+
+
+class _ClassLogger(object):
+    """
+    This descriptor gets a class's logger the first time somebody asks for it.  (The logging module is slow to import,
+    and plenty of programs never log anything.)  Once it has the logger, it replaces itself with it, so asking for the
+    logger after that is as quick as looking up any other class attribute.
+    """
+    def __init__(self, cls: type, logger_name: str):
+        self._cls = cls
+        self._logger_name = logger_name
+
+    def __get__(self, instance, owner):
+        import logging
+        logger = logging.getLogger(self._logger_name)
+        if rate_limit not in logger.filters:
+            logger.addFilter(rate_limit)
+        setattr(self._cls, 'logger', logger)
+        return logger
+
+
 def loggable_class(logger_name: str=None):
     """
     This is a decorator you can apply to a class to set it up with a Python ``logger`` property suitable for your
@@ -31,7 +154,79 @@ def loggable_class(logger_name: str=None):
         _logger_name = logger_name if logger_name is not None else '{module}.{cls}'.format(module=cls.__module__,
                                                                                            cls=cls.__name__)
         # Add a logger property to the class.
-        cls.logger = logging.getLogger(_logger_name)
+        cls.logger = _ClassLogger(cls, _logger_name)
         return cls
     # Return the inner function.
     return add_logger
+
+
+class BackgroundLogging(object):
+    """
+    This object routes the records logged under a logger (``cnxman``, unless you say otherwise) through a queue to your
+    handlers, which run on a thread of their own, so that logging never makes the thread that logs wait for a handler.
+    """
+    def __init__(self, *handlers: 'logging.Handler', level: int = None, logger_name: str = 'cnxman'):
+        """
+
+        :param handlers: the handlers that do the work (the default is a :py:class:`logging.StreamHandler` that writes
+            to standard error)
+        :param level: the level of the logger (if you'd like to change it)
+        :type level:  ``int``
+        :param logger_name: the name of the logger whose records go through the queue
+        :type logger_name:  ``str``
+        """
+        import logging
+        import logging.handlers
+        import queue
+        self._queue = queue.SimpleQueue()
+        self._logger = logging.getLogger(logger_name)
+        self._level = level
+        self._handler = logging.handlers.QueueHandler(self._queue)
+        self._listener = logging.handlers.QueueListener(self._queue,
+                                                        *(handlers or (logging.StreamHandler(),)),
+                                                        respect_handler_level=True)
+        self._propagate = self._logger.propagate  # (We put things back the way they were when we stop.)
+        self._previous_level = self._logger.level
+        self._started = False
+
+    @property
+    def logger(self) -> 'logging.Logger':
+        """
+        This is the logger whose records go through the queue.
+
+        :rtype: :py:class:`logging.Logger`
+        """
+        return self._logger
+
+    def start(self):
+        """
+        Start sending the logger's records through the queue.
+        """
+        if self._started:
+            return
+        self._started = True
+        self._listener.start()
+        self._logger.addHandler(self._handler)
+        # The records are handled on the other side of the queue, not (again) by the ancestors' handlers.
+        self._logger.propagate = False
+        if self._level is not None:
+            self._logger.setLevel(self._level)
+
+    def stop(self):
+        """
+        Handle whatever is still in the queue, stop the thread, and put the logger back the way we found it.
+        """
+        if not self._started:
+            return
+        self._started = False
+        self._logger.removeHandler(self._handler)
+        self._logger.propagate = self._propagate
+        self._logger.setLevel(self._previous_level)
+        self._listener.stop()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
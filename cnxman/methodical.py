@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.methodical
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+The connection manager that Automat built.
+
+You'll usually find :py:class:`ConnectionManager` through :py:mod:`cnxman.basics`, which imports this module (and
+Automat) the first time somebody asks for it.
+"""
+
+from automat import MethodicalMachine, NoTransition
+from .basics import BaseConnectionManager, ManagerState
+
+
+class ConnectionManager(BaseConnectionManager):
+    """
+    Extend this class to create your own object with the know-how to establish and maintain a connection to something.
+    Its state machine is an Automat :py:class:`automat.MethodicalMachine`.
+
+    :seealso:  :py:class:`cnxman.basics.FastConnectionManager`
+    """
+    _machine = MethodicalMachine()  # This is the class state machine.
+    _invalid_transition = NoTransition
+
+    @_machine.output()
+    def _enter_connecting(self):
+        self._enter(ManagerState.CONNECTING)
+
+    @_machine.output()
+    def _enter_connected(self):
+        self._enter(ManagerState.CONNECTED)
+
+    @_machine.output()
+    def _enter_recovering(self):
+        self._enter(ManagerState.RECOVERING)
+
+    @_machine.output()
+    def _enter_disconnected(self):
+        self._enter(ManagerState.DISCONNECTED)
+
+    @_machine.output()
+    def _enter_torndown(self):
+        self._enter(ManagerState.TORNDOWN)
+
+    @_machine.state(initial=True)
+    def ready(self):
+        """We haven't connected yet, but we're ready to try."""
+
+    @_machine.input()
+    def connect(self):
+        """Let's get connected."""
+
+    @_machine.output()
+    def _connect(self):
+        """
+        This is the output method mapped to the :py:func:`ConnectionManager.connect` input method.
+        """
+        self._do_connect()
+
+    @_machine.input()
+    def _raise_alarm(self):
+        """
+        There is trouble with the connection.  Raise the alarm!
+        """
+
+    @_machine.input()
+    def _silence_alarm(self):
+        """
+        Everything is fine with the connection.
+        """
+
+    @_machine.state()
+    def connecting(self):
+        """We're trying to connect."""
+
+    @_machine.state()
+    def connected(self):
+        """We're connected."""
+
+    @_machine.state()
+    def recovering(self):
+        """We're waiting to try to reconnect."""
+
+    @_machine.output()
+    def _recover(self):
+        """
+        Schedule the next attempt to recover the connection (unless we've run out of attempts).
+        """
+        self._do_recover()
+
+    @_machine.output()
+    def _cancel_recovery(self):
+        """
+        Cancel the next attempt to recover the connection (if there is one).
+        """
+        self._do_cancel_recovery()
+
+    @_machine.output()
+    def _reset_attempts(self):
+        """
+        We're connected, so start counting attempts to recover from scratch next time.
+        """
+        self._do_reset_attempts()
+
+    @_machine.state()
+    def disconnected(self):
+        """The connection has been disconnected."""
+
+    @_machine.input()
+    def disconnect(self):
+        """
+        Release the connection.
+        """
+
+    @_machine.output()
+    def _disconnect(self):
+        """
+        This is the output method mapped to the :py:func:`ConnectionManager.disconnect` input method.
+        """
+        self._do_disconnect()
+
+    @_machine.state(terminal=True)
+    def torndown(self):
+        """The connection manager has been torn down.  It's over."""
+
+    @_machine.input()
+    def teardown(self):
+        """
+        Release any resources held by the connection.
+        """
+
+    @_machine.output()
+    def _teardown(self):
+        """
+        This is the output method mapped to the :py:func:`ConnectionManager.teardown` input method.
+        """
+        self._do_teardown()
+
+    # From the 'ready' state, we can connect.
+    ready.upon(connect, enter=connecting, outputs=[_enter_connecting, _connect])
+    # From the 'connecting' state, we can either go into an "everything's OK" state by silencing any alarms...
+    connecting.upon(_silence_alarm, enter=connected, outputs=[_enter_connected, _reset_attempts])
+    # ...or we can raise the alarm.
+    connecting.upon(_raise_alarm, enter=recovering, outputs=[_enter_recovering, _recover])
+    # From the 'recovering' state, we can try to connect.
+    recovering.upon(connect, enter=connecting, outputs=[_enter_connecting, _cancel_recovery, _connect])
+    # If we're recovering, we don't need to change state if the alarm sounds because we're already in a recovery
+    # condition.
+    recovering.upon(_raise_alarm, enter=recovering, outputs=[])
+    # We can give up on recovering by disconnecting...
+    recovering.upon(disconnect, enter=disconnected, outputs=[_enter_disconnected, _cancel_recovery, _disconnect])
+    # ...or tearing everything down.
+    recovering.upon(teardown, enter=torndown,
+                    outputs=[_enter_torndown, _cancel_recovery, _disconnect, _teardown])
+    # When we're connected, we can, of course, go to the 'disconnected' state.
+    connected.upon(disconnect, enter=disconnected, outputs=[_enter_disconnected, _disconnect])
+    # When we're connected, we can go right to the 'torndown' state if requested.
+    connected.upon(teardown, enter=torndown, outputs=[_enter_torndown, _disconnect, _teardown])
+    # When we're in the 'connected' state, raising an alarm puts us into the 'recovering' state.
+    connected.upon(_raise_alarm, enter=recovering, outputs=[_enter_recovering, _recover])
+    # When we're in the 'connected' state, silencing an alarm puts us into the 'connected' state.
+    connected.upon(_silence_alarm, enter=connected, outputs=[])
+    # From the 'disconnected' state, we can to the 'torndown' state.
+    disconnected.upon(teardown, enter=torndown, outputs=[_enter_torndown, _teardown])
@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.metrics
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Keeping count.
+
+cnxman keeps its counters and histograms in the :py:data:`registry` defined here.  The registry is disabled until you
+enable it, and while it's disabled the instrumented code skips its bookkeeping entirely.
+
+.. code-block:: python
+
+    from cnxman.metrics import registry
+    registry.enable()
+    ...
+    print(registry.to_prometheus())
+"""
+
+from bisect import bisect_left
+import threading
+# (Only type checkers need the typing module, which is slow to import.)
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterable, Tuple
+
+#: the default histogram buckets (in seconds)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+#: histogram buckets suited to sizes (in bytes)
+SIZE_BUCKETS = (1, 16, 64, 256, 1024, 4096, 16384, 65536)
+
+
+def _key(name: str, labels: 'Dict[str, str]') -> str:
+    """
+    Make the key (in Prometheus' notation) that identifies a metric with a particular set of labels.
+    """
+    if not labels:
+        return name
+    return '{name}{{{labels}}}'.format(
+        name=name,
+        labels=','.join('{k}="{v}"'.format(k=k, v=str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                        for k, v in sorted(labels.items())))
+
+
+class Counter(object):
+    """
+    This is a number that only goes up.
+    """
+    def __init__(self, name: str, labels: 'Dict[str, str]' = None):
+        """
+
+        :param name: the metric's name
+        :type name:  ``str``
+        :param labels: the metric's labels
+        :type labels:  ``dict``
+        """
+        self._name = name
+        self._labels = dict(labels or {})
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        """
+        This is the metric's name.
+        """
+        return self._name
+
+    @property
+    def labels(self) -> 'Dict[str, str]':
+        """
+        These are the metric's labels.
+        """
+        return dict(self._labels)
+
+    @property
+    def value(self) -> float:
+        """
+        This is the counter's current value.
+        """
+        return self._value
+
+    def inc(self, amount: float = 1):
+        """
+        Add to the counter.
+
+        :param amount: the amount to add
+        :type amount:  ``float``
+        """
+        with self._lock:
+            self._value += amount
+
+
+class Histogram(object):
+    """
+    This object counts observations in fixed buckets (and keeps their count and sum).
+    """
+    def __init__(self, name: str, labels: 'Dict[str, str]' = None, buckets: 'Iterable[float]' = DEFAULT_BUCKETS):
+        """
+
+        :param name: the metric's name
+        :type name:  ``str``
+        :param labels: the metric's labels
+        :type labels:  ``dict``
+        :param buckets: the upper bounds of the buckets (an unbounded bucket is always added at the end)
+        """
+        self._name = name
+        self._labels = dict(labels or {})
+        self._bounds = tuple(sorted(buckets))
+        self._counts = [0] * (len(self._bounds) + 1)  # The last bucket catches everything that's left.
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        """
+        This is the metric's name.
+        """
+        return self._name
+
+    @property
+    def labels(self) -> 'Dict[str, str]':
+        """
+        These are the metric's labels.
+        """
+        return dict(self._labels)
+
+    @property
+    def count(self) -> int:
+        """
+        This is the number of observations.
+        """
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        """
+        This is the sum of all the observations.
+        """
+        return self._sum
+
+    def observe(self, value: float):
+        """
+        Record an observation.
+
+        :param value: the observed value
+        :type value:  ``float``
+        """
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def buckets(self) -> 'Tuple[Tuple[float, int], ...]':
+        """
+        Get the cumulative count for each bucket.
+
+        :return: ``(upper bound, count)`` pairs, the last of which has an upper bound of infinity
+        """
+        with self._lock:
+            counts = list(self._counts)
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(self._bounds + (float('inf'),), counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return tuple(buckets)
+
+
+class MetricsRegistry(object):
+    """
+    This object keeps track of metrics.  Ask it for a metric with the same name and labels twice and you get the same
+    metric back.
+    """
+    def __init__(self, enabled: bool = False):
+        """
+
+        :param enabled: Should the instrumented code record metrics?
+        :type enabled:  ``bool``
+        """
+        self.enabled = enabled  #: Should the instrumented code record metrics?
+        self._lock = threading.Lock()
+        self._counters: 'Dict[str, Counter]' = {}
+        self._histograms: 'Dict[str, Histogram]' = {}
+        self._descriptions: 'Dict[str, str]' = {}
+
+    def enable(self):
+        """
+        Start recording metrics.
+        """
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stop recording metrics.  (The values recorded so far are kept.)
+        """
+        self.enabled = False
+
+    def clear(self):
+        """
+        Forget every metric.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._descriptions.clear()
+
+    def counter(self, name: str, description: str = None, **labels) -> Counter:
+        """
+        Get (or create) a counter.
+
+        :param name: the counter's name
+        :type name:  ``str``
+        :param description: what the counter counts
+        :type description:  ``str``
+        :param labels: the counter's labels
+        :rtype: :py:class:`Counter`
+        """
+        key = _key(name, labels)
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter(name, labels))
+                if description is not None:
+                    self._descriptions.setdefault(name, description)
+        return counter
+
+    def histogram(self,
+                  name: str,
+                  description: str = None,
+                  buckets: 'Iterable[float]' = DEFAULT_BUCKETS,
+                  **labels) -> Histogram:
+        """
+        Get (or create) a histogram.
+
+        :param name: the histogram's name
+        :type name:  ``str``
+        :param description: what the histogram measures
+        :type description:  ``str``
+        :param buckets: the upper bounds of the buckets (if the histogram is created)
+        :param labels: the histogram's labels
+        :rtype: :py:class:`Histogram`
+        """
+        key = _key(name, labels)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(name, labels, buckets))
+                if description is not None:
+                    self._descriptions.setdefault(name, description)
+        return histogram
+
+    def snapshot(self) -> dict:
+        """
+        Get the current value of every metric.
+
+        :return: a dictionary with ``counters`` (the value of each counter) and ``histograms`` (the ``count``, ``sum``
+            and cumulative ``buckets`` of each histogram), each keyed in Prometheus' notation (e.g.
+            ``cnxman_bytes_read_total{connection="/dev/ttyUSB0"}``)
+        :rtype: ``dict``
+        """
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = list(self._histograms.items())
+        return {
+            'counters': {key: counter.value for key, counter in counters},
+            'histograms': {
+                key: {
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'buckets': [[bound, count] for bound, count in histogram.buckets()]
+                } for key, histogram in histograms
+            }
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        Render every metric in the `Prometheus text exposition format
+        <https://prometheus.io/docs/instrumenting/exposition_formats/>`_.
+
+        :rtype: ``str``
+        """
+        with self._lock:
+            counters = sorted(self._counters.values(), key=lambda m: m.name)
+            histograms = sorted(self._histograms.values(), key=lambda m: m.name)
+            descriptions = dict(self._descriptions)
+        lines = []
+        described = set()
+
+        def describe(name: str, kind: str):
+            if name not in described:
+                described.add(name)
+                if name in descriptions:
+                    lines.append('# HELP {name} {text}'.format(name=name, text=descriptions[name]))
+                lines.append('# TYPE {name} {kind}'.format(name=name, kind=kind))
+
+        for counter in counters:
+            describe(counter.name, 'counter')
+            lines.append('{key} {value}'.format(key=_key(counter.name, counter.labels), value=counter.value))
+        for histogram in histograms:
+            describe(histogram.name, 'histogram')
+            labels = histogram.labels
+            for bound, count in histogram.buckets():
+                lines.append('{key} {count}'.format(
+                    key=_key(histogram.name + '_bucket', dict(labels, le='+Inf' if bound == float('inf') else bound)),
+                    count=count))
+            lines.append('{key} {value}'.format(key=_key(histogram.name + '_sum', labels), value=histogram.sum))
+            lines.append('{key} {value}'.format(key=_key(histogram.name + '_count', labels), value=histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()  #: This is the registry in which cnxman records its metrics.
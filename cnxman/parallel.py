@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.parallel
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Many hands make light work.
+
+If making sense of what your devices send takes real work, doing it in a data handler means doing it on the thread
+that reads the port (and holding the GIL while you're at it).  A :py:class:`ParallelDecoder` does it in a pool of
+processes instead.  Hand one to a :py:class:`cnxman.serial.SerialConnection` and the connection sends a
+:py:attr:`cnxman.serial.SerialConnection.Signals.DECODED` signal for each decoded payload, in the order the payloads
+arrived.
+
+.. code-block:: python
+
+    def parse(payload: bytes):  # This must be a module-level function so the worker processes can find it.
+        ...
+
+    decoder = ParallelDecoder(parse)
+    connection = SerialConnection('/dev/ttyUSB0', frame_decoder=DelimitedFrameDecoder(), parallel_decoder=decoder)
+
+Batches of payloads are passed to the workers in shared memory (where it's available) rather than being pickled.  A
+connection hands over each read's payloads as they arrive, but they wait (for up to ``max_delay`` seconds) until there
+are enough of them to fill a batch, so that a steady trickle of small reads doesn't cost a round trip to a worker each.
+"""
+
+from collections import deque, OrderedDict
+import threading
+from .metrics import registry
+from .scheduling import ScheduledCall, Scheduler
+# concurrent.futures, multiprocessing and typing are all slow to import, so we wait until we need them.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from concurrent.futures import Executor, Future
+    from typing import Any, Callable, List, Sequence
+
+_shared_memory = False  # the shared_memory module (once we've looked for it)
+_attached = OrderedDict()  # the shared memory blocks a worker process has attached to (by name), least recent first
+_max_attached = 16  # the most blocks a worker stays attached to
+
+
+def _get_shared_memory():
+    """
+    Get the :py:mod:`multiprocessing.shared_memory` module (or ``None`` if this Python doesn't have it).
+    """
+    global _shared_memory
+    if _shared_memory is False:
+        try:
+            from multiprocessing import shared_memory
+        except ImportError:  # (It's new in Python 3.8.)
+            shared_memory = None
+        _shared_memory = shared_memory
+    return _shared_memory
+
+
+def _decode_batch(decode: 'Callable[[bytes], Any]', payloads, lengths: 'Sequence[int]' = None) -> 'List[Any]':
+    """
+    Decode a batch of payloads.  (This is what runs in the worker processes.)
+
+    :param decode: the function that decodes a payload
+    :param payloads: the name of the shared memory block in which the payloads are laid end to end (if there are
+        ``lengths``), or else a list of the payloads themselves
+    :param lengths: the length of each payload in the shared memory block
+    :return: the decoded payloads
+    """
+    if lengths is None:
+        return [decode(payload) for payload in payloads]
+    # The decoder reuses its blocks, so we stay attached to the ones we've seen (rather than attaching to the same
+    # block for every batch).
+    block = _attached.get(payloads)
+    if block is None:
+        block = _get_shared_memory().SharedMemory(name=payloads)
+        _attached[payloads] = block
+        if len(_attached) > _max_attached:
+            _attached.popitem(last=False)[1].close()
+    else:
+        _attached.move_to_end(payloads)
+    results = []
+    offset = 0
+    for length in lengths:
+        results.append(decode(bytes(block.buf[offset:offset + length])))
+        offset += length
+    return results
+
+
+class ParallelDecoder(object):
+    """
+    This object decodes batches of payloads in a pool of processes.  The shared memory blocks in which it hands the
+    batches to the workers are kept and reused (and only replaced when a batch won't fit).
+    """
+    _max_free_blocks = 8  # the most idle shared memory blocks we keep for the next batches
+    def __init__(self,
+                 decode: 'Callable[[bytes], Any]',
+                 max_workers: int = None,
+                 batch_size: int = 256,
+                 max_delay: float = 0.005,
+                 executor: 'Executor' = None,
+                 scheduler: Scheduler = None):
+        """
+
+        :param decode: the function that decodes a payload (which must be something the worker processes can unpickle,
+            like a module-level function)
+        :param max_workers: the number of worker processes (the default is the number of processors)
+        :type max_workers:  ``int``
+        :param batch_size: the most payloads sent to a worker at once
+        :type batch_size:  ``int``
+        :param max_delay: the longest time (in seconds) a stream holds on to payloads while it waits for enough of
+            them to fill a batch
+        :type max_delay:  ``float``
+        :param executor: the executor that does the decoding (if you'd rather supply your own, in which case it's
+            yours to shut down)
+        :type executor:  :py:class:`concurrent.futures.Executor`
+        :param scheduler: the scheduler that sends a stream's payloads along when they've waited ``max_delay`` (the
+            default is the shared scheduler)
+        :type scheduler:  :py:class:`cnxman.scheduling.Scheduler`
+        """
+        if batch_size < 1:
+            raise ValueError('The batch size must be at least 1.')
+        if max_delay < 0:
+            raise ValueError('The maximum delay cannot be negative.')
+        self._decode = decode
+        self._max_workers = max_workers
+        self._batch_size = batch_size
+        self._max_delay = max_delay
+        self._executor = executor  # Until we have something to decode, we don't need any processes.
+        self._owns_executor = executor is None  # Did we create the executor?
+        self._scheduler = scheduler
+        self._free_blocks = []  # the shared memory blocks no batch is using
+        self._blocks_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    @property
+    def batch_size(self) -> int:
+        """
+        This is the most payloads sent to a worker at once.
+
+        :rtype: ``int``
+        """
+        return self._batch_size
+
+    @property
+    def max_delay(self) -> float:
+        """
+        This is the longest time (in seconds) a stream holds on to payloads while it waits for enough of them to fill
+        a batch.
+
+        :rtype: ``float``
+        """
+        return self._max_delay
+
+    @property
+    def scheduler(self) -> Scheduler:
+        """
+        This is the scheduler that sends a stream's payloads along when they've waited long enough.
+
+        :rtype: :py:class:`cnxman.scheduling.Scheduler`
+        """
+        if self._scheduler is None:
+            self._scheduler = Scheduler.default()
+        return self._scheduler
+
+    def _get_executor(self) -> 'Executor':
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    from concurrent.futures import ProcessPoolExecutor
+                    self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+        return self._executor
+
+    def submit(self, payloads: 'Sequence[bytes]') -> 'List[Future]':
+        """
+        Decode some payloads.
+
+        :param payloads: the payloads
+        :return: a future for each batch (each of which resolves to a list of the decoded payloads in the batch)
+        :rtype:  ``list``
+        """
+        executor = self._get_executor()
+        shared_memory = _get_shared_memory()
+        futures = []
+        for start in range(0, len(payloads), self._batch_size):
+            batch = payloads[start:start + self._batch_size]
+            block = None
+            if shared_memory is not None:
+                lengths = [len(payload) for payload in batch]
+                total = sum(lengths)
+                if total:
+                    # Lay the payloads end to end in a block of shared memory, and just tell the worker where it is.
+                    block = self._take_block(shared_memory, total)
+                    offset = 0
+                    for payload, length in zip(batch, lengths):
+                        block.buf[offset:offset + length] = payload
+                        offset += length
+            try:
+                if block is not None:
+                    future = executor.submit(_decode_batch, self._decode, block.name, lengths)
+                else:
+                    future = executor.submit(_decode_batch, self._decode, [bytes(payload) for payload in batch])
+            except BaseException:
+                self._return_block(block)
+                raise
+            if block is not None:
+                future.add_done_callback(lambda _, block=block: self._return_block(block))
+            futures.append(future)
+        if registry.enabled:
+            registry.counter('cnxman_parallel_batches_total', 'batches submitted for parallel decoding').inc(
+                len(futures))
+        return futures
+
+    def _take_block(self, shared_memory, size: int):
+        """
+        Get a shared memory block with room for a batch (reusing an idle one if it's big enough).
+        """
+        with self._blocks_lock:
+            for i, block in enumerate(self._free_blocks):
+                if block.size >= size:
+                    return self._free_blocks.pop(i)
+            # None of them is big enough, so one of them makes way for a bigger one.
+            smallest = self._free_blocks.pop(0) if self._free_blocks else None
+        self._release(smallest)
+        # (Rounding up to a power of two saves us from growing a block a little at a time.)
+        return shared_memory.SharedMemory(create=True, size=1 << (size - 1).bit_length())
+
+    def _return_block(self, block):
+        """
+        Put a block a batch has finished with back with the idle ones.
+        """
+        if block is None:
+            return
+        with self._blocks_lock:
+            if len(self._free_blocks) < self._max_free_blocks:
+                self._free_blocks.append(block)
+                self._free_blocks.sort(key=lambda b: b.size)
+                return
+        self._release(block)
+
+    @staticmethod
+    def _release(block):
+        if block is not None:
+            block.close()
+            block.unlink()
+
+    def stream(self, deliver: 'Callable[[Any], None]', on_error: 'Callable[[BaseException], None]' = None):
+        """
+        Get a stream through which payloads from a single source are decoded and delivered in order.
+
+        :param deliver: the function to which each decoded payload is passed
+        :param on_error: the function to which any exception raised while decoding a batch is passed (the batch is
+            otherwise skipped)
+        :rtype: :py:class:`DecodeStream`
+        """
+        return DecodeStream(self, deliver, on_error)
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop the worker processes (if we started them).
+
+        :param wait: Should we wait for the work that has been submitted to be finished?
+        :type wait:  ``bool``
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._owns_executor:
+            executor.shutdown(wait=wait)
+        # The workers are done with the idle blocks, at least.
+        with self._blocks_lock:
+            blocks, self._free_blocks = self._free_blocks, []
+        for block in blocks:
+            self._release(block)
+
+
+class DecodeStream(object):
+    """
+    This object decodes payloads from a single source through a :py:class:`ParallelDecoder` and delivers the results in
+    the order the payloads were submitted, however the work is spread across the processes.  (Results are delivered on
+    whichever thread finishes the batch that lets them go, so keep the delivery function quick.)
+
+    Payloads are gathered into batches across submissions:  a batch goes to the workers as soon as it's full, or once
+    its first payload has waited the decoder's ``max_delay``, whichever comes first.
+    """
+    def __init__(self,
+                 decoder: ParallelDecoder,
+                 deliver: 'Callable[[Any], None]',
+                 on_error: 'Callable[[BaseException], None]' = None):
+        """
+
+        :param decoder: the decoder that does the work
+        :type decoder:  :py:class:`ParallelDecoder`
+        :param deliver: the function to which each decoded payload is passed
+        :param on_error: the function to which any exception raised while decoding a batch is passed
+        """
+        self._decoder = decoder
+        self._deliver = deliver
+        self._on_error = on_error
+        self._futures = deque()  # the batches we're waiting for, in the order we submitted them
+        self._lock = threading.Lock()  # guards the futures
+        self._waiting = []  # the payloads we haven't submitted yet
+        self._flush_call: ScheduledCall = None  # the call that submits them if their batch doesn't fill up in time
+        self._batch_lock = threading.Lock()  # guards the waiting payloads (and keeps the batches in order)
+        self._delivery_lock = threading.Lock()  # makes sure only one thread delivers results at a time
+
+    @property
+    def pending(self) -> int:
+        """
+        This is the number of batches that haven't been delivered yet.
+
+        :rtype: ``int``
+        """
+        return len(self._futures)
+
+    @property
+    def waiting(self) -> int:
+        """
+        This is the number of payloads waiting for their batch to fill up.
+
+        :rtype: ``int``
+        """
+        return len(self._waiting)
+
+    def submit(self, payloads: 'Sequence[bytes]'):
+        """
+        Decode some payloads.  (They're sent to the workers once there are enough to fill a batch, or once they've
+        waited long enough.)
+
+        :param payloads: the payloads
+        """
+        if not payloads:
+            return
+        batch_size = self._decoder.batch_size
+        futures = []
+        with self._batch_lock:
+            waiting = self._waiting
+            waiting.extend(payloads)
+            if len(waiting) >= batch_size:
+                full = len(waiting) - len(waiting) % batch_size
+                futures = self._send(waiting[:full])
+                del waiting[:full]
+                # The payloads that are left start a batch of their own (with a deadline of its own).
+                self._cancel_flush()
+            if waiting and self._flush_call is None:
+                self._flush_call = self._decoder.scheduler.call_later(self._decoder.max_delay, self._flush_due)
+        self._watch(futures)
+
+    def flush(self):
+        """
+        Send the payloads that are waiting to the workers now (without waiting for their batch to fill up).
+        """
+        with self._batch_lock:
+            self._cancel_flush()
+            futures = self._send(self._waiting)
+            self._waiting = []
+        self._watch(futures)
+
+    def _flush_due(self):
+        """
+        The first of the waiting payloads has waited long enough, so they all go now.  (The scheduler calls this.)
+        """
+        with self._batch_lock:
+            self._flush_call = None
+            futures = self._send(self._waiting)
+            self._waiting = []
+        self._watch(futures)
+
+    def _cancel_flush(self):
+        """
+        Cancel the call that would send the waiting payloads along.  (The caller holds the batch lock.)
+        """
+        if self._flush_call is not None:
+            self._flush_call.cancel()
+            self._flush_call = None
+
+    def _send(self, payloads: 'Sequence[bytes]') -> 'List[Future]':
+        """
+        Send payloads to the workers.  (The caller holds the batch lock.)
+        """
+        if not payloads:
+            return []
+        futures = self._decoder.submit(payloads)
+        # The futures have to be in line before any of them can let the others go.
+        with self._lock:
+            self._futures.extend(futures)
+        return futures
+
+    def _watch(self, futures: 'List[Future]'):
+        for future in futures:
+            future.add_done_callback(self._done)
+
+    def _done(self, _):
+        """
+        This is called when a batch is finished.  We deliver the results of every finished batch at the front of the
+        line.
+        """
+        with self._delivery_lock:
+            while True:
+                with self._lock:
+                    if not self._futures or not self._futures[0].done():
+                        return
+                    future = self._futures.popleft()
+                error = future.exception()
+                if error is not None:
+                    if registry.enabled:
+                        registry.counter('cnxman_parallel_errors_total', 'batches that could not be decoded').inc()
+                    if self._on_error is not None:
+                        self._on_error(error)
+                    continue
+                for result in future.result():
+                    self._deliver(result)
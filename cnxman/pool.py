@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.pool
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Why make a new connection when there's a perfectly good one lying around?
+"""
+
+from contextlib import contextmanager
+from cnxman.basics import Connection, ConnectionException, FastConnectionManager, ManagerState
+from .logging import loggable_class as loggable
+from .scheduling import Backoff, ScheduledCall, Scheduler
+import threading
+import time
+TYPE_CHECKING = False  # (typing is only needed for the annotations.)
+if TYPE_CHECKING:
+    from typing import Callable, Dict, List, Tuple
+
+
+@loggable()
+class ConnectionPool(object):
+    """
+    This object keeps a pool of connections (each looked after by its own
+    :py:class:`cnxman.basics.FastConnectionManager`) and lends them out, so that callers don't pay to establish a new
+    connection every time they need one.
+
+    Connections are health-checked (with :py:func:`cnxman.basics.Connection.try_connect`) before they're handed out,
+    idle connections are torn down once they've been idle too long (but never below the minimum size), and no more than
+    the maximum number of connections are ever open at once.
+    """
+    def __init__(self,
+                 factory: 'Callable[[], Connection]',
+                 max_size: int = 10,
+                 min_size: int = 0,
+                 idle_timeout: float = 300.0,
+                 backoff: Backoff = None,
+                 scheduler: Scheduler = None):
+        """
+
+        :param factory: a function that creates a new (not yet connected) connection
+        :param max_size: the most connections that may be open at once
+        :type max_size:  ``int``
+        :param min_size: the number of warm connections we keep even when they're idle
+        :type min_size:  ``int``
+        :param idle_timeout: how long (in seconds) a connection may sit idle before it's torn down (``None`` means
+            forever)
+        :type idle_timeout:  ``float``
+        :param backoff: the backoff given to each connection's manager
+        :type backoff:  :py:class:`cnxman.scheduling.Backoff`
+        :param scheduler: the scheduler used by the connection managers (and to prune idle connections)
+        :type scheduler:  :py:class:`cnxman.scheduling.Scheduler`
+        """
+        if max_size < 1:
+            raise ValueError('The maximum size must be at least 1.')
+        if not 0 <= min_size <= max_size:
+            raise ValueError('The minimum size must be between 0 and the maximum size.')
+        self._factory = factory
+        self._max_size = max_size
+        self._min_size = min_size
+        self._idle_timeout = idle_timeout
+        self._backoff = backoff
+        self._scheduler = scheduler if scheduler is not None else Scheduler.default()
+        self._condition = threading.Condition()
+        # the idle managers (and when they went idle), oldest first
+        self._idle: 'List[Tuple[FastConnectionManager, float]]' = []
+        self._in_use: 'Dict[Connection, FastConnectionManager]' = {}  # the managers of the connections we've lent out
+        self._size = 0  # the number of connections that are open (or opening)
+        self._closed = False
+        self._pruning: ScheduledCall = None  # the next scheduled check for idle connections
+        if self._idle_timeout is not None:
+            self._pruning = self._scheduler.call_later(self._prune_interval, self._scheduled_prune)
+
+    @property
+    def max_size(self) -> int:
+        """
+        This is the most connections that may be open at once.
+
+        :rtype: ``int``
+        """
+        return self._max_size
+
+    @property
+    def size(self) -> int:
+        """
+        This is the number of connections that are open (or opening).
+
+        :rtype: ``int``
+        """
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        """
+        This is the number of connections waiting to be checked out.
+
+        :rtype: ``int``
+        """
+        return len(self._idle)
+
+    @property
+    def in_use(self) -> int:
+        """
+        This is the number of connections that are checked out.
+
+        :rtype: ``int``
+        """
+        return len(self._in_use)
+
+    def fill(self):
+        """
+        Open connections until the pool holds at least its minimum number.
+        """
+        while True:
+            with self._condition:
+                if self._closed or self._size >= self._min_size:
+                    return
+                self._size += 1
+            manager = self._open()
+            with self._condition:
+                self._idle.append((manager, time.monotonic()))
+                self._condition.notify()
+
+    def checkout(self, timeout: float = None) -> Connection:
+        """
+        Borrow a connection from the pool.  (Be sure to check it back in when you're finished with it.)
+
+        :param timeout: the longest time (in seconds) to wait for a connection if they're all in use
+        :type timeout:  ``float``
+        :return: a healthy connection
+        :rtype:  :py:class:`cnxman.basics.Connection`
+        :raises ConnectionException: if the pool is closed, we time out, or a new connection can't be made
+
+        :seealso:  :py:func:`ConnectionPool.checkin`
+        :seealso:  :py:func:`ConnectionPool.connection`
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            manager = None
+            with self._condition:
+                while True:
+                    if self._closed:
+                        raise ConnectionException(message='The connection pool is closed.', inner=None)
+                    # The most recently used connection is the likeliest to still be good.
+                    if self._idle:
+                        manager, _ = self._idle.pop()
+                        break
+                    if self._size < self._max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise ConnectionException(message='Timed out waiting for a connection.', inner=None)
+                    self._condition.wait(remaining)
+            # If we didn't get an idle connection, we have room to make a new one.
+            if manager is None:
+                manager = self._open()
+            elif not self._healthy(manager):
+                self._discard(manager)
+                continue
+            with self._condition:
+                self._in_use[manager.connection] = manager
+            return manager.connection
+
+    def checkin(self, connection: Connection, discard: bool = False):
+        """
+        Return a borrowed connection to the pool.
+
+        :param connection: the connection
+        :type connection:  :py:class:`cnxman.basics.Connection`
+        :param discard: Should the connection be torn down instead of being reused (because, for example, you know
+            something has gone wrong with it)?
+        :type discard:  ``bool``
+        """
+        with self._condition:
+            manager = self._in_use.pop(connection, None)
+            if manager is None:
+                raise ValueError('The connection was not checked out of this pool.')
+            if not discard and not self._closed:
+                self._idle.append((manager, time.monotonic()))
+                self._condition.notify()
+                return
+        self._discard(manager)
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """
+        Borrow a connection for the duration of a ``with`` block.  If the block raises an exception, the connection is
+        discarded rather than reused.
+
+        :param timeout: the longest time (in seconds) to wait for a connection if they're all in use
+        :type timeout:  ``float``
+        """
+        connection = self.checkout(timeout=timeout)
+        try:
+            yield connection
+        except Exception:
+            self.checkin(connection, discard=True)
+            raise
+        self.checkin(connection)
+
+    def prune(self):
+        """
+        Tear down connections that have been idle too long (keeping the pool at its minimum size).
+        """
+        if self._idle_timeout is None:
+            return
+        expired = []
+        with self._condition:
+            cutoff = time.monotonic() - self._idle_timeout
+            # The idle list is oldest first, so the expired connections are at the front.
+            while self._idle and self._idle[0][1] <= cutoff and self._size - len(expired) > self._min_size:
+                expired.append(self._idle.pop(0)[0])
+        for manager in expired:
+            self._discard(manager)
+
+    def close(self):
+        """
+        Close the pool.  Idle connections are torn down now and borrowed connections are torn down when they're
+        checked in.
+        """
+        with self._condition:
+            self._closed = True
+            idle = [manager for manager, _ in self._idle]
+            self._idle.clear()
+            self._condition.notify_all()
+        if self._pruning is not None:
+            self._pruning.cancel()
+            self._pruning = None
+        for manager in idle:
+            self._discard(manager)
+
+    def _open(self) -> FastConnectionManager:
+        """
+        Make a new connection (after its place in the pool has been reserved).
+
+        :raises ConnectionException: if the connection can't be made
+        """
+        try:
+            manager = FastConnectionManager(self._factory(), backoff=self._backoff, scheduler=self._scheduler)
+            manager.connect()
+        except Exception as ex:
+            self._release()
+            raise ConnectionException.from_exception(ex)
+        if manager.state is not ManagerState.CONNECTED:
+            self._discard(manager)
+            raise ConnectionException(message='Could not open a new connection.', inner=None)
+        return manager
+
+    @staticmethod
+    def _healthy(manager: FastConnectionManager) -> bool:
+        """
+        Is the manager's connection good to go?
+        """
+        try:
+            return manager.state is ManagerState.CONNECTED and manager.connection.try_connect()
+        except Exception:
+            return False
+
+    def _discard(self, manager: FastConnectionManager):
+        """
+        Tear down a connection and give up its place in the pool.
+        """
+        try:
+            manager.teardown()
+        except Exception:
+            self.logger.warning('Could not tear down %s.', manager.connection.name, exc_info=True)
+        self._release()
+
+    def _release(self):
+        """
+        Give up a place in the pool.
+        """
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    @property
+    def _prune_interval(self) -> float:
+        """
+        This is how often we check for idle connections.  (We don't check more than once a second, however short the
+        idle timeout.)
+        """
+        return max(1.0, self._idle_timeout)
+
+    def _scheduled_prune(self):
+        """
+        This is called by the scheduler every so often to prune idle connections.
+        """
+        self.prune()
+        with self._condition:
+            if not self._closed:
+                self._pruning = self._scheduler.call_later(self._prune_interval, self._scheduled_prune)
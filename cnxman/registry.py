@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.registry
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Everybody in?
+
+A :py:class:`ConnectionRegistry` builds connections (and their managers) from definitions in a configuration file,
+rather than by hand, and brings them all up at once.
+
+.. code-block:: json
+
+    {
+        "defaults": {"type": "serial", "baudrate": 115200},
+        "connections": [
+            {"name": "gps", "port": "/dev/ttyUSB0", "baudrate": 4800},
+            {"name": "plc", "type": "socket", "host": "10.0.0.7", "port": 502,
+             "manager": {"backoff": {"initial": 1, "maximum": 60}, "min_interval": 5}}
+        ]
+    }
+
+Each definition has a ``name``, a ``type`` (``serial``, ``socket``, a type you've registered with
+:py:func:`ConnectionRegistry.register_type`, or the dotted path to a :py:class:`cnxman.basics.Connection` class), an
+optional ``manager`` section (the manager's ``backoff`` and ``min_interval``), and the arguments for the connection's
+constructor.  The ``defaults`` apply to every definition that doesn't say otherwise.  Files may be JSON, YAML (if you
+have `PyYAML <https://pyyaml.org/>`_) or TOML (if you have Python 3.11, or `tomli <https://pypi.org/project/tomli/>`_).
+
+.. code-block:: python
+
+    connections = ConnectionRegistry.load('connections.json')
+    for name, startup in connections.start(max_concurrent=32).items():
+        print(name, startup.state, startup.seconds)
+
+A port that can't be opened takes as long to fail as it takes, so :py:func:`ConnectionRegistry.start` makes its first
+attempts side by side (no more than ``max_concurrent`` at once).  The ones that fail are left to their managers, which
+keep trying in the background.
+"""
+
+from enum import Enum
+import importlib
+import threading
+import time
+from .basics import Connection, FastConnectionManager, ManagerState
+from .logging import loggable_class as loggable
+from .metrics import registry
+from .scheduling import Backoff, Scheduler
+# typing is slow to import, and only the annotations need it.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Dict, Iterator, List
+    from .basics import BaseConnectionManager
+
+
+class Startup(object):
+    """
+    This is how a connection's first attempt to connect went.
+    """
+    __slots__ = ('name', 'state', 'seconds', 'error')
+
+    def __init__(self, name: str, state: ManagerState, seconds: float, error: Exception = None):
+        """
+
+        :param name: the connection's name
+        :type name:  ``str``
+        :param state: the manager's state once the attempt was over
+        :type state:  :py:class:`cnxman.basics.ManagerState`
+        :param seconds: how long (in seconds) the attempt took
+        :type seconds:  ``float``
+        :param error: the exception raised by the attempt (if it raised one)
+        :type error:  :py:class:`Exception`
+        """
+        self.name = name  #: the connection's name
+        self.state = state  #: the manager's state once the attempt was over
+        self.seconds = seconds  #: how long (in seconds) the attempt took
+        self.error = error  #: the exception raised by the attempt (if it raised one)
+
+    @property
+    def connected(self) -> bool:
+        """
+        Did the connection come up?
+
+        :rtype: ``bool``
+        """
+        return self.state is ManagerState.CONNECTED
+
+    def __repr__(self):
+        return 'Startup({name!r}, {state}, {seconds:.3f}s)'.format(name=self.name,
+                                                                   state=self.state.name,
+                                                                   seconds=self.seconds)
+
+
+def _coerce(cls: type, options: dict) -> dict:
+    """
+    Turn the strings in a definition into the enumeration members the connection's constructor expects.  (Neither JSON
+    nor TOML has any way to say :py:attr:`cnxman.buffers.OverflowPolicy.DROP_OLDEST`, but they can say
+    ``"drop_oldest"``.)
+    """
+    import inspect
+    try:
+        parameters = inspect.signature(cls).parameters
+    except (TypeError, ValueError):
+        return options
+    coerced = dict(options)
+    for key, value in options.items():
+        parameter = parameters.get(key)
+        annotation = parameter.annotation if parameter is not None else None
+        if isinstance(value, str) and isinstance(annotation, type) and issubclass(annotation, Enum):
+            try:
+                coerced[key] = annotation[value.upper()]
+            except KeyError:
+                coerced[key] = annotation(value)
+    return coerced
+
+
+@loggable()
+class ConnectionRegistry(object):
+    """
+    This object keeps the connections (and their managers) built from a set of definitions, by name, and brings them
+    up and tears them down together.
+    """
+    #: the connection types everybody knows about (mapped to the classes, or to where the classes are, so that we
+    #: don't import pyserial just to open sockets)
+    _types = {
+        'serial': 'cnxman.serial.SerialConnection',
+        'socket': 'cnxman.socket.SocketConnection'
+    }
+
+    def __init__(self, scheduler: Scheduler = None, manager_class: type = FastConnectionManager):
+        """
+
+        :param scheduler: the scheduler the managers use to reconnect (the default is the shared scheduler)
+        :type scheduler:  :py:class:`cnxman.scheduling.Scheduler`
+        :param manager_class: the class of the connection managers
+        :type manager_class:  ``type``
+        """
+        self._scheduler = scheduler
+        self._manager_class = manager_class
+        self._managers: 'Dict[str, BaseConnectionManager]' = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._managers)
+
+    def __contains__(self, name: str):
+        return name in self._managers
+
+    def __iter__(self) -> 'Iterator[str]':
+        return iter(list(self._managers))
+
+    def __getitem__(self, name: str) -> Connection:
+        return self._managers[name].connection
+
+    @classmethod
+    def register_type(cls, name: str, connection_class: type or str):
+        """
+        Let definitions refer to a connection class by a short name.
+
+        :param name: the name definitions use for the type
+        :type name:  ``str``
+        :param connection_class: the :py:class:`cnxman.basics.Connection` class (or its dotted path)
+        """
+        cls._types[name] = connection_class
+
+    @classmethod
+    def resolve_type(cls, name: str) -> type:
+        """
+        Get the connection class a definition's ``type`` refers to.
+
+        :param name: a registered type name, or the dotted path to a class (e.g. ``mypackage.devices.ModbusConnection``)
+        :type name:  ``str``
+        :rtype: ``type``
+        :raises ValueError: if there's no such type
+        """
+        connection_class = cls._types.get(name, name)
+        if isinstance(connection_class, str):
+            module_name, _, class_name = connection_class.replace(':', '.').rpartition('.')
+            try:
+                connection_class = getattr(importlib.import_module(module_name), class_name)
+            except (ImportError, AttributeError, ValueError) as ex:
+                raise ValueError('There is no connection type called {name!r}.'.format(name=name)) from ex
+        if not (isinstance(connection_class, type) and issubclass(connection_class, Connection)):
+            raise ValueError('{name!r} is not a type of connection.'.format(name=name))
+        return connection_class
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> 'ConnectionRegistry':
+        """
+        Create a registry from the definitions in a configuration file.  (Its extension says what kind of file it is:
+        ``.json``, ``.yaml`` or ``.yml``, or ``.toml``.)
+
+        :param path: the path to the file
+        :type path:  ``str``
+        :param kwargs: the arguments for the registry's constructor
+        :rtype: :py:class:`ConnectionRegistry`
+        :raises ValueError: if the file isn't one we know how to read, or its definitions are no good
+        :raises ImportError: if reading the file needs a package that isn't installed
+        """
+        path = str(path)
+        extension = path.rpartition('.')[2].lower()
+        if extension == 'json':
+            import json
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        elif extension in ('yaml', 'yml'):
+            try:
+                import yaml
+            except ImportError as ex:
+                raise ImportError('Reading YAML files requires PyYAML (pip install pyyaml).') from ex
+            with open(path, 'r', encoding='utf-8') as f:
+                config = yaml.safe_load(f)
+        elif extension == 'toml':
+            try:
+                import tomllib as toml
+            except ImportError:  # (It's new in Python 3.11.)
+                try:
+                    import tomli as toml
+                except ImportError as ex:
+                    raise ImportError('Reading TOML files requires Python 3.11 or tomli (pip install tomli).') from ex
+            with open(path, 'rb') as f:
+                config = toml.load(f)
+        else:
+            raise ValueError('There is no way to read a .{extension} file.'.format(extension=extension))
+        return cls.from_config(config, **kwargs)
+
+    @classmethod
+    def from_config(cls, config: dict, **kwargs) -> 'ConnectionRegistry':
+        """
+        Create a registry from a set of definitions that have already been read.
+
+        :param config: the definitions (a ``connections`` list, or a mapping of names to definitions, and optionally
+            the ``defaults``)
+        :type config:  ``dict``
+        :param kwargs: the arguments for the registry's constructor
+        :rtype: :py:class:`ConnectionRegistry`
+        :raises ValueError: if the definitions are no good
+        """
+        if not isinstance(config, dict):
+            raise ValueError('The configuration must be a mapping.')
+        defaults = config.get('defaults') or {}
+        definitions = config.get('connections') or []
+        if isinstance(definitions, dict):
+            definitions = [dict(definition, name=name) for name, definition in definitions.items()]
+        connections = cls(**kwargs)
+        for definition in definitions:
+            merged = dict(defaults)
+            merged.update(definition)
+            try:
+                name = merged.pop('name')
+                type_ = merged.pop('type')
+            except KeyError as ex:
+                raise ValueError('Every connection needs a {key}.'.format(key=ex.args[0])) from None
+            manager = dict(defaults.get('manager') or {})
+            manager.update(merged.pop('manager', None) or {})
+            connections.add(name, type_, manager=manager, **merged)
+        return connections
+
+    def add(self, name: str, type_: type or str, manager: dict = None, **options) -> Connection:
+        """
+        Build a connection (and its manager) and add it to the registry.  (It isn't connected until the registry is
+        started.)
+
+        :param name: the connection's name
+        :type name:  ``str``
+        :param type_: the connection's type (or its class)
+        :param manager: the manager's ``backoff`` (a :py:class:`cnxman.scheduling.Backoff` or its arguments) and
+            ``min_interval``
+        :type manager:  ``dict``
+        :param options: the arguments for the connection's constructor
+        :return: the connection
+        :rtype:  :py:class:`cnxman.basics.Connection`
+        :raises ValueError: if there's already a connection with the name, or the definition is no good
+        """
+        connection_class = type_ if isinstance(type_, type) else self.resolve_type(type_)
+        manager = dict(manager or {})
+        backoff = manager.pop('backoff', None)
+        if isinstance(backoff, dict):
+            backoff = Backoff(**backoff)
+        min_interval = manager.pop('min_interval', 0.0)
+        if manager:
+            raise ValueError('The manager of {name!r} has no settings called {keys}.'.format(
+                name=name, keys=', '.join(sorted(manager))))
+        with self._lock:
+            if name in self._managers:
+                raise ValueError('There is already a connection called {name!r}.'.format(name=name))
+            try:
+                connection = connection_class(**_coerce(connection_class, options))
+            except TypeError as ex:
+                raise ValueError('{name!r} is not a valid {type}: {ex}'.format(
+                    name=name, type=connection_class.__name__, ex=ex)) from ex
+            self._managers[name] = self._manager_class(connection,
+                                                       backoff=backoff,
+                                                       scheduler=self._scheduler,
+                                                       min_interval=min_interval)
+        return connection
+
+    def manager(self, name: str) -> 'BaseConnectionManager':
+        """
+        Get a connection's manager.
+
+        :param name: the connection's name
+        :type name:  ``str``
+        :rtype: :py:class:`cnxman.basics.BaseConnectionManager`
+        """
+        return self._managers[name]
+
+    def start(self, max_concurrent: int = 16) -> 'Dict[str, Startup]':
+        """
+        Connect every connection that hasn't been connected yet, several at once.  Connections that don't come up are
+        left to their managers (which keep trying).
+
+        :param max_concurrent: the most connections we try to connect at once
+        :type max_concurrent:  ``int``
+        :return: how each connection's first attempt went (by name)
+        :rtype:  ``dict``
+        """
+        if max_concurrent < 1:
+            raise ValueError('The maximum concurrency must be at least 1.')
+        pending = [(name, manager) for name, manager in self._managers.items() if manager.state is ManagerState.READY]
+        if not pending:
+            return {}
+        from concurrent.futures import ThreadPoolExecutor
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(max_concurrent, len(pending)),
+                                thread_name_prefix='cnxman-startup') as executor:
+            startups: 'List[Startup]' = list(executor.map(lambda pending_: self._start(*pending_), pending))
+        up = sum(1 for startup in startups if startup.connected)
+        self.logger.info('%d of %d connections came up in %.3f seconds.',
+                         up, len(startups), time.perf_counter() - started)
+        return {startup.name: startup for startup in startups}
+
+    def teardown(self):
+        """
+        Tear down every connection.
+        """
+        for name, manager in list(self._managers.items()):
+            try:
+                manager.teardown()
+            except Exception:
+                self.logger.warning('Could not tear down %s.', name, exc_info=True)
+
+    def shutdown(self, timeout: float = None, max_concurrent: int = 16) -> 'Dict[str, bool]':
+        """
+        Shut down every connection gracefully (letting each one finish what it has in flight), several at once, and
+        return when they've all finished or the time is up, whichever comes first.
+
+        :param timeout: the longest time (in seconds) we'll wait (``None`` means as long as it takes)
+        :type timeout:  ``float``
+        :param max_concurrent: the most connections we shut down at once
+        :type max_concurrent:  ``int``
+        :return: whether each connection (by name) finished in time
+        :rtype:  ``dict``
+
+        :seealso:  :py:func:`cnxman.basics.BaseConnectionManager.shutdown`
+        """
+        if max_concurrent < 1:
+            raise ValueError('The maximum concurrency must be at least 1.')
+        pending = list(self._managers.items())
+        if not pending:
+            return {}
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        def remaining() -> 'float or None':
+            return max(0.0, deadline - time.monotonic()) if deadline is not None else None
+
+        def shutdown(name_: str, manager_: 'BaseConnectionManager') -> bool:
+            # (A connection that waited its turn only gets what's left of the time.)
+            try:
+                return manager_.shutdown(timeout=remaining())
+            except Exception:
+                self.logger.warning('Could not shut down %s.', name_, exc_info=True)
+                return False
+        from concurrent.futures import ThreadPoolExecutor, wait
+        executor = ThreadPoolExecutor(max_workers=min(max_concurrent, len(pending)),
+                                      thread_name_prefix='cnxman-shutdown')
+        futures = {name: executor.submit(shutdown, name, manager) for name, manager in pending}
+        wait(futures.values(), timeout=remaining())
+        # We don't wait for connections that overrun the deadline, and those that haven't had their turn by then won't
+        # get one.
+        for future in futures.values():
+            future.cancel()
+        executor.shutdown(wait=False)
+        results = {name: future.done() and not future.cancelled() and future.result()
+                   for name, future in futures.items()}
+        late = [name for name, ok in results.items() if not ok]
+        if late:
+            self.logger.warning('%d of %d connections did not shut down cleanly: %s',
+                                len(late), len(results), ', '.join(late))
+        return results
+
+    def _start(self, name: str, manager: 'BaseConnectionManager') -> Startup:
+        """
+        Make a connection's first attempt to connect.  (This runs on one of the start-up threads.)
+        """
+        error = None
+        started = time.perf_counter()
+        try:
+            manager.connect()
+        except Exception as ex:
+            error = ex
+            self.logger.warning('Could not start %s.', name, exc_info=True)
+        seconds = time.perf_counter() - started
+        if registry.enabled:
+            registry.histogram('cnxman_startup_seconds', "how long connections' first attempts to connect took",
+                               connection=name).observe(seconds)
+        return Startup(name, manager.state, seconds, error)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.replay
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Let's hear that again.
+
+A :py:class:`ReplayConnection` plays a capture file back through the same signals a
+:py:class:`cnxman.serial.SerialConnection` sends, so the handlers that saw a problem in production can see it again on
+your desk (or as many times a second as they can stand).
+
+.. code-block:: python
+
+    connection = ReplayConnection('ttyUSB0.cap', speed=None)  # As fast as we can.
+    dispatcher.connect(handle_frame, signal=SerialConnection.Signals.FRAME_RECEIVED, sender=connection)
+    connection.try_connect()
+    connection.wait()
+"""
+
+import threading
+import time
+from .basics import Connection
+from .capture import CaptureReader
+from .events import dispatcher, Event
+from .framing import FrameDecoder
+from .serial import SerialConnection
+
+
+class ReplayConnection(Connection):
+    """
+    This is a connection that replays a capture file, either with the original timing (or some multiple of it) or as
+    fast as possible.  It sends :py:attr:`cnxman.serial.SerialConnection.Signals.DATA_RECEIVED` for each chunk of data
+    in the file and (if it has a frame decoder) :py:attr:`cnxman.serial.SerialConnection.Signals.FRAME_RECEIVED` for
+    each frame.
+
+    :seealso:  :py:class:`cnxman.capture.CaptureWriter`
+    """
+    def __init__(self, path: str, speed: float or None = 1.0, frame_decoder: FrameDecoder = None):
+        """
+
+        :param path: the path to the capture file
+        :type path:  ``str``
+        :param speed: how much faster than real time we replay (``None`` means we replay as fast as we can)
+        :type speed:  ``float``
+        :param frame_decoder: the decoder that turns the data into frames (if you want frames)
+        :type frame_decoder:  :py:class:`cnxman.framing.FrameDecoder`
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError('The speed must be positive.')
+        self._path = path
+        self._speed = speed
+        self._frame_decoder = frame_decoder
+        self._thread: threading.Thread = None  # the thread that's replaying the file
+        self._stop_event = threading.Event()  # tells the thread to stop
+        self._finished = threading.Event()  # set once the whole file has been replayed
+        self._chunks = 0  # the number of chunks we've replayed
+        # This is the event we fill in (and send) for each chunk, just as a serial connection does.
+        self._data_event = Event(signal=SerialConnection.Signals.DATA_RECEIVED, sender=self)
+
+    @property
+    def name(self) -> str:
+        """
+        This is the path to the capture file.
+
+        :rtype: ``str``
+        """
+        return self._path
+
+    @property
+    def speed(self) -> float or None:
+        """
+        This is how much faster than real time we replay (or ``None`` if we replay as fast as we can).
+
+        :rtype: ``float``
+        """
+        return self._speed
+
+    @property
+    def frame_decoder(self) -> FrameDecoder or None:
+        """
+        This is the decoder that turns the data into frames (if there is one).
+
+        :rtype: :py:class:`cnxman.framing.FrameDecoder`
+        """
+        return self._frame_decoder
+
+    @property
+    def chunks(self) -> int:
+        """
+        This is the number of chunks we've replayed.
+
+        :rtype: ``int``
+        """
+        return self._chunks
+
+    @property
+    def finished(self) -> bool:
+        """
+        Has the whole file been replayed?
+
+        :rtype: ``bool``
+        """
+        return self._finished.is_set()
+
+    def try_connect(self) -> bool:
+        """
+        Start replaying the file (from the beginning).
+
+        :return: ``True`` if the file could be opened, otherwise ``False``
+        :rtype:  ``bool``
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        try:
+            reader = CaptureReader(self._path)
+        except (OSError, ValueError):
+            return False
+        if self._frame_decoder is not None:
+            self._frame_decoder.reset()
+        self._stop_event.clear()
+        self._finished.clear()
+        self._chunks = 0
+        self._thread = threading.Thread(target=self._replay, args=(reader,), daemon=True)
+        self._thread.start()
+        return True
+
+    def disconnect(self):
+        """
+        Stop replaying.
+        """
+        self._stop_event.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def teardown(self):
+        """
+        Stop replaying.
+        """
+        self.disconnect()
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Wait for the whole file to be replayed.
+
+        :param timeout: how long (in seconds) we'll wait (``None`` means we'll wait as long as it takes)
+        :type timeout:  ``float``
+        :return: ``True`` if the whole file has been replayed
+        :rtype:  ``bool``
+        """
+        return self._finished.wait(timeout)
+
+    def _replay(self, reader: CaptureReader):
+        """
+        Replay the file.  (This runs on the replay thread.)
+        """
+        try:
+            start = first = None
+            for timestamp, data in reader:
+                if self._stop_event.is_set():
+                    return
+                if self._speed is not None:
+                    # Wait until it's time for this chunk.
+                    if start is None:
+                        start, first = time.perf_counter(), timestamp
+                    delay = (timestamp - first) / 1e9 / self._speed - (time.perf_counter() - start)
+                    if delay > 0 and self._stop_event.wait(delay):
+                        return
+                self._chunks += 1
+                # (The chunk goes out with the time it was captured.)
+                event = self._data_event
+                event.data, event.timestamp = data, timestamp
+                dispatcher.send_event(event)
+                event.data = None
+                if self._frame_decoder is not None:
+                    for frame in self._frame_decoder.feed(data):
+                        dispatcher.send(signal=SerialConnection.Signals.FRAME_RECEIVED, sender=self, frame=frame)
+            self._finished.set()
+        finally:
+            reader.close()
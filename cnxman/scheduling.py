@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.scheduling
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+All in good time.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+from .logging import loggable_class as loggable
+# typing takes a while to import, so we leave it to the type checkers.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Callable
+
+
+class Backoff(object):
+    """
+    This object decides how long to wait before each successive attempt to do something that keeps failing.  The wait
+    grows exponentially (up to a maximum) and is randomly spread out a little so that lots of things that failed at the
+    same time don't all try again at the same time.
+    """
+    def __init__(self,
+                 initial: float = 5.0,
+                 multiplier: float = 2.0,
+                 maximum: float = 300.0,
+                 jitter: float = 0.1,
+                 max_attempts: int = None):
+        """
+
+        :param initial: the wait (in seconds) before the first attempt
+        :type initial:  ``float``
+        :param multiplier: the factor by which the wait grows with each attempt
+        :type multiplier:  ``float``
+        :param maximum: the longest (in seconds) we'll ever wait
+        :type maximum:  ``float``
+        :param jitter: the fraction by which a wait may be randomly lengthened or shortened
+        :type jitter:  ``float``
+        :param max_attempts: the number of attempts after which we give up (``None`` means we never give up)
+        :type max_attempts:  ``int``
+        """
+        if initial < 0 or maximum < 0:
+            raise ValueError('Waits cannot be negative.')
+        if multiplier < 1:
+            raise ValueError('The multiplier must be at least 1.')
+        if not 0 <= jitter <= 1:
+            raise ValueError('The jitter must be between 0 and 1.')
+        self._initial = initial
+        self._multiplier = multiplier
+        self._maximum = maximum
+        self._jitter = jitter
+        self._max_attempts = max_attempts
+
+    @property
+    def max_attempts(self) -> int or None:
+        """
+        This is the number of attempts after which we give up (if we ever do).
+
+        :rtype: ``int``
+        """
+        return self._max_attempts
+
+    def exhausted(self, attempt: int) -> bool:
+        """
+        Have we run out of attempts?
+
+        :param attempt: the number of the attempt we're about to make (starting from ``1``)
+        :type attempt:  ``int``
+        :rtype: ``bool``
+        """
+        return self._max_attempts is not None and attempt > self._max_attempts
+
+    def delay(self, attempt: int) -> float:
+        """
+        How long should we wait before the given attempt?
+
+        :param attempt: the number of the attempt we're about to make (starting from ``1``)
+        :type attempt:  ``int``
+        :return: the wait (in seconds)
+        :rtype:  ``float``
+        """
+        # Once the exponent is big enough, we're at the maximum anyway (and we don't want to overflow).
+        exponent = min(max(0, attempt - 1), 64)
+        delay = min(self._maximum, self._initial * self._multiplier ** exponent)
+        if self._jitter:
+            delay *= 1 + random.uniform(-self._jitter, self._jitter)
+        return max(0.0, delay)
+
+
+class CircuitBreaker(object):
+    """
+    This object keeps a lid on reconnecting.  Connection managers ask it before each attempt to recover, and it caps
+    the number of attempts under way at once (so a hundred ports that drop together don't all reconnect together).  If
+    you give it a failure threshold, it also stops all attempts for a while once that many have failed in a row, then
+    lets them through one at a time until one succeeds.
+    """
+    _default = None  # the breaker shared by everybody who doesn't bring their own
+    _default_lock = threading.Lock()
+
+    def __init__(self,
+                 max_concurrent: int = 8,
+                 failure_threshold: int = None,
+                 cooldown: float = 30.0,
+                 retry_delay: float = 1.0):
+        """
+
+        :param max_concurrent: the most attempts that may be under way at once
+        :type max_concurrent:  ``int``
+        :param failure_threshold: the number of attempts that may fail in a row before we stop all attempts for a while
+            (``None`` means we never do)
+        :type failure_threshold:  ``int``
+        :param cooldown: how long (in seconds) we stop all attempts once the failure threshold is reached
+        :type cooldown:  ``float``
+        :param retry_delay: roughly how long (in seconds) an attempt we've turned away should wait before asking again
+        :type retry_delay:  ``float``
+        """
+        if max_concurrent < 1:
+            raise ValueError('At least one attempt must be allowed at a time.')
+        if failure_threshold is not None and failure_threshold < 1:
+            raise ValueError('The failure threshold must be at least 1.')
+        if cooldown < 0 or retry_delay < 0:
+            raise ValueError('Waits cannot be negative.')
+        self._max_concurrent = max_concurrent
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._retry_delay = retry_delay
+        self._lock = threading.Lock()
+        self._in_flight = 0  # the number of attempts under way
+        self._failures = 0  # the number of attempts that have failed in a row
+        self._opened: float = None  # when we stopped all attempts (if we have)
+
+    @classmethod
+    def default(cls) -> 'CircuitBreaker':
+        """
+        Get the breaker shared by everybody who doesn't bring their own.
+
+        :rtype: :py:class:`CircuitBreaker`
+        """
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = CircuitBreaker()
+        return cls._default
+
+    @property
+    def max_concurrent(self) -> int:
+        """
+        This is the most attempts that may be under way at once.
+
+        :rtype: ``int``
+        """
+        return self._max_concurrent
+
+    @property
+    def in_flight(self) -> int:
+        """
+        This is the number of attempts under way.
+
+        :rtype: ``int``
+        """
+        return self._in_flight
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Have we stopped all attempts (because too many failed in a row)?
+
+        :rtype: ``bool``
+        """
+        return self._opened is not None
+
+    def acquire(self) -> bool:
+        """
+        Ask to make an attempt.  If the answer is yes, tell us how it went (with :py:func:`CircuitBreaker.release`)
+        when it's over.
+
+        :return: ``True`` if the attempt may go ahead, or ``False`` if it should wait (see
+            :py:func:`CircuitBreaker.retry_after`)
+        :rtype:  ``bool``
+        """
+        with self._lock:
+            if self._opened is not None:
+                # Once the cooldown is over, we let attempts through one at a time to see how things are.
+                if time.monotonic() - self._opened < self._cooldown or self._in_flight > 0:
+                    return False
+            elif self._in_flight >= self._max_concurrent:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self, success: bool):
+        """
+        Report on an attempt that was allowed to go ahead.
+
+        :param success: Did it work?
+        :type success:  ``bool``
+        """
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            if success:
+                self._failures = 0
+                self._opened = None
+                return
+            self._failures += 1
+            if self._failure_threshold is not None and (self._opened is not None
+                                                        or self._failures >= self._failure_threshold):
+                self._opened = time.monotonic()
+
+    def retry_after(self) -> float:
+        """
+        How long should an attempt we've turned away wait before it asks again?
+
+        :return: the wait (in seconds), which is spread out a little so the attempts we've turned away don't all come
+            back at once
+        :rtype:  ``float``
+        """
+        delay = self._retry_delay
+        opened = self._opened
+        if opened is not None:
+            delay = max(delay, self._cooldown - (time.monotonic() - opened))
+        return delay * random.uniform(1.0, 1.5)
+
+
+class ScheduledCall(object):
+    """
+    This is a handle on a call that has been scheduled with a :py:class:`Scheduler`.
+    """
+    def __init__(self, when: float, callback: 'Callable', args: tuple):
+        """
+
+        :param when: the time (according to :py:func:`time.monotonic`) at which the call is to be made
+        :type when:  ``float``
+        :param callback: the function to call
+        :param args: the arguments to pass to the function
+        """
+        self._when = when
+        self._callback = callback
+        self._args = args
+        self._cancelled = False
+
+    @property
+    def when(self) -> float:
+        """
+        This is the time (according to :py:func:`time.monotonic`) at which the call is to be made.
+
+        :rtype: ``float``
+        """
+        return self._when
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        Has the call been cancelled?
+
+        :rtype: ``bool``
+        """
+        return self._cancelled
+
+    def cancel(self):
+        """
+        Cancel the call.  (If it's already been made, this does nothing.)
+        """
+        self._cancelled = True
+
+    def __call__(self):
+        if not self._cancelled:
+            self._callback(*self._args)
+
+
+@loggable()
+class Scheduler(object):
+    """
+    This object makes calls at scheduled times.  The calls are kept in a heap and are all made from a single background
+    thread (or handed from it to a small, fixed pool of worker threads), so any number of calls may be waiting at once
+    without a thread (or a sleep) apiece.
+    """
+    _default = None  # the scheduler shared by everybody who doesn't bring their own
+    _default_lock = threading.Lock()
+
+    def __init__(self, name: str = 'cnxman-scheduler', max_workers: int = 0):
+        """
+
+        :param name: the name of the scheduler's thread
+        :type name:  ``str``
+        :param max_workers: the number of worker threads that make the calls (``0`` means the calls are made on the
+            scheduler's own thread, in which case they should be quick)
+        :type max_workers:  ``int``
+        """
+        self._name = name
+        self._heap = []  # the scheduled calls, as (when, sequence, call) tuples
+        self._sequence = itertools.count()  # This keeps calls scheduled for the same time in order.
+        self._condition = threading.Condition()
+        self._thread: threading.Thread = None  # the thread that waits for calls to come due
+        self._stopped = False
+        self._executor = None  # the threads that make the calls (if we don't make them ourselves)
+        if max_workers > 0:
+            # (concurrent.futures is slow to import, so we only import it if we need it.)
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    @classmethod
+    def default(cls) -> 'Scheduler':
+        """
+        Get the scheduler shared by everybody who doesn't bring their own.
+
+        :rtype: :py:class:`Scheduler`
+        """
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = Scheduler(max_workers=4)
+        return cls._default
+
+    def __len__(self):
+        with self._condition:
+            return sum(1 for _, _, call in self._heap if not call.cancelled)
+
+    def call_later(self, delay: float, callback: 'Callable', *args) -> ScheduledCall:
+        """
+        Schedule a call to be made after a delay.
+
+        :param delay: the delay (in seconds)
+        :type delay:  ``float``
+        :param callback: the function to call
+        :param args: the arguments to pass to the function
+        :return: a handle on the scheduled call
+        :rtype:  :py:class:`ScheduledCall`
+        """
+        return self.call_at(time.monotonic() + max(0.0, delay), callback, *args)
+
+    def call_at(self, when: float, callback: 'Callable', *args) -> ScheduledCall:
+        """
+        Schedule a call to be made at a particular time.
+
+        :param when: the time (according to :py:func:`time.monotonic`) at which to make the call
+        :type when:  ``float``
+        :param callback: the function to call
+        :param args: the arguments to pass to the function
+        :return: a handle on the scheduled call
+        :rtype:  :py:class:`ScheduledCall`
+        """
+        call = ScheduledCall(when=when, callback=callback, args=args)
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError('The scheduler has been stopped.')
+            heapq.heappush(self._heap, (when, next(self._sequence), call))
+            # Start the thread the first time we have something for it to do.
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+            # If this call is now the next one due, the thread needs to know.
+            elif self._heap[0][2] is call:
+                self._condition.notify()
+        return call
+
+    def stop(self):
+        """
+        Stop the scheduler.  Calls that haven't come due are never made.
+        """
+        with self._condition:
+            self._stopped = True
+            self._heap.clear()
+            self._condition.notify()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _run(self):
+        """
+        Wait for calls to come due and make them.
+        """
+        while True:
+            with self._condition:
+                while True:
+                    if self._stopped:
+                        return
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    when, _, call = self._heap[0]
+                    # Cancelled calls just get thrown away.
+                    if call.cancelled:
+                        heapq.heappop(self._heap)
+                        continue
+                    delay = when - time.monotonic()
+                    if delay > 0:
+                        self._condition.wait(delay)
+                        continue
+                    heapq.heappop(self._heap)
+                    break
+            if self._executor is not None:
+                self._executor.submit(self._call, call)
+            else:
+                self._call(call)
+
+    @staticmethod
+    def _call(call: ScheduledCall):
+        """
+        Make a call, making sure nothing it does can take the scheduler down with it.
+        """
+        try:
+            call()
+        except Exception:
+            Scheduler.logger.error('A scheduled call failed.', exc_info=True)
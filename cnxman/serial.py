@@ -9,14 +9,26 @@ Let's manage serial port connections!
 """
 
 from .logging import loggable_class as loggable
-from cnxman.basics import Connection
+from cnxman.basics import Connection, ConnectionException
+from collections import deque
+from .buffers import OverflowPolicy, RingBuffer
+from .capture import CaptureWriter
+from .framing import FrameDecoder
+from .parallel import DecodeStream, ParallelDecoder
 from enum import Enum
-from pydispatch import dispatcher
-import serial as pyserial
-from serial import Serial, SerialException
+from .events import dispatcher, Event
+from .metrics import registry, SIZE_BUCKETS
+from .tracing import tracer
+# pyserial isn't imported until we open a port.  (Type checkers can have it now.)
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    import serial as pyserial
+    from .sharing import SharedRingPublisher
 import threading
+import time
 
 
+@loggable()
 class SerialListener(threading.Thread):
     """
     This is a thread object that listens for incoming data from a serial connection.
@@ -26,20 +38,56 @@ class SerialListener(threading.Thread):
         """
         These are the used by serial listener objects.
 
-        :seealso:  :py:func:`pydispatch.dispatcher`
+        :seealso:  :py:data:`cnxman.events.dispatcher`
         """
         DATA_RECEIVED = 'data-received'  # We received some data! Hooray!
         READ_ERROR = 'read-error'  # We couldn't read from the connection.
 
-    def __init__(self, serial: pyserial.Serial):
+    poll_interval: float = 0.001  #: how long (in seconds) we wait between checks for more data in a read window
+
+    def __init__(self,
+                 serial: 'pyserial.Serial',
+                 chunk_size: int = 4096,
+                 max_latency: float = 0.0,
+                 buffer: RingBuffer = None,
+                 capture: CaptureWriter = None):
+        """
+
+        :param serial: the serial connection to monitor
+        :type serial:  :py:class:`pyserial.Serial`
+        :param chunk_size: the maximum number of bytes delivered in a single
+            :py:attr:`SerialListener.Signals.DATA_RECEIVED` signal
+        :type chunk_size:  ``int``
+        :param max_latency: the longest time (in seconds) we'll hold on to received bytes while waiting to fill a
+            chunk (``0`` means we just drain whatever the port has waiting)
+        :type max_latency:  ``float``
+        :param buffer: a buffer through which received data is handed to a separate dispatch thread (if you don't
+            want subscribers to be called on the thread that reads the port)
+        :type buffer:  :py:class:`cnxman.buffers.RingBuffer`
+        :param capture: a capture file to which everything we read is written (with the time we read it)
+        :type capture:  :py:class:`cnxman.capture.CaptureWriter`
+        """
         super().__init__()
+        if chunk_size < 1:
+            raise ValueError('The chunk size must be at least 1.')
+        if max_latency < 0:
+            raise ValueError('The maximum latency cannot be negative.')
         # Threads of this type run as daemons.
         self.daemon = True
         self._serial = serial  # the serial connection we're monitoring
+        self._chunk_size = chunk_size  # the most bytes we'll send along in one signal
+        self._max_latency = max_latency  # the longest we'll wait to fill up a chunk
+        self._buffer = buffer  # the buffer between this thread and the dispatch thread (if there is one)
+        self._capture = capture  # the capture file to which we write what we read (if there is one)
+        self._dispatch_thread: SerialDispatcher = None  # the thread that sends the buffered data along
         self._terminate_event = threading.Event()  # a threading event to tell us when its time to stop
+        self._drain_deadline: float = None  # If we're stopping gracefully, this is when we give up on draining the port.
+        self._traces = deque()  # the traces of the chunks in the buffer (if we're tracing, and there is a buffer)
+        # This is the event we fill in (and send) each time we read something.
+        self._data_event = Event(signal=SerialListener.Signals.DATA_RECEIVED, sender=self)
 
     @property
-    def serial(self) -> pyserial.Serial:
+    def serial(self) -> 'pyserial.Serial':
         """
         This is the serial object we're monitoring.
 
@@ -47,16 +95,118 @@ class SerialListener(threading.Thread):
         """
         return self._serial
 
+    @property
+    def chunk_size(self) -> int:
+        """
+        This is the maximum number of bytes delivered in a single data signal.
+
+        :rtype: ``int``
+        """
+        return self._chunk_size
+
+    @property
+    def max_latency(self) -> float:
+        """
+        This is the longest time (in seconds) received bytes are held while we wait to fill a chunk.
+
+        :rtype: ``float``
+        """
+        return self._max_latency
+
+    @property
+    def buffer(self) -> RingBuffer or None:
+        """
+        This is the buffer through which received data is handed to the dispatch thread (if there is one).
+
+        :rtype: :py:class:`cnxman.buffers.RingBuffer`
+        """
+        return self._buffer
+
+    def stop(self, timeout: float = None) -> bool:
+        """
+        Stop the listener gracefully:  we stop waiting for the port, send along whatever it already has waiting (and
+        whatever is still in the buffer), and then close it.
+
+        :param timeout: the longest time (in seconds) we'll take (``None`` means as long as it takes)
+        :type timeout:  ``float``
+        :return: ``True`` if everything was sent along in time, or ``False`` if we had to cut it short
+        :rtype:  ``bool``
+
+        :seealso:  :py:func:`SerialListener.terminate`
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        self._drain_deadline = deadline if deadline is not None else float('inf')
+        self._terminate_event.set()
+        # Interrupt the read we're (probably) waiting on.  (Not every kind of port can do that, in which case the read
+        # ends when the port's own timeout runs out, or when we close the port.)
+        try:
+            self._serial.cancel_read()
+        except Exception:
+            pass
+        stopped = self._join(deadline)
+        self.terminate()
+        if self._dispatch_thread is not None and self._dispatch_thread is not threading.current_thread():
+            self._dispatch_thread.join(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+            stopped = stopped and not self._dispatch_thread.is_alive()
+        return stopped
+
+    def _join(self, deadline: float or None) -> bool:
+        """
+        Wait (until the deadline, at the latest) for the thread to finish.
+
+        :return: ``True`` if the thread has finished (or never started)
+        """
+        if self is threading.current_thread() or self.ident is None:
+            return True
+        self.join(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+        return not self.is_alive()
+
     def terminate(self):
         """
-        Terminate the listener.
+        Terminate the listener.  (Anything we haven't read from the port yet is lost.)
+
+        :seealso:  :py:func:`SerialListener.stop`
         """
+        # Set the termination event.  (We set it first so that if closing the port interrupts a read, we know why.)
+        self._terminate_event.set()
         try:
             self._serial.close()
-        except:
-            pass  # TODO: Log this properly.
-        # Set the termination event.
-        self._terminate_event.set()
+        except Exception:
+            self.logger.warning('Could not close %s.', self._serial.port, exc_info=True)
+        # The dispatch thread (if there is one) can finish up once it has sent along whatever is left.
+        if self._buffer is not None:
+            self._buffer.close()
+
+    def _read_chunk(self) -> bytes:
+        """
+        Read the next chunk of data from the serial connection.  We block (subject to the port's own timeout) until
+        at least one byte arrives, then drain whatever else the port has waiting (up to the chunk size).  If a maximum
+        latency is configured, we keep gathering bytes until the chunk is full or the time window closes.
+
+        :return: the data (which may be empty if the port timed out)
+        :rtype:  ``bytes``
+        """
+        data = self._serial.read(1)
+        # If we got nothing (or we're delivering single bytes), there's nothing more to gather.
+        if not data or self._chunk_size == 1:
+            return data
+        chunk = bytearray(data)
+        deadline = time.monotonic() + self._max_latency if self._max_latency > 0 else None
+        while len(chunk) < self._chunk_size:
+            waiting = self._serial.in_waiting
+            if waiting:
+                chunk += self._serial.read(min(waiting, self._chunk_size - len(chunk)))
+                continue
+            # If there's no time window (or it has closed), we're done.
+            if deadline is None:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            # Give the rest of the chunk a moment to arrive (unless somebody tells us to stop in the meantime).
+            if self._terminate_event.wait(min(self.poll_interval, remaining)):
+                break
+        return bytes(chunk)
 
     def run(self):
         """
@@ -67,22 +217,66 @@ class SerialListener(threading.Thread):
             # ...let's try to do that now.
             try:
                 self._serial.open()
-            except:                                           # TODO: Improve the exception handling!
-                print("couldn't open the serial port.")
+            except Exception:
+                self.logger.error('Could not open %s.', self._serial.port, exc_info=True)
                 # Let any interested parties know something went wrong.
                 dispatcher.send(signal=SerialListener.Signals.READ_ERROR, sender=self)
                 # We're finished now.
                 self.terminate()
                 return
+        # If we're handing data off through a buffer, we need somebody on the other end.
+        if self._buffer is not None:
+            self._dispatch_thread = SerialDispatcher(listener=self, buffer=self._buffer)
+            self._dispatch_thread.start()
 
-        while not self._terminate_event.is_set():
+        # These are the metrics we keep (if anybody has asked for metrics).
+        port = self._serial.port
+        reads = registry.counter('cnxman_serial_reads_total', 'chunks read by serial listeners', port=port)
+        bytes_read = registry.counter('cnxman_serial_bytes_read_total', 'bytes read by serial listeners', port=port)
+        chunk_sizes = registry.histogram('cnxman_serial_chunk_bytes', 'the sizes of the chunks serial listeners read',
+                                         buckets=SIZE_BUCKETS, port=port)
+        event = self._data_event
+        while not self._terminate_event.is_set() or self._draining():
             try:
-                data = self._serial.read()
-                # Notify interested parties that we got something!
-                dispatcher.send(signal=SerialListener.Signals.DATA_RECEIVED, sender=self, data=data)
-                #print("got some data: ", data)
-            except:                                           # TODO: Improve the exception handling!
-                print("an error occurred while we were reading!")
+                data = self._read_chunk()
+                # If the read timed out, there's nothing to report.
+                if not data:
+                    continue
+                if self._capture is not None:
+                    self._capture.write(data)
+                if registry.enabled:
+                    reads.inc()
+                    bytes_read.inc(len(data))
+                    chunk_sizes.observe(len(data))
+                trace = tracer.begin(port, len(data)) if tracer.enabled else None
+                # If there's a buffer, the dispatch thread will take it from here...
+                if self._buffer is not None:
+                    if trace is not None:
+                        # The dispatch thread finishes the trace once it has read up to the end of the chunk.  (It has to
+                        # be waiting for the dispatch thread before the chunk is, or the chunk could get there first.)
+                        trace.enqueue, trace.offset = time.perf_counter_ns(), self._buffer.written + len(data)
+                        self._traces.append(trace)
+                    self._buffer.write(data)
+                    if trace is not None:
+                        trace.offset = self._buffer.written  # (...in case some of it was dropped.)
+                else:
+                    # ...otherwise, we notify interested parties that we got something!
+                    event.data, event.timestamp = data, time.monotonic_ns()
+                    if trace is not None:
+                        trace.dispatch = time.perf_counter_ns()
+                    dispatcher.send_event(event)
+                    event.data = None  # (We don't want to hold on to the data until the next read.)
+                    if trace is not None:
+                        tracer.finish(trace)
+            except Exception:
+                if self._terminate_event.is_set():
+                    # We were told to stop (and maybe closed the port ourselves), so that's to be expected.
+                    self.logger.debug('Stopped reading %s.', port)
+                    return
+                self.logger.error('Could not read from %s.', port, exc_info=True)
+                if registry.enabled:
+                    registry.counter('cnxman_serial_read_errors_total', 'errors serial listeners ran into',
+                                     port=port).inc()
                 # Any error results in immediate termination of the listener.
                 self.terminate()
                 # Let any interested parties know.
@@ -90,25 +284,408 @@ class SerialListener(threading.Thread):
                 # Bail out.
                 return
 
+    def _draining(self) -> bool:
+        """
+        Are we stopping gracefully, with time left to read what the port already has waiting?
+        """
+        if self._drain_deadline is None or time.monotonic() >= self._drain_deadline:
+            return False
+        try:
+            return self._serial.in_waiting > 0
+        except Exception:
+            return False
+
+
+@loggable()
+class SerialDispatcher(threading.Thread):
+    """
+    This is a thread object that takes the data a :py:class:`SerialListener` has buffered and sends it along to
+    interested parties, so that slow subscribers don't hold up reads from the port.  The data signals it sends look just
+    like they came from the listener.
+    """
+    def __init__(self, listener: SerialListener, buffer: RingBuffer):
+        """
+
+        :param listener: the listener on whose behalf we're sending signals
+        :type listener:  :py:class:`SerialListener`
+        :param buffer: the buffer from which we take the data
+        :type buffer:  :py:class:`cnxman.buffers.RingBuffer`
+        """
+        super().__init__()
+        # Threads of this type run as daemons.
+        self.daemon = True
+        self._listener = listener  # the listener on whose behalf we're sending signals
+        self._buffer = buffer  # the buffer from which we take the data
+        # This is the event we fill in (and send) for each chunk we take from the buffer.
+        self._data_event = Event(signal=SerialListener.Signals.DATA_RECEIVED, sender=listener)
+
+    def run(self):
+        """
+        Send the buffered data along until the buffer is closed and empty.
+        """
+        event = self._data_event
+        traces = self._listener._traces
+        while True:
+            data = self._buffer.read(self._listener.chunk_size)
+            # If we got nothing, the buffer is closed and there's nothing left to send.
+            if not data:
+                return
+            event.data, event.timestamp = data, time.monotonic_ns()
+            # The chunks being traced whose ends we've now read are about to be dispatched.  (A chunk overwritten before
+            # we could read it counts as read.)
+            finished = None
+            if traces:
+                finished = []
+                consumed = self._buffer.consumed
+                while traces and traces[0].offset <= consumed:
+                    trace = traces.popleft()
+                    trace.dispatch = time.perf_counter_ns()
+                    finished.append(trace)
+            try:
+                dispatcher.send_event(event)
+            except Exception:
+                # A subscriber's troubles are no reason to stop sending data to the others.
+                self.logger.error('A subscriber to %s failed.', self._listener.serial.port, exc_info=True)
+            event.data = None
+            if finished:
+                for trace in finished:
+                    tracer.finish(trace)
+
+
+@loggable()
+class SerialWriter(threading.Thread):
+    """
+    This is a thread object that writes queued data to a serial connection.  Small messages sent close together are
+    coalesced into larger writes so that a busy stream of commands doesn't cost a system call per message, and the
+    queue is bounded so that a caller who outpaces the port finds out about it.
+    """
+
+    class Signals(Enum):
+        """
+        These are the used by serial writer objects.
+
+        :seealso:  :py:data:`cnxman.events.dispatcher`
+        """
+        WRITE_ERROR = 'write-error'  # We couldn't write to the connection.
+
+    def __init__(self,
+                 serial: 'pyserial.Serial',
+                 queue_size: int = 65536,
+                 chunk_size: int = 4096,
+                 flush_deadline: float = 0.0):
+        """
+
+        :param serial: the serial connection to which we write
+        :type serial:  :py:class:`pyserial.Serial`
+        :param queue_size: the most bytes we'll hold waiting to be written (though a single message that's larger is
+            accepted when the queue is empty)
+        :type queue_size:  ``int``
+        :param chunk_size: the number of bytes we try to gather into a single write
+        :type chunk_size:  ``int``
+        :param flush_deadline: the longest time (in seconds) a message may wait for others to join it before it's
+            written (``0`` means we write whatever has accumulated as soon as the port is free)
+        :type flush_deadline:  ``float``
+        """
+        super().__init__()
+        if queue_size < 1 or chunk_size < 1:
+            raise ValueError('The queue size and chunk size must be at least 1.')
+        if flush_deadline < 0:
+            raise ValueError('The flush deadline cannot be negative.')
+        # Threads of this type run as daemons.
+        self.daemon = True
+        self._serial = serial  # the serial connection to which we write
+        self._queue_size = queue_size  # the most bytes we'll hold
+        self._chunk_size = chunk_size  # the number of bytes we'd like to write at once
+        self._flush_deadline = flush_deadline  # the longest a message waits for company
+        self._queue = deque()  # the messages waiting to be written (and when each was queued)
+        self._queued = 0  # the number of bytes waiting to be written
+        self._writing = 0  # the number of bytes we're writing right now
+        self._terminated = False  # Have we been told to stop?
+        self._condition = threading.Condition()  # guards everything above
+
+    @property
+    def serial(self) -> 'pyserial.Serial':
+        """
+        This is the serial object to which we write.
+
+        :rtype: :py:class:`pyserial.Serial`
+        """
+        return self._serial
+
+    @property
+    def queue_size(self) -> int:
+        """
+        This is the most bytes we'll hold waiting to be written.
+
+        :rtype: ``int``
+        """
+        return self._queue_size
+
+    @property
+    def chunk_size(self) -> int:
+        """
+        This is the number of bytes we try to gather into a single write.
+
+        :rtype: ``int``
+        """
+        return self._chunk_size
+
+    @property
+    def flush_deadline(self) -> float:
+        """
+        This is the longest time (in seconds) a message may wait for others to join it before it's written.
+
+        :rtype: ``float``
+        """
+        return self._flush_deadline
+
+    @property
+    def queued(self) -> int:
+        """
+        This is the number of bytes waiting to be written.
+
+        :rtype: ``int``
+        """
+        return self._queued
+
+    def send(self, data, timeout: float = None) -> bool:
+        """
+        Queue data to be written.
+
+        :param data: the data (``bytes``, ``bytearray``, ``memoryview`` or anything else that supports the buffer
+            protocol), which isn't copied, so don't change it until it has been written
+        :param timeout: how long (in seconds) we'll wait for room in the queue (``None`` means we'll wait as long as
+            it takes and ``0`` means we won't wait at all)
+        :type timeout:  ``float``
+        :return: ``True`` if the data was queued, or ``False`` if there was no room (or we've been terminated)
+        :rtype:  ``bool``
+        """
+        return self.send_many((data,), timeout=timeout) == 1
+
+    def send_many(self, messages, timeout: float = None) -> int:
+        """
+        Queue several messages to be written.
+
+        :param messages: the messages (each of which may be anything :py:func:`SerialWriter.send` accepts)
+        :param timeout: how long (in seconds) we'll wait, in all, for room in the queue
+        :type timeout:  ``float``
+        :return: the number of messages that were queued (which are always the first ones)
+        :rtype:  ``int``
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        sent = 0
+        with self._condition:
+            for message in messages:
+                view = memoryview(message).cast('B')
+                if view.nbytes and not self._wait_for_room(view.nbytes, deadline):
+                    if registry.enabled:
+                        registry.counter('cnxman_serial_sends_rejected_total',
+                                         'messages serial writers had no room for', port=self._serial.port).inc()
+                    break
+                if view.nbytes:
+                    self._queue.append((view, time.monotonic()))
+                    self._queued += view.nbytes
+                sent += 1
+            if sent:
+                self._condition.notify_all()
+        return sent
+
+    def _wait_for_room(self, size: int, deadline: float or None) -> bool:
+        """
+        Wait (with the lock held) until there's room in the queue for a message.
+
+        :return: ``True`` if there is room, or ``False`` if we ran out of time (or we've been terminated)
+        """
+        # A message that's bigger than the queue gets in when the queue is empty (or it never would).
+        while not self._terminated and self._queued and self._queued + size > self._queue_size:
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                return False
+            self._condition.wait(remaining)
+        return not self._terminated
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until everything that has been queued is written.
+
+        :param timeout: how long (in seconds) we'll wait (``None`` means we'll wait as long as it takes)
+        :type timeout:  ``float``
+        :return: ``True`` if everything was written in time
+        :rtype:  ``bool``
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._terminated or not (self._queued or self._writing),
+                                            timeout) and not (self._queued or self._writing)
+
+    def stop(self, timeout: float = None) -> bool:
+        """
+        Stop the writer gracefully:  we write whatever has been queued (if we can do it in time) and then terminate.
+
+        :param timeout: the longest time (in seconds) we'll wait for the queue to empty (``None`` means as long as it
+            takes)
+        :type timeout:  ``float``
+        :return: ``True`` if everything was written in time
+        :rtype:  ``bool``
+        """
+        flushed = self.flush(timeout=timeout)
+        self.terminate()
+        return flushed
+
+    def terminate(self):
+        """
+        Terminate the writer.  (Anything that hasn't been written yet is discarded.)
+        """
+        with self._condition:
+            self._terminated = True
+            self._condition.notify_all()
+
+    def _take(self) -> list or None:
+        """
+        Wait (with the lock held) for data to write, then take as many whole messages as fit in a chunk (or the first
+        message, if it's bigger than a chunk on its own).
+
+        :return: the messages, or ``None`` if we've been terminated
+        """
+        while not self._queue and not self._terminated:
+            self._condition.wait()
+        # If there's a flush deadline, give more messages a chance to join the first one.
+        if self._flush_deadline > 0:
+            deadline = self._queue[0][1] + self._flush_deadline if self._queue else 0
+            while not self._terminated and self._queued < self._chunk_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+        if self._terminated:
+            return None
+        batch = [self._queue.popleft()[0]]
+        size = batch[0].nbytes
+        while self._queue and size + self._queue[0][0].nbytes <= self._chunk_size:
+            view = self._queue.popleft()[0]
+            batch.append(view)
+            size += view.nbytes
+        self._queued -= size
+        self._writing = size
+        # There's room in the queue now.
+        self._condition.notify_all()
+        return batch
+
+    def run(self):
+        """
+        Write queued data until we're terminated.
+        """
+        while True:
+            with self._condition:
+                batch = self._take()
+            if batch is None:
+                return
+            try:
+                # A single message goes as it is; the rest are gathered up into a single write.
+                data = batch[0] if len(batch) == 1 else b''.join(batch)
+                self._serial.write(data)
+                if registry.enabled:
+                    registry.counter('cnxman_serial_writes_total', 'writes made by serial writers',
+                                     port=self._serial.port).inc()
+                    registry.counter('cnxman_serial_bytes_written_total', 'bytes written by serial writers',
+                                     port=self._serial.port).inc(len(data))
+            except Exception:
+                self.logger.error('Could not write to %s.', self._serial.port, exc_info=True)
+                self.terminate()
+                # Let any interested parties know.
+                dispatcher.send(signal=SerialWriter.Signals.WRITE_ERROR, sender=self)
+                return
+            finally:
+                with self._condition:
+                    self._writing = 0
+                    self._condition.notify_all()
+
 
 @loggable()
 class SerialConnection(Connection):
+    """
+    This is a connection to a serial port.
+    """
+    __slots__ = ('_port', '_baudrate', '_bytesize', '_parity', '_stopbits', '_timeout',
+                 '_chunk_size', '_max_latency', '_frame_decoder', '_buffer_size', '_overflow_policy',
+                 '_write_queue_size', '_write_chunk_size', '_flush_deadline', '_hub', '_capture', '_decode_stream',
+                 '_serial', '_listener', '_writer', '_writer_lock', '_data_event')
 
     class Signals(Enum):
         """
         These are the used by serial listener objects.
 
-        :seealso:  :py:func:`pydispatch.dispatcher`
+        :seealso:  :py:data:`cnxman.events.dispatcher`
         """
         DATA_RECEIVED = 'data-received'  # We received some data! Hooray!
+        FRAME_RECEIVED = 'frame-received'  # We received a whole frame!
+        DECODED = 'decoded'  # A payload has been decoded in parallel.
+        DECODE_ERROR = 'decode-error'  # A batch of payloads couldn't be decoded.
 
     def __init__(self,
                  port: str,
                  baudrate: int=9600,
-                 bytesize: int = pyserial.EIGHTBITS,
-                 parity: str=pyserial.PARITY_NONE,
-                 stopbits: int=pyserial.STOPBITS_ONE,
-                 timeout=None):
+                 bytesize: int = 8,
+                 parity: str = 'N',
+                 stopbits: int = 1,
+                 timeout=None,
+                 chunk_size: int = 4096,
+                 max_latency: float = 0.0,
+                 frame_decoder: FrameDecoder = None,
+                 buffer_size: int = 0,
+                 overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK,
+                 write_queue_size: int = 65536,
+                 write_chunk_size: int = 4096,
+                 flush_deadline: float = 0.0,
+                 hub=None,
+                 parallel_decoder: ParallelDecoder = None,
+                 capture: CaptureWriter = None):
+        """
+
+        :param port: the serial port (e.g. ``/dev/ttyUSB0``) or a `pyserial URL
+            <https://pythonhosted.org/pyserial/url_handlers.html>`_ (e.g. ``loop://``)
+        :type port:  ``str``
+        :param baudrate: the baud rate
+        :type baudrate:  ``int``
+        :param bytesize: the number of data bits (e.g. ``serial.EIGHTBITS``)
+        :type bytesize:  ``int``
+        :param parity: the parity checking setting (e.g. ``serial.PARITY_NONE``)
+        :type parity:  ``str``
+        :param stopbits: the number of stop bits (e.g. ``serial.STOPBITS_ONE``)
+        :type stopbits:  ``int``
+        :param timeout: the read timeout (in seconds)
+        :type timeout:  ``float``
+        :param chunk_size: the maximum number of bytes the listener delivers in a single data signal
+        :type chunk_size:  ``int``
+        :param max_latency: the longest time (in seconds) the listener holds received bytes while it waits to fill a
+            chunk
+        :type max_latency:  ``float``
+        :param frame_decoder: the decoder that turns received data into frames (if you want frames)
+        :type frame_decoder:  :py:class:`cnxman.framing.FrameDecoder`
+        :param buffer_size: the size (in bytes) of the buffer through which the listener hands data to a separate
+            dispatch thread (``0`` means data is dispatched on the listener's own thread)
+        :type buffer_size:  ``int``
+        :param overflow_policy: what the listener does when the buffer is full
+        :type overflow_policy:  :py:class:`cnxman.buffers.OverflowPolicy`
+        :param write_queue_size: the most bytes the writer holds waiting to be written
+        :type write_queue_size:  ``int``
+        :param write_chunk_size: the number of bytes the writer tries to gather into a single write
+        :type write_chunk_size:  ``int``
+        :param flush_deadline: the longest time (in seconds) a message waits for others to join it before it's written
+        :type flush_deadline:  ``float``
+        :param hub: the hub that reads the port (if you don't want the connection to have a listener thread of its
+            own), in which case the ``timeout``, ``max_latency`` and ``buffer_size`` don't apply
+        :type hub:  :py:class:`cnxman.hub.SerialHub`
+        :param parallel_decoder: the decoder that decodes each frame (or, if there's no frame decoder, each chunk of
+            data) in a pool of processes
+        :type parallel_decoder:  :py:class:`cnxman.parallel.ParallelDecoder`
+        :param capture: a capture file to which everything read from the port is written (so that it can be replayed
+            later)
+        :type capture:  :py:class:`cnxman.capture.CaptureWriter`
+
+        :seealso:  :py:class:`SerialListener`
+        :seealso:  :py:class:`SerialWriter`
+        :seealso:  :py:class:`cnxman.framing.FrameDecoder`
+        """
         super().__init__()
         # Make copies of the port parameters so that we may construct serial ports.
         self._port = port  # To what port are we connecting?
@@ -117,7 +694,24 @@ class SerialConnection(Connection):
         self._parity = parity  # What's the parity on the port?
         self._stopbits = stopbits  # How many stop bits?
         self._timeout = timeout  # What's the timeout interval.
+        self._chunk_size = chunk_size  # How many bytes may the listener deliver at once?
+        self._max_latency = max_latency  # How long may the listener wait to fill a chunk?
+        self._frame_decoder = frame_decoder  # the decoder that turns received data into frames
+        self._buffer_size = buffer_size  # How big is the buffer between the listener and the dispatch thread?
+        self._overflow_policy = overflow_policy  # What happens when that buffer fills up?
+        self._write_queue_size = write_queue_size  # How many bytes may wait to be written?
+        self._write_chunk_size = write_chunk_size  # How many bytes would we like to write at once?
+        self._flush_deadline = flush_deadline  # How long may a message wait for company?
+        self._hub = hub  # the hub that reads the port (if we're not reading it ourselves)
+        self._capture = capture  # the capture file to which we write what we read (if there is one)
+        # If we're decoding in parallel, this is the stream that keeps the results in order.
+        self._decode_stream: DecodeStream = (parallel_decoder.stream(self._handle_decoded, self._handle_decode_error)
+                                             if parallel_decoder is not None else None)
+        self._serial: 'pyserial.Serial' = None  # the port (if we're connected)
         self._listener: SerialListener = None  # the background thread serial monitor
+        self._writer: SerialWriter = None  # the background thread that writes to the port (once we've sent something)
+        self._writer_lock = threading.Lock()  # makes sure we only start one writer
+        self._data_event: Event = None  # the event we send each time data arrives (once we've connected)
 
     def try_connect(self) -> bool:
         """
@@ -127,22 +721,47 @@ class SerialConnection(Connection):
         :rtype:  ``bool``
         """
         # If we're already listening and everything is all right...
-        if self._listener is not None and self._listener.serial.is_open:
+        if self._serial is not None and self._serial.is_open:
             # ...there's nothing more to do here.
             return True
+        import serial as pyserial
         try:
-            serial = Serial(port=self._port,
-                            baudrate=self._baudrate,
-                            bytesize=self._bytesize,
-                            parity=self._parity,
-                            stopbits=self._stopbits,
-                            timeout=self._timeout)
+            # The port may be a device name or any URL pyserial understands (like 'loop://').  (The hub never waits
+            # for a read.)
+            serial = pyserial.serial_for_url(self._port,
+                                             baudrate=self._baudrate,
+                                             bytesize=self._bytesize,
+                                             parity=self._parity,
+                                             stopbits=self._stopbits,
+                                             timeout=self._timeout if self._hub is None else 0)
             # If the serial connection didn't open automatically...
             if not serial.is_open:
                 # ...open it now.
                 serial.open()
+            # Any partial frame left over from a previous connection is no good to us now.
+            if self._frame_decoder is not None:
+                self._frame_decoder.reset()
+            if self._data_event is None:
+                self._data_event = Event(signal=SerialConnection.Signals.DATA_RECEIVED, sender=self)
+            self._serial = serial
+            # If there's a hub, it'll read the port for us (and send its signals on the port's behalf).
+            if self._hub is not None:
+                dispatcher.connect(self._handle_listener_data_received,
+                                   signal=SerialListener.Signals.DATA_RECEIVED,
+                                   sender=serial)
+                dispatcher.connect(self._handle_listener_read_error,
+                                   signal=SerialListener.Signals.READ_ERROR,
+                                   sender=serial)
+                self._hub.register(serial)
+                return True
             # So far so good.  Set up a background thread.
-            self._listener = SerialListener(serial=serial)
+            self._listener = SerialListener(serial=serial,
+                                            chunk_size=self._chunk_size,
+                                            max_latency=self._max_latency,
+                                            buffer=(RingBuffer(capacity=self._buffer_size,
+                                                               policy=self._overflow_policy)
+                                                    if self._buffer_size > 0 else None),
+                                            capture=self._capture)
             # We want to be notified if the connection sends data.
             dispatcher.connect(self._handle_listener_data_received,
                                signal=SerialListener.Signals.DATA_RECEIVED,
@@ -151,11 +770,11 @@ class SerialConnection(Connection):
             dispatcher.connect(self._handle_listener_read_error,
                                signal=SerialListener.Signals.READ_ERROR,
                                sender=self._listener)
-            self._listener.run()
+            self._listener.start()
             # If we got this far, the connection succeeded.
             return True
-        except SerialException as sex:
-            print("boom boom", sex)  # TODO: Proper logging!
+        except pyserial.SerialException as ex:
+            self.logger.warning('Could not connect to %s: %s', self._port, ex)
             return False
 
     def disconnect(self):
@@ -164,10 +783,33 @@ class SerialConnection(Connection):
         """
         if self._listener is not None:
             # Disconnect from any further signals sent by the listener.
-            dispatcher.disconnect(dispatcher.Any, self._listener)
+            dispatcher.disconnect_sender(self._listener)
             # Stop the listener.
-            self._listener.stop()
+            self._listener.terminate()
             self._listener = None
+        if self._writer is not None:
+            dispatcher.disconnect_sender(self._writer)
+            self._writer.terminate()
+            self._writer = None
+        if self._serial is not None:
+            if self._hub is not None:
+                self._release_hub_port()
+            self._serial = None
+
+    def _release_hub_port(self):
+        """
+        Take our port back from the hub, and close it.
+        """
+        serial, self._serial = self._serial, None
+        if serial is None:
+            return
+        # Once the hub lets go of the port, it's ours to close.
+        self._hub.unregister(serial)
+        dispatcher.disconnect_sender(serial)
+        try:
+            serial.close()
+        except Exception:
+            self.logger.warning('Could not close %s.', self._port, exc_info=True)
 
     def teardown(self):
         """
@@ -175,13 +817,209 @@ class SerialConnection(Connection):
         """
         self.disconnect()
 
-    def _handle_listener_data_received(self, data):
-        print("The SerialConnection heard: ", data)
+    def shutdown(self, timeout: float = None) -> bool:
+        """
+        Release the serial port gracefully:  we write what has been sent, send along what has been read, and then let
+        go of the port.
+
+        :param timeout: the longest time (in seconds) we'll take (``None`` means as long as it takes)
+        :type timeout:  ``float``
+        :return: ``True`` if nothing was lost, or ``False`` if we ran out of time
+        :rtype:  ``bool``
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        finished = True
+        writer = self._writer
+        if writer is not None:
+            finished = writer.stop(timeout=max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+        listener = self._listener
+        if listener is not None:
+            # (We're still listening to the listener, so what it drains reaches our subscribers.)
+            finished = listener.stop(
+                timeout=max(0.0, deadline - time.monotonic()) if deadline is not None else None) and finished
+        # Whatever's left for the parallel decoder needn't wait for its batch to fill up.
+        if self._decode_stream is not None:
+            self._decode_stream.flush()
+        self.teardown()
+        return finished
+
+    @property
+    def name(self) -> str:
+        """
+        This is the serial port (or URL) to which we connect.
+
+        :rtype: ``str``
+        """
+        return self._port
+
+    def send(self, data, timeout: float = None) -> bool:
+        """
+        Queue data to be written to the port.
+
+        :param data: the data (``bytes``, ``bytearray``, ``memoryview`` or anything else that supports the buffer
+            protocol), which isn't copied, so don't change it until it has been written
+        :param timeout: how long (in seconds) we'll wait for room in the write queue (``None`` means we'll wait as
+            long as it takes and ``0`` means we won't wait at all)
+        :type timeout:  ``float``
+        :return: ``True`` if the data was queued, or ``False`` if the write queue is full
+        :rtype:  ``bool``
+        :raises ConnectionException: if we're not connected
+        """
+        return self._require_writer().send(data, timeout=timeout)
+
+    def send_many(self, messages, timeout: float = None) -> int:
+        """
+        Queue several messages to be written to the port.
+
+        :param messages: the messages (each of which may be anything :py:func:`SerialConnection.send` accepts)
+        :param timeout: how long (in seconds) we'll wait, in all, for room in the write queue
+        :type timeout:  ``float``
+        :return: the number of messages that were queued (which are always the first ones)
+        :rtype:  ``int``
+        :raises ConnectionException: if we're not connected
+        """
+        return self._require_writer().send_many(messages, timeout=timeout)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until everything that has been sent is written to the port.
+
+        :param timeout: how long (in seconds) we'll wait (``None`` means we'll wait as long as it takes)
+        :type timeout:  ``float``
+        :return: ``True`` if everything was written in time
+        :rtype:  ``bool``
+        :raises ConnectionException: if we're not connected
+        """
+        return self._require_writer().flush(timeout=timeout)
+
+    def share(self, name: str = None, capacity: int = 1 << 20) -> 'SharedRingPublisher':
+        """
+        Publish the data the connection receives to other processes, through a ring buffer in shared memory.
+
+        :param name: the name by which the other processes find the ring (the default is a name made up by the
+            operating system)
+        :type name:  ``str``
+        :param capacity: the size (in bytes) of the ring
+        :type capacity:  ``int``
+        :return: the publisher (whose ``name`` the other processes give a :py:class:`cnxman.sharing.SharedRingReader`,
+            and which you should close when you're finished with it)
+        :rtype:  :py:class:`cnxman.sharing.SharedRingPublisher`
+        :raises RuntimeError: if this Python can't share memory
+        """
+        from .sharing import SharedRingPublisher
+        return SharedRingPublisher(self, name=name, capacity=capacity)
+
+    def _require_writer(self) -> SerialWriter:
+        """
+        Get the writer (which we start the first time somebody sends something).
+
+        :raises ConnectionException: if we're not connected
+        """
+        writer = self._writer
+        if writer is not None:
+            return writer
+        with self._writer_lock:
+            serial = self._serial
+            if serial is None:
+                raise ConnectionException(message='Cannot send while disconnected.', inner=None)
+            if self._writer is None:
+                writer = SerialWriter(serial=serial,
+                                      queue_size=self._write_queue_size,
+                                      chunk_size=self._write_chunk_size,
+                                      flush_deadline=self._flush_deadline)
+                dispatcher.connect(self._handle_writer_write_error,
+                                   signal=SerialWriter.Signals.WRITE_ERROR,
+                                   sender=writer)
+                writer.start()
+                self._writer = writer
+            return self._writer
+
+    @property
+    def frame_decoder(self) -> FrameDecoder or None:
+        """
+        This is the decoder that turns received data into frames (if there is one).
+
+        :rtype: :py:class:`cnxman.framing.FrameDecoder`
+        """
+        return self._frame_decoder
+
+    @property
+    def writer(self) -> SerialWriter or None:
+        """
+        This is the current writer (if we've sent anything since we connected), which knows how many bytes are waiting
+        to be written.
+
+        :rtype: :py:class:`SerialWriter`
+        """
+        return self._writer
+
+    @property
+    def serial(self) -> 'pyserial.Serial or None':
+        """
+        This is the serial port we're listening to (if we're connected).
+
+        :rtype: :py:class:`pyserial.Serial`
+        """
+        return self._serial
+
+    @property
+    def buffer(self) -> RingBuffer or None:
+        """
+        This is the current listener's buffer (if there is one), which keeps count of dropped bytes and its high-water
+        mark.
+
+        :rtype: :py:class:`cnxman.buffers.RingBuffer`
+        """
+        return self._listener.buffer if self._listener is not None else None
+
+    def _handle_listener_data_received(self, event: Event):
+        data = event.data
+        self.logger.debug('%s sent %d bytes.', self._port, len(data))
+        # (Our listener captures what it reads itself, but the hub doesn't.)
+        if self._hub is not None and self._capture is not None:
+            self._capture.write(data, timestamp=event.timestamp)
+        # Pass the data along to anybody listening to this connection.
+        own = self._data_event
+        own.data, own.timestamp = data, event.timestamp
+        dispatcher.send_event(own)
+        own.data = None
+        # If we're framing the data, let everybody know about each frame that's now complete.
+        if self._frame_decoder is not None:
+            frames = self._frame_decoder.feed(data)
+            if frames and registry.enabled:
+                registry.counter('cnxman_frames_received_total', 'frames decoded by serial connections',
+                                 connection=self._port).inc(len(frames))
+            for frame in frames:
+                dispatcher.send(signal=SerialConnection.Signals.FRAME_RECEIVED, sender=self, frame=frame)
+            # If somebody's decoding the frames in parallel, they go along together.
+            if self._decode_stream is not None:
+                self._decode_stream.submit(frames)
+        elif self._decode_stream is not None:
+            self._decode_stream.submit([data])
+
+    def _handle_decoded(self, decoded):
+        dispatcher.send(signal=SerialConnection.Signals.DECODED, sender=self, decoded=decoded)
+
+    def _handle_decode_error(self, error: BaseException):
+        dispatcher.send(signal=SerialConnection.Signals.DECODE_ERROR, sender=self, error=error)
 
     def _handle_listener_read_error(self):
+        # A listener closes its port when it stops, but the hub leaves the port to us.  We let go of it now so that
+        # the next attempt to connect really does open it again.
+        if self._hub is not None:
+            self._release_hub_port()
         # Raise the alarm!
         self.raise_alarm()
 
+    def _handle_writer_write_error(self):
+        # Raise the alarm!
+        self.raise_alarm()
 
 
-
+def __getattr__(name: str):
+    # AsyncSerialConnection lives with the rest of the asyncio code now, and asyncio is slow to import, so we only import
+    # it for those who ask.
+    if name == 'AsyncSerialConnection':
+        from .aio import AsyncSerialConnection
+        return AsyncSerialConnection
+    raise AttributeError('module {module!r} has no attribute {name!r}'.format(module=__name__, name=name))
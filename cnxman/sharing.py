@@ -0,0 +1,456 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.sharing
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Sharing is caring.
+
+A :py:class:`SharedRingPublisher` writes the chunks a connection receives into a ring buffer in shared memory, and any
+number of :py:class:`SharedRingReader` objects, in any number of processes, attach to it by name and read them straight
+out of the shared memory, without anything being pickled, piped or copied on the way.
+
+.. code-block:: python
+
+    # In the process that owns the port...
+    publisher = connection.share(name='gps', capacity=1 << 20)
+
+    # ...and in each of the workers.
+    with SharedRingReader('gps') as reader:
+        for chunk in reader:
+            ...
+
+There's one writer and it never waits for the readers, so a reader that falls more than the ring's capacity behind
+finds that what it hadn't read yet has been overwritten.  It notices (that's what the sequence numbers are for), counts
+what it lost, and picks up from the newest chunk.
+
+The ring starts with a header (which says where the writer is) followed by the records, each of which is a sequence
+number and a length followed by the chunk itself.  A record never wraps around the end of the ring (the writer starts
+over at the beginning instead) so that every chunk can be handed out as a single :py:class:`memoryview`.  Before the
+writer overwrites anything, it says how far it's about to go (like :py:class:`cnxman.buffers.RingBuffer`), so a reader
+can tell afterwards whether the chunk it was looking at was overwritten while it looked.
+"""
+
+import struct
+import time
+from .events import dispatcher
+from .logging import loggable_class as loggable
+from .parallel import _get_shared_memory
+# typing is slow to import, and only the annotations need it.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+    from .basics import Connection
+
+_MAGIC = b'CNXR'
+_VERSION = 1
+_HEADER = struct.Struct('<4sIQ')  # the magic number, the version and the capacity
+_POSITIONS = struct.Struct('<QQQ')  # how far the writer is about to go, how far it has gone and the next sequence number
+_POSITIONS_OFFSET = _HEADER.size
+_CLOSED_OFFSET = _POSITIONS_OFFSET + _POSITIONS.size  # (a byte that's set when the writer has finished)
+_DATA_OFFSET = 64  # where the records start
+_RECORD = struct.Struct('<QI4x')  # the sequence number and length of a chunk
+_WRAP = 0xFFFFFFFF  # the length that means "the rest of the ring is empty; start over at the beginning"
+_written_here = set()  # the names of the rings written by this process
+
+
+def _aligned(size: int) -> int:
+    """
+    Round a size up to a multiple of 8 (so that every record header is aligned).
+    """
+    return (size + 7) & ~7
+
+
+def _shared_memory():
+    """
+    Get the :py:mod:`multiprocessing.shared_memory` module.
+
+    :raises RuntimeError: if this Python doesn't have it
+    """
+    shared_memory = _get_shared_memory()
+    if shared_memory is None:
+        raise RuntimeError('Sharing memory between processes requires Python 3.8 or later.')
+    return shared_memory
+
+
+class SharedRingWriter(object):
+    """
+    This is the writing end of a ring buffer in shared memory.  (There may only be one.)
+    """
+    def __init__(self, name: str = None, capacity: int = 1 << 20):
+        """
+
+        :param name: the name of the shared memory block (the default is a name made up by the operating system)
+        :type name:  ``str``
+        :param capacity: the size (in bytes) of the ring (a chunk bigger than half of it is written in pieces, so that
+            a reader that keeps up can always get each piece before the next one overwrites it)
+        :type capacity:  ``int``
+        """
+        if capacity < 64:
+            raise ValueError('The capacity must be at least 64 bytes.')
+        capacity = _aligned(capacity)
+        self._block: 'SharedMemory' = _shared_memory().SharedMemory(name=name, create=True,
+                                                                    size=_DATA_OFFSET + capacity)
+        self._buf = self._block.buf
+        self._capacity = capacity
+        self._max_chunk = capacity // 2 - _RECORD.size  # the biggest piece of a chunk we write in a single record
+        self._position = 0  # the total number of bytes we've ever written (including records' headers and padding)
+        self._sequence = 0  # the sequence number of the next record
+        _HEADER.pack_into(self._buf, 0, _MAGIC, _VERSION, capacity)
+        _POSITIONS.pack_into(self._buf, _POSITIONS_OFFSET, 0, 0, 0)
+        self._buf[_CLOSED_OFFSET] = 0
+        _written_here.add(self._block._name)
+
+    @property
+    def name(self) -> str:
+        """
+        This is the name by which readers find the shared memory block.
+
+        :rtype: ``str``
+        """
+        return self._block.name
+
+    @property
+    def capacity(self) -> int:
+        """
+        This is the size (in bytes) of the ring.
+
+        :rtype: ``int``
+        """
+        return self._capacity
+
+    @property
+    def sequence(self) -> int:
+        """
+        This is the number of chunks (or pieces of chunks) written so far.
+
+        :rtype: ``int``
+        """
+        return self._sequence
+
+    def write(self, data):
+        """
+        Write a chunk to the ring.  (A chunk that's too big to fit in one record is written in pieces.)
+
+        :param data: the data (``bytes``, ``bytearray``, ``memoryview`` or anything else that supports the buffer
+            protocol)
+        """
+        with memoryview(data) as view:
+            view = view.cast('B')
+            size = len(view)
+            for start in range(0, size, self._max_chunk):
+                self._write_record(view[start:start + self._max_chunk])
+
+    def _write_record(self, view: memoryview):
+        """
+        Write a single record.
+        """
+        buf, capacity = self._buf, self._capacity
+        size = len(view)
+        needed = _aligned(_RECORD.size + size)
+        start = self._position
+        offset = start % capacity
+        # A record doesn't wrap around the end of the ring:  if it won't fit before the end, we start over at the
+        # beginning (and leave a marker, if there's room for one, to say so).
+        skip = capacity - offset if capacity - offset < needed else 0
+        end = start + skip + needed
+        # Say how far we're about to go before we go there, so that readers know what we're about to overwrite.
+        _POSITIONS.pack_into(buf, _POSITIONS_OFFSET, end, start, self._sequence)
+        if skip:
+            if skip >= _RECORD.size:
+                _RECORD.pack_into(buf, _DATA_OFFSET + offset, self._sequence, _WRAP)
+            offset = 0
+        payload = _DATA_OFFSET + offset + _RECORD.size
+        buf[payload:payload + size] = view
+        _RECORD.pack_into(buf, _DATA_OFFSET + offset, self._sequence, size)
+        self._position = end
+        self._sequence += 1
+        _POSITIONS.pack_into(buf, _POSITIONS_OFFSET, end, end, self._sequence)
+
+    def close(self):
+        """
+        Tell the readers there's nothing more to come, and remove the shared memory block.  (Readers that are still
+        attached can still read what's there.)
+        """
+        if self._buf is None:
+            return
+        self._buf[_CLOSED_OFFSET] = 1
+        self._buf.release()
+        self._buf = None
+        self._block.close()
+        _written_here.discard(self._block._name)
+        try:
+            self._block.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@loggable()
+class SharedRingReader(object):
+    """
+    This is a reading end of a ring buffer in shared memory.  (There may be as many as you like, in as many processes
+    as you like.)  The chunks it reads are views of the shared memory itself, so take what you need from each one
+    before you read the next (which may overwrite it), and check :py:func:`SharedRingReader.intact` if you need to be
+    sure the writer didn't overwrite it while you were looking.
+    """
+    poll_interval: float = 0.001  #: how long (in seconds) we wait between checks for new chunks
+
+    def __init__(self, name: str, from_start: bool = False):
+        """
+
+        :param name: the name of the shared memory block
+        :type name:  ``str``
+        :param from_start: Should we start with the first chunk ever written, if the writer hasn't overwritten it yet
+            (rather than the next chunk to be written)?
+        :type from_start:  ``bool``
+        :raises ValueError: if the block isn't a ring
+        """
+        shared_memory = _shared_memory()
+        try:
+            self._block: 'SharedMemory' = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Pythons before 3.13 insist on tracking the block (and unlinking it when we exit), so we tell the tracker
+            # to forget it again.  (Unless it's ours to unlink, because we're writing it too.)
+            self._block = shared_memory.SharedMemory(name=name)
+            if self._block._name not in _written_here:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self._block._name, 'shared_memory')
+        self._buf = self._block.buf
+        self._chunk: memoryview = None  # the last chunk we handed out
+        magic, version, capacity = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError('{name} is not a cnxman ring.'.format(name=name))
+        self._capacity = capacity
+        self._chunk_start = 0  # where the last chunk's record starts
+        self._lost = 0  # the number of chunks we lost because the writer overwrote them
+        self._overruns = 0  # the number of times we fell so far behind that the writer overwrote what we hadn't read
+        _, position, sequence = _POSITIONS.unpack_from(self._buf, _POSITIONS_OFFSET)
+        self._position = position  # where the next record we read starts
+        self._sequence = sequence  # the sequence number of the next record we read
+        # The writer only overwrites once it has gone all the way round the ring, so until then everything it has
+        # written is still there.
+        if from_start and _POSITIONS.unpack_from(self._buf, _POSITIONS_OFFSET)[0] <= capacity:
+            self._position, self._sequence = 0, 0
+
+    @property
+    def name(self) -> str:
+        """
+        This is the name of the shared memory block.
+
+        :rtype: ``str``
+        """
+        return self._block.name
+
+    @property
+    def lost(self) -> int:
+        """
+        This is the number of chunks we lost because we fell too far behind.
+
+        :rtype: ``int``
+        """
+        return self._lost
+
+    @property
+    def overruns(self) -> int:
+        """
+        This is the number of times we fell so far behind that the writer overwrote chunks we hadn't read.
+
+        :rtype: ``int``
+        """
+        return self._overruns
+
+    @property
+    def closed(self) -> bool:
+        """
+        Has the writer finished (and have we read everything it wrote)?
+
+        :rtype: ``bool``
+        """
+        return self._buf is None or (self._buf[_CLOSED_OFFSET] == 1 and self._position >= self._written())
+
+    def _written(self) -> int:
+        return _POSITIONS.unpack_from(self._buf, _POSITIONS_OFFSET)[1]
+
+    def _overwritten(self, start: int) -> bool:
+        """
+        Has the writer overwritten (or is it about to overwrite) the record that starts at a given position?
+        """
+        reserved = _POSITIONS.unpack_from(self._buf, _POSITIONS_OFFSET)[0]
+        return start < reserved - self._capacity
+
+    def _overrun(self):
+        """
+        We've fallen too far behind, so we count what we've lost and pick up from where the writer is now.
+        """
+        _, position, sequence = _POSITIONS.unpack_from(self._buf, _POSITIONS_OFFSET)
+        self._overruns += 1
+        self._lost += max(0, sequence - self._sequence)
+        self._position, self._sequence = position, sequence
+        self.logger.warning('%s fell behind and lost %d chunks.', self._block.name, self._lost)
+
+    def read(self, timeout: float = None) -> memoryview or None:
+        """
+        Read the next chunk, waiting for one if there isn't one yet.
+
+        :param timeout: how long (in seconds) we'll wait (``None`` means as long as it takes)
+        :type timeout:  ``float``
+        :return: a view of the chunk in the shared memory (which the writer may overwrite once it's a ring's length
+            ahead), or ``None`` if we ran out of time or the writer has finished and there's nothing left
+        :rtype:  :py:class:`memoryview`
+        """
+        self._release()
+        buf, capacity = self._buf, self._capacity
+        if buf is None:
+            return None
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            start = self._position
+            if start >= self._written():
+                if buf[_CLOSED_OFFSET] == 1:
+                    return None
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+                time.sleep(self.poll_interval)
+                continue
+            if self._overwritten(start):
+                self._overrun()
+                continue
+            offset = start % capacity
+            # If there's no room for a record before the end of the ring, the writer started over at the beginning.
+            if capacity - offset < _RECORD.size:
+                self._position += capacity - offset
+                continue
+            sequence, size = _RECORD.unpack_from(buf, _DATA_OFFSET + offset)
+            if size == _WRAP:
+                self._position += capacity - offset
+                continue
+            # If the record isn't the one we expected (or the writer got to it while we were reading its header), it
+            # isn't what we're after.
+            if sequence != self._sequence or size > capacity or self._overwritten(start):
+                self._overrun()
+                continue
+            payload = _DATA_OFFSET + offset + _RECORD.size
+            self._chunk = buf[payload:payload + size]
+            self._chunk_start = start
+            self._position = start + _aligned(_RECORD.size + size)
+            self._sequence = sequence + 1
+            return self._chunk
+
+    def intact(self) -> bool:
+        """
+        Is the chunk we read last still intact?  (That is, has the writer not started to overwrite it?)
+
+        :rtype: ``bool``
+        """
+        return self._chunk is not None and not self._overwritten(self._chunk_start)
+
+    def _release(self):
+        """
+        Let go of the last chunk we handed out.
+        """
+        if self._chunk is not None:
+            try:
+                self._chunk.release()
+            except BufferError:
+                pass  # (Somebody's still looking at it.  That's their lookout.)
+            self._chunk = None
+
+    def close(self):
+        """
+        Detach from the shared memory block.  (Views of chunks you're still holding stop the block from being unmapped
+        until they're gone.)
+        """
+        if self._buf is None:
+            return
+        self._release()
+        self._buf.release()
+        self._buf = None
+        try:
+            self._block.close()
+        except BufferError:
+            self.logger.warning('Chunks of %s are still being used.', self._block.name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> memoryview:
+        chunk = self.read()
+        if chunk is None:
+            raise StopIteration
+        return chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SharedRingPublisher(object):
+    """
+    This object writes the chunks a connection receives into a ring buffer in shared memory, from which other
+    processes can read them with a :py:class:`SharedRingReader`.
+    """
+    def __init__(self, connection: 'Connection', name: str = None, capacity: int = 1 << 20, signal=None):
+        """
+
+        :param connection: the connection
+        :type connection:  :py:class:`cnxman.basics.Connection`
+        :param name: the name of the shared memory block (the default is a name made up by the operating system)
+        :type name:  ``str``
+        :param capacity: the size (in bytes) of the ring
+        :type capacity:  ``int``
+        :param signal: the signal whose ``data`` we publish (the default is the ``DATA_RECEIVED`` member of the
+            connection's ``Signals``)
+        :raises ValueError: if the connection doesn't send data
+        """
+        if signal is None:
+            signal = getattr(getattr(connection, 'Signals', None), 'DATA_RECEIVED', None)
+            if signal is None:
+                raise ValueError('{name} does not send any data.'.format(name=connection.name))
+        self._connection = connection
+        self._signal = signal
+        self._writer = SharedRingWriter(name=name, capacity=capacity)
+        dispatcher.connect(self._handle_data, signal=signal, sender=connection)
+
+    @property
+    def name(self) -> str:
+        """
+        This is the name by which readers find the ring.
+
+        :rtype: ``str``
+        """
+        return self._writer.name
+
+    @property
+    def writer(self) -> SharedRingWriter:
+        """
+        This is the ring's writer.
+
+        :rtype: :py:class:`SharedRingWriter`
+        """
+        return self._writer
+
+    def _handle_data(self, data):
+        self._writer.write(data)
+
+    def close(self):
+        """
+        Stop publishing, and remove the ring.
+        """
+        dispatcher.disconnect(self._handle_data, signal=self._signal, sender=self._connection)
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
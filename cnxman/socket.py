@@ -0,0 +1,447 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.socket
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Let's manage socket connections!
+
+A :py:class:`SocketConnection` is the TCP counterpart of a :py:class:`cnxman.serial.SerialConnection` (for a device
+behind a serial-to-IP gateway, say):  it connects, it hands what it receives to a listener thread of its own, and it
+raises the alarm when the other end goes away, so a connection manager can look after it the same way.
+
+.. code-block:: python
+
+    connection = SocketConnection('gateway.local', 4001, frame_decoder=DelimitedFrameDecoder())
+    dispatcher.connect(handle_frame, signal=SocketConnection.Signals.FRAME_RECEIVED, sender=connection)
+    manager = FastConnectionManager(connection)
+    manager.connect()
+
+The listener receives straight into a buffer it allocates once, and the data it sends along is a :py:class:`memoryview`
+of that buffer, so nothing is copied on the way to the subscribers.  The flip side is that the buffer is reused for the
+next read:  if you want to keep the data, copy it (with ``bytes(data)``) before your receiver returns.
+"""
+
+from enum import Enum
+import os
+import socket
+import threading
+import time
+from .basics import Connection, ConnectionException
+from .events import dispatcher, Event
+from .framing import FrameDecoder
+from .logging import loggable_class as loggable
+from .metrics import registry, SIZE_BUCKETS
+from .tracing import tracer
+
+try:
+    # This is the most buffers one call to sendmsg() may gather (and -1 means there's no limit).
+    _IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = -1
+if _IOV_MAX < 1:
+    _IOV_MAX = 1024  # (That's what POSIX systems usually allow.)
+
+
+@loggable()
+class SocketListener(threading.Thread):
+    """
+    This is a thread object that receives data from a socket.
+    """
+
+    class Signals(Enum):
+        """
+        These are the signals sent by socket listener objects.
+
+        :seealso:  :py:data:`cnxman.events.dispatcher`
+        """
+        DATA_RECEIVED = 'data-received'  # We received some data!  (It's a memoryview of our buffer.)
+        READ_ERROR = 'read-error'  # We couldn't receive from the socket (or the other end closed it).
+
+    def __init__(self, sock: socket.socket, name: str, buffer_size: int = 65536):
+        """
+
+        :param sock: the (connected) socket
+        :type sock:  :py:class:`socket.socket`
+        :param name: the name by which the other end is known (in our metrics and log messages)
+        :type name:  ``str``
+        :param buffer_size: the size of the buffer we receive into (which is the most data we send along at once)
+        :type buffer_size:  ``int``
+        """
+        super().__init__()
+        if buffer_size < 1:
+            raise ValueError('The buffer size must be at least 1.')
+        # Threads of this type run as daemons.
+        self.daemon = True
+        self._socket = sock  # the socket we're receiving from
+        self._name = name  # the name by which the other end is known
+        self._buffer = memoryview(bytearray(buffer_size))  # the buffer we receive into, over and over
+        self._terminate_event = threading.Event()  # a threading event to tell us when it's time to stop
+        self._stopping = False  # Are we receiving the last of the data before we stop?
+        # This is the event we fill in (and send) each time we receive something.
+        self._data_event = Event(signal=SocketListener.Signals.DATA_RECEIVED, sender=self)
+
+    @property
+    def socket(self) -> socket.socket:
+        """
+        This is the socket we're receiving from.
+
+        :rtype: :py:class:`socket.socket`
+        """
+        return self._socket
+
+    @property
+    def buffer_size(self) -> int:
+        """
+        This is the size of the buffer we receive into.
+
+        :rtype: ``int``
+        """
+        return len(self._buffer)
+
+    def stop(self, timeout: float = None) -> bool:
+        """
+        Stop the listener gracefully:  we stop receiving, send along whatever has already arrived, and then close the
+        socket.
+
+        :param timeout: the longest time (in seconds) we'll take (``None`` means as long as it takes)
+        :type timeout:  ``float``
+        :return: ``True`` if everything was sent along in time, or ``False`` if we had to cut it short
+        :rtype:  ``bool``
+
+        :seealso:  :py:func:`SocketListener.terminate`
+        """
+        self._stopping = True
+        # Once the socket is shut down for reading, the data that has already arrived is all there is (and the receive
+        # that comes after it says so).
+        try:
+            self._socket.shutdown(socket.SHUT_RD)
+        except OSError:
+            pass
+        stopped = True
+        if self is not threading.current_thread() and self.ident is not None:
+            self.join(timeout)
+            stopped = not self.is_alive()
+        self.terminate()
+        return stopped
+
+    def terminate(self):
+        """
+        Terminate the listener.  (Anything we haven't received yet is lost.)
+
+        :seealso:  :py:func:`SocketListener.stop`
+        """
+        # Set the termination event first, so that when shutting the socket down interrupts a read, we know why.
+        self._terminate_event.set()
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # (It wasn't connected anymore, which is fine by us.)
+        self._socket.close()
+
+    def run(self):
+        """
+        Receive data until we're terminated (or the other end goes away).
+        """
+        buffer = self._buffer
+        event = self._data_event
+        recv_into = self._socket.recv_into
+        reads = registry.counter('cnxman_socket_reads_total', 'reads made by socket listeners', address=self._name)
+        bytes_read = registry.counter('cnxman_socket_bytes_read_total', 'bytes read by socket listeners',
+                                      address=self._name)
+        chunk_sizes = registry.histogram('cnxman_socket_chunk_bytes', 'the sizes of the chunks socket listeners read',
+                                         buckets=SIZE_BUCKETS, address=self._name)
+        while not self._terminate_event.is_set():
+            try:
+                received = recv_into(buffer)
+                # Receiving nothing means the other end has closed the connection.
+                if not received:
+                    raise EOFError('{name} closed the connection.'.format(name=self._name))
+            except Exception:
+                if self._terminate_event.is_set() or self._stopping:
+                    self.logger.debug('Stopped receiving from %s.', self._name)
+                    return
+                self.logger.warning('Could not receive from %s.', self._name, exc_info=True)
+                if registry.enabled:
+                    registry.counter('cnxman_socket_read_errors_total', 'errors socket listeners ran into',
+                                     address=self._name).inc()
+                self._terminate_event.set()
+                # Let any interested parties know.
+                dispatcher.send(signal=SocketListener.Signals.READ_ERROR, sender=self)
+                return
+            if registry.enabled:
+                reads.inc()
+                bytes_read.inc(received)
+                chunk_sizes.observe(received)
+            trace = tracer.begin(self._name, received) if tracer.enabled else None
+            event.data, event.timestamp = buffer[:received], time.monotonic_ns()
+            if trace is not None:
+                trace.dispatch = time.perf_counter_ns()
+            try:
+                dispatcher.send_event(event)
+            except Exception:
+                # A subscriber's troubles are no reason to stop receiving.
+                self.logger.error('A subscriber to %s failed.', self._name, exc_info=True)
+            if trace is not None:
+                tracer.finish(trace)
+            # Let go of the slice so nobody can hang on to a view of a buffer we're about to overwrite.
+            try:
+                event.data.release()
+            except BufferError:
+                pass  # (Somebody's still looking at it.  That's their lookout.)
+            event.data = None
+
+
+@loggable()
+class SocketConnection(Connection):
+    """
+    This is a connection to a TCP socket.
+    """
+    __slots__ = ('_host', '_port', '_timeout', '_buffer_size', '_nodelay', '_keepalive', '_keepalive_idle',
+                 '_keepalive_interval', '_keepalive_count', '_frame_decoder', '_socket', '_listener', '_send_lock',
+                 '_data_event')
+
+    class Signals(Enum):
+        """
+        These are the signals sent by socket connection objects.
+
+        :seealso:  :py:data:`cnxman.events.dispatcher`
+        """
+        DATA_RECEIVED = 'data-received'  # We received some data!  (It's a memoryview, so copy what you keep.)
+        FRAME_RECEIVED = 'frame-received'  # We received a whole frame!
+
+    def __init__(self,
+                 host: str,
+                 port: int,
+                 timeout: float = 10.0,
+                 buffer_size: int = 65536,
+                 nodelay: bool = True,
+                 keepalive: bool = False,
+                 keepalive_idle: int = None,
+                 keepalive_interval: int = None,
+                 keepalive_count: int = None,
+                 frame_decoder: FrameDecoder = None):
+        """
+
+        :param host: the host (a name or an address)
+        :type host:  ``str``
+        :param port: the TCP port
+        :type port:  ``int``
+        :param timeout: how long (in seconds) we wait for a connection to be established
+        :type timeout:  ``float``
+        :param buffer_size: the size of the buffer the listener receives into
+        :type buffer_size:  ``int``
+        :param nodelay: Should small writes be sent at once?  (This turns off Nagle's algorithm, which is what you want
+            for commands and replies.)
+        :type nodelay:  ``bool``
+        :param keepalive: Should the operating system probe the connection when it's idle?
+        :type keepalive:  ``bool``
+        :param keepalive_idle: how long (in seconds) the connection may be idle before the first probe
+        :type keepalive_idle:  ``int``
+        :param keepalive_interval: how long (in seconds) between probes
+        :type keepalive_interval:  ``int``
+        :param keepalive_count: the number of unanswered probes after which the connection is dropped
+        :type keepalive_count:  ``int``
+        :param frame_decoder: the decoder that turns received data into frames (if you want frames)
+        :type frame_decoder:  :py:class:`cnxman.framing.FrameDecoder`
+
+        .. note::
+            The keep-alive timings are only applied on platforms that support setting them for each socket.
+        """
+        super().__init__()
+        self._host = host  # To what host are we connecting?
+        self._port = port  # On what port?
+        self._timeout = timeout  # How long will we wait to connect?
+        self._buffer_size = buffer_size  # How big is the buffer the listener receives into?
+        self._nodelay = nodelay  # Do we send small writes right away?
+        self._keepalive = keepalive  # Does the operating system probe the connection?
+        self._keepalive_idle = keepalive_idle  # How long is the connection idle before it's probed?
+        self._keepalive_interval = keepalive_interval  # How long between probes?
+        self._keepalive_count = keepalive_count  # How many probes may go unanswered?
+        self._frame_decoder = frame_decoder  # the decoder that turns received data into frames
+        self._socket: socket.socket = None  # the socket (if we're connected)
+        self._listener: SocketListener = None  # the thread that receives from the socket
+        self._send_lock = threading.Lock()  # keeps one sender's data from being interleaved with another's
+        self._data_event: Event = None  # the event we send each time data arrives (once we've connected)
+
+    @property
+    def name(self) -> str:
+        """
+        This is the host and port to which we connect.
+
+        :rtype: ``str``
+        """
+        return '{host}:{port}'.format(host=self._host, port=self._port)
+
+    @property
+    def socket(self) -> socket.socket or None:
+        """
+        This is the socket (if we're connected).
+
+        :rtype: :py:class:`socket.socket`
+        """
+        return self._socket
+
+    @property
+    def frame_decoder(self) -> FrameDecoder or None:
+        """
+        This is the decoder that turns received data into frames (if there is one).
+
+        :rtype: :py:class:`cnxman.framing.FrameDecoder`
+        """
+        return self._frame_decoder
+
+    def try_connect(self) -> bool:
+        """
+        Attempt to connect to the socket.
+
+        :return: ``True`` if and only if the connection attempt is successful, otherwise ``False``.
+        :rtype:  ``bool``
+        """
+        # If we're already connected, there's nothing more to do here.
+        if self._listener is not None and self._listener.is_alive():
+            return True
+        self.disconnect()
+        try:
+            sock = socket.create_connection((self._host, self._port), timeout=self._timeout)
+        except OSError as ex:
+            self.logger.warning('Could not connect to %s: %s', self.name, ex)
+            return False
+        try:
+            self._configure(sock)
+        except OSError as ex:
+            self.logger.warning('Could not configure the connection to %s: %s', self.name, ex)
+            sock.close()
+            return False
+        # The listener waits as long as it takes for data.
+        sock.settimeout(None)
+        # Any partial frame left over from a previous connection is no good to us now.
+        if self._frame_decoder is not None:
+            self._frame_decoder.reset()
+        if self._data_event is None:
+            self._data_event = Event(signal=SocketConnection.Signals.DATA_RECEIVED, sender=self)
+        self._socket = sock
+        self._listener = SocketListener(sock, name=self.name, buffer_size=self._buffer_size)
+        dispatcher.connect(self._handle_listener_data_received,
+                           signal=SocketListener.Signals.DATA_RECEIVED,
+                           sender=self._listener)
+        dispatcher.connect(self._handle_listener_read_error,
+                           signal=SocketListener.Signals.READ_ERROR,
+                           sender=self._listener)
+        self._listener.start()
+        return True
+
+    def _configure(self, sock: 'socket.socket'):
+        """
+        Apply our options to a newly-connected socket.
+        """
+        if self._nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self._keepalive:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            for option, value in (('TCP_KEEPIDLE', self._keepalive_idle),
+                                  ('TCP_KEEPINTVL', self._keepalive_interval),
+                                  ('TCP_KEEPCNT', self._keepalive_count)):
+                # (Not every platform lets us tune these for each socket.)
+                if value is not None and hasattr(socket, option):
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+    def disconnect(self):
+        """
+        Disconnect from the socket.
+        """
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            # Disconnect from any further signals sent by the listener.
+            dispatcher.disconnect_sender(listener)
+            # Stop the listener (which closes the socket).
+            listener.terminate()
+        elif self._socket is not None:
+            self._socket.close()
+        self._socket = None
+
+    def teardown(self):
+        """
+        Release the socket entirely.
+        """
+        self.disconnect()
+
+    def shutdown(self, timeout: float = None) -> bool:
+        """
+        Release the socket gracefully:  we send along whatever has already arrived, and then close it.
+
+        :param timeout: the longest time (in seconds) we'll take (``None`` means as long as it takes)
+        :type timeout:  ``float``
+        :return: ``True`` if nothing was lost, or ``False`` if we ran out of time
+        :rtype:  ``bool``
+        """
+        listener = self._listener
+        # (We're still listening to the listener, so what it sends along reaches our subscribers.)
+        finished = listener.stop(timeout=timeout) if listener is not None else True
+        self.teardown()
+        return finished
+
+    def send(self, data):
+        """
+        Send data to the other end.  (This blocks until the data has been handed to the operating system.)
+
+        :param data: the data (``bytes``, ``bytearray``, ``memoryview`` or anything else that supports the buffer
+            protocol)
+        :raises ConnectionException: if we're not connected, or the data couldn't be sent
+        """
+        self.send_many((data,))
+
+    def send_many(self, messages):
+        """
+        Send several messages to the other end, gathered into as few system calls as the operating system allows (and
+        without joining them together first).
+
+        :param messages: the messages (each of which may be anything :py:func:`SocketConnection.send` accepts)
+        :raises ConnectionException: if we're not connected, or the data couldn't be sent
+        """
+        sock = self._socket
+        if sock is None:
+            raise ConnectionException(message='Cannot send while disconnected.', inner=None)
+        views = [memoryview(message).cast('B') for message in messages]
+        total = sum(view.nbytes for view in views)
+        try:
+            with self._send_lock:
+                if hasattr(sock, 'sendmsg'):
+                    # Send what we can (no more buffers at a time than the operating system will take), then pick up
+                    # where it left off.
+                    while views:
+                        sent = sock.sendmsg(views[:_IOV_MAX])
+                        while views and sent >= views[0].nbytes:
+                            sent -= views.pop(0).nbytes
+                        if views and sent:
+                            views[0] = views[0][sent:]
+                else:
+                    for view in views:
+                        sock.sendall(view)
+        except OSError as ex:
+            raise ConnectionException.from_exception(ex) from ex
+        if registry.enabled:
+            registry.counter('cnxman_socket_bytes_written_total', 'bytes written by socket connections',
+                             address=self.name).inc(total)
+
+    def _handle_listener_data_received(self, event: Event):
+        data = event.data
+        self.logger.debug('%s sent %d bytes.', self.name, len(data))
+        # Pass the data along to anybody listening to this connection.
+        own = self._data_event
+        own.data, own.timestamp = data, event.timestamp
+        dispatcher.send_event(own)
+        own.data = None
+        # If we're framing the data, let everybody know about each frame that's now complete.
+        if self._frame_decoder is not None:
+            frames = self._frame_decoder.feed(data)
+            if frames and registry.enabled:
+                registry.counter('cnxman_socket_frames_received_total', 'frames decoded by socket connections',
+                                 address=self.name).inc(len(frames))
+            for frame in frames:
+                dispatcher.send(signal=SocketConnection.Signals.FRAME_RECEIVED, sender=self, frame=frame)
+
+    def _handle_listener_read_error(self):
+        # Raise the alarm!
+        self.raise_alarm()
@@ -0,0 +1,429 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.subscriptions
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Take a number.
+
+Receivers connected to a connection's data signal are called one after another on the thread that reads the port, so a
+slow one holds up the rest (and the port).  A :py:class:`Subscription` gets a bounded queue of its own instead:  the
+reader drops each chunk into every subscriber's queue and goes straight back to reading, and each subscriber takes the
+chunks out (on its own thread, or in its own coroutine) as fast as it can.
+
+.. code-block:: python
+
+    with connection.subscribe(max_chunks=256) as chunks:
+        for chunk in chunks:
+            ...
+
+    async for chunk in connection.subscribe(policy=OverflowPolicy.DROP_NEWEST):
+        ...
+
+What happens when a subscriber falls so far behind that its queue is full is up to the subscriber (see
+:py:class:`cnxman.buffers.OverflowPolicy`), and so is how far behind it may fall.  Only a subscriber whose policy is
+:py:attr:`cnxman.buffers.OverflowPolicy.BLOCK` can hold up the reader.
+
+However many subscribers there are, each chunk is copied (into an immutable ``bytes`` object, if it isn't one already)
+once, and the subscribers all get the same object.
+"""
+
+from collections import deque
+import threading
+import time
+import weakref
+from .buffers import OverflowPolicy
+from .events import dispatcher
+from .metrics import registry
+# typing is slow to import, and only the annotations need it.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Deque, List, Tuple
+    from .basics import Connection
+
+_fanouts = weakref.WeakKeyDictionary()  # the fan-out for each connection (and signal) that has subscribers
+_fanouts_lock = threading.Lock()
+
+
+class Subscription(object):
+    """
+    This is a subscriber's view of a connection's data:  a bounded queue of the chunks (or frames) the connection has
+    received that the subscriber hasn't taken yet.  You can take them with :py:func:`Subscription.get`, or iterate
+    over the subscription (with ``for``, or ``async for``) until it's closed.
+
+    :seealso:  :py:func:`cnxman.basics.Connection.subscribe`
+    """
+    def __init__(self,
+                 name: str,
+                 connection_name: str,
+                 max_chunks: int = 1024,
+                 max_bytes: int = None,
+                 policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST):
+        """
+
+        :param name: the subscriber's name (in metrics)
+        :type name:  ``str``
+        :param connection_name: the name of the connection (in metrics)
+        :type connection_name:  ``str``
+        :param max_chunks: the most chunks the queue holds
+        :type max_chunks:  ``int``
+        :param max_bytes: the most bytes the queue holds (``None`` means there's no limit but the number of chunks)
+        :type max_bytes:  ``int``
+        :param policy: what we do with a chunk when the queue is full
+        :type policy:  :py:class:`cnxman.buffers.OverflowPolicy`
+        """
+        if max_chunks < 1:
+            raise ValueError('The queue must hold at least one chunk.')
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError('The queue must hold at least one byte.')
+        self._name = name
+        self._connection_name = connection_name
+        self._max_chunks = max_chunks
+        self._max_bytes = max_bytes
+        self._policy = policy
+        self._chunks: 'Deque[Tuple[bytes, int]]' = deque()  # the chunks waiting (and when each one was received)
+        self._bytes = 0  # the number of bytes waiting
+        self._high_water_mark = 0  # the most chunks we've ever held at once
+        self._delivered = 0  # the number of chunks taken by the subscriber
+        self._dropped = 0  # the number of chunks we've thrown away
+        self._dropped_bytes = 0  # the number of bytes we've thrown away
+        self._closed = False
+        self._condition = threading.Condition()  # guards everything above
+        self._waiters: 'List[Tuple[object, object]]' = []  # the (loop, future) of each coroutine waiting for a chunk
+        self._unsubscribe = None  # the function that takes us off the connection's list
+
+    @property
+    def name(self) -> str:
+        """
+        This is the subscriber's name.
+
+        :rtype: ``str``
+        """
+        return self._name
+
+    @property
+    def policy(self) -> OverflowPolicy:
+        """
+        This is what we do with a chunk when the queue is full.
+
+        :rtype: :py:class:`cnxman.buffers.OverflowPolicy`
+        """
+        return self._policy
+
+    @property
+    def closed(self) -> bool:
+        """
+        Has the subscription been closed?
+
+        :rtype: ``bool``
+        """
+        return self._closed
+
+    @property
+    def pending(self) -> int:
+        """
+        This is the number of chunks waiting to be taken.
+
+        :rtype: ``int``
+        """
+        return len(self._chunks)
+
+    @property
+    def pending_bytes(self) -> int:
+        """
+        This is the number of bytes waiting to be taken.
+
+        :rtype: ``int``
+        """
+        return self._bytes
+
+    @property
+    def high_water_mark(self) -> int:
+        """
+        This is the most chunks that have ever been waiting at once.
+
+        :rtype: ``int``
+        """
+        return self._high_water_mark
+
+    @property
+    def delivered(self) -> int:
+        """
+        This is the number of chunks the subscriber has taken.
+
+        :rtype: ``int``
+        """
+        return self._delivered
+
+    @property
+    def dropped(self) -> int:
+        """
+        This is the number of chunks thrown away because the queue was full.
+
+        :rtype: ``int``
+        """
+        return self._dropped
+
+    @property
+    def dropped_bytes(self) -> int:
+        """
+        This is the number of bytes thrown away because the queue was full.
+
+        :rtype: ``int``
+        """
+        return self._dropped_bytes
+
+    @property
+    def lag(self) -> float:
+        """
+        This is how far (in seconds) the subscriber has fallen behind:  the time since the oldest chunk that's waiting
+        was received (or ``0`` if nothing is waiting).
+
+        :rtype: ``float``
+        """
+        chunks = self._chunks
+        try:
+            received = chunks[0][1]
+        except IndexError:
+            return 0.0
+        return max(0.0, (time.monotonic_ns() - received) / 1e9)
+
+    def put(self, chunk: bytes, timestamp: int = None) -> bool:
+        """
+        Add a chunk to the queue.  (This is called on the thread that reads the connection.)
+
+        :param chunk: the chunk (which must not change, since other subscribers may have it too)
+        :type chunk:  ``bytes``
+        :param timestamp: when (according to :py:func:`time.monotonic_ns`) the chunk was received
+        :type timestamp:  ``int``
+        :return: ``True`` if the chunk was queued, or ``False`` if it was dropped (or we're closed)
+        :rtype:  ``bool``
+        """
+        size = len(chunk)
+        with self._condition:
+            if self._closed:
+                return False
+            while self._full(size):
+                if self._policy is OverflowPolicy.DROP_NEWEST:
+                    self._drop(size)
+                    return False
+                if self._policy is OverflowPolicy.DROP_OLDEST:
+                    oldest, _ = self._chunks.popleft()
+                    self._bytes -= len(oldest)
+                    self._drop(len(oldest))
+                    continue
+                # Wait for the subscriber to make room.
+                self._condition.wait()
+                if self._closed:
+                    return False
+            self._chunks.append((chunk, timestamp if timestamp is not None else time.monotonic_ns()))
+            self._bytes += size
+            if len(self._chunks) > self._high_water_mark:
+                self._high_water_mark = len(self._chunks)
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+        self._wake(waiters)
+        return True
+
+    def _full(self, size: int) -> bool:
+        """
+        Is there no room (with the lock held) for a chunk of the given size?  (A chunk that's bigger than the queue gets
+        in when the queue is empty, or it never would.)
+        """
+        chunks = self._chunks
+        if not chunks:
+            return False
+        return len(chunks) >= self._max_chunks or (self._max_bytes is not None and self._bytes + size > self._max_bytes)
+
+    def _drop(self, size: int):
+        """
+        Count a chunk we've thrown away (with the lock held).
+        """
+        self._dropped += 1
+        self._dropped_bytes += size
+        if registry.enabled:
+            registry.counter('cnxman_subscriber_dropped_bytes_total', 'bytes subscribers fell too far behind to get',
+                             connection=self._connection_name, subscriber=self._name).inc(size)
+
+    def _take(self) -> bytes or None:
+        """
+        Take the oldest chunk (with the lock held), if there is one.
+        """
+        try:
+            chunk, received = self._chunks.popleft()
+        except IndexError:
+            return None
+        self._bytes -= len(chunk)
+        self._delivered += 1
+        # There's room now (for a reader that's waiting for some).
+        if self._policy is OverflowPolicy.BLOCK:
+            self._condition.notify_all()
+        if registry.enabled:
+            registry.histogram('cnxman_subscriber_lag_seconds', 'how long chunks waited for their subscribers',
+                               connection=self._connection_name,
+                               subscriber=self._name).observe((time.monotonic_ns() - received) / 1e9)
+        return chunk
+
+    def get(self, timeout: float = None) -> bytes or None:
+        """
+        Take the oldest chunk, waiting for one if there isn't one yet.
+
+        :param timeout: how long (in seconds) we'll wait (``None`` means as long as it takes)
+        :type timeout:  ``float``
+        :return: the chunk, or ``None`` if we ran out of time (or the subscription is closed and there's nothing left)
+        :rtype:  ``bytes``
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._chunks or self._closed, timeout):
+                return None
+            return self._take()
+
+    def close(self):
+        """
+        Close the subscription.  We stop receiving chunks, but the subscriber may still take whatever is waiting.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+        self._wake(waiters)
+        if self._unsubscribe is not None:
+            self._unsubscribe(self)
+
+    @staticmethod
+    def _wake(waiters: 'List[Tuple[object, object]]'):
+        """
+        Wake the coroutines waiting for a chunk.
+        """
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(Subscription._resolve, future)
+            except RuntimeError:
+                pass  # (The loop has been closed, so there's nobody to wake.)
+
+    @staticmethod
+    def _resolve(future):
+        if not future.done():
+            future.set_result(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        chunk = self.get()
+        if chunk is None:
+            raise StopIteration
+        return chunk
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        import asyncio  # (It's slow to import, but by now somebody has imported it.)
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                chunk = self._take()
+                if chunk is not None:
+                    return chunk
+                if self._closed:
+                    raise StopAsyncIteration
+                future = loop.create_future()
+                self._waiters.append((loop, future))
+            await future
+
+    def __repr__(self):
+        return 'Subscription({name!r}, pending={pending}, dropped={dropped})'.format(
+            name=self._name, pending=len(self._chunks), dropped=self._dropped)
+
+
+class _Fanout(object):
+    """
+    This is the one receiver a connection's signal has, however many subscribers there are.  It makes each chunk
+    immutable (once) and hands the same object to every subscriber.
+    """
+    def __init__(self):
+        self._subscriptions: 'Tuple[Subscription, ...]' = ()  # (replaced, never changed, so we needn't lock to read)
+        self._lock = threading.Lock()
+
+    def add(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions = self._subscriptions + (subscription,)
+
+    def remove(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions = tuple(s for s in self._subscriptions if s is not subscription)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def handle(self, data=None, frame=None, timestamp: int = None):
+        """
+        This is the handler for the connection's signal.
+        """
+        subscriptions = self._subscriptions
+        if not subscriptions:
+            return
+        chunk = data if data is not None else frame
+        # The data may be a view of the reader's own buffer (which it's about to reuse), so the subscribers get a copy.
+        # (They can all share the same one.)
+        if type(chunk) is not bytes:
+            chunk = bytes(chunk)
+        for subscription in subscriptions:
+            subscription.put(chunk, timestamp)
+
+
+def subscribe(connection: 'Connection',
+              max_chunks: int = 1024,
+              max_bytes: int = None,
+              policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+              name: str = None,
+              signal=None) -> Subscription:
+    """
+    Subscribe to a connection's data.
+
+    :param connection: the connection
+    :type connection:  :py:class:`cnxman.basics.Connection`
+    :param max_chunks: the most chunks the subscriber's queue holds
+    :type max_chunks:  ``int``
+    :param max_bytes: the most bytes the subscriber's queue holds (``None`` means there's no limit but the number of
+        chunks)
+    :type max_bytes:  ``int``
+    :param policy: what we do with a chunk when the subscriber's queue is full
+    :type policy:  :py:class:`cnxman.buffers.OverflowPolicy`
+    :param name: the subscriber's name (in metrics)
+    :type name:  ``str``
+    :param signal: the signal whose ``data`` (or ``frame``) the subscriber wants (the default is the ``DATA_RECEIVED``
+        member of the connection's ``Signals``)
+    :return: the subscription
+    :rtype:  :py:class:`Subscription`
+    :raises ValueError: if the connection doesn't send data
+    """
+    if signal is None:
+        signal = getattr(getattr(connection, 'Signals', None), 'DATA_RECEIVED', None)
+        if signal is None:
+            raise ValueError('{name} does not send any data.'.format(name=connection.name))
+    with _fanouts_lock:
+        fanouts = _fanouts.setdefault(connection, {})
+        fanout = fanouts.get(signal)
+        if fanout is None:
+            fanout = fanouts[signal] = _Fanout()
+            # (The fan-out is kept alive by the connection's entry in our table, so the bus's reference can be weak.)
+            dispatcher.connect(fanout.handle, signal=signal, sender=connection)
+        subscription = Subscription(name=name if name is not None else 'subscriber-{n}'.format(n=len(fanout) + 1),
+                                    connection_name=connection.name,
+                                    max_chunks=max_chunks,
+                                    max_bytes=max_bytes,
+                                    policy=policy)
+        subscription._unsubscribe = fanout.remove
+        fanout.add(subscription)
+    return subscription
@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+.. currentmodule:: cnxman.tracing
+.. moduleauthor:: Pat Daburu <pat@daburu.net>
+
+Where did the time go?
+
+The :py:data:`tracer` follows a sample of the chunks read from each port on their way to the subscribers, stamping
+each one (with :py:func:`time.perf_counter_ns`) at every stage along the way:
+
+* ``read``:  the listener has read the chunk from the port;
+* ``enqueue``:  the listener has put the chunk in the buffer between it and the dispatch thread (if there is one);
+* ``dispatch``:  the chunk is about to be sent along to the subscribers;
+* ``handled``:  the last subscriber has returned.
+
+The time between each stage and the next (and between the first and the last) is recorded in a
+:py:class:`LatencyHistogram` for each port, and the most recent traces are kept so that they can be exported to a
+trace file that `Perfetto <https://ui.perfetto.dev/>`_ (or ``chrome://tracing``) can open.
+
+Tracing is off until you turn it on.  Then only every so many chunks are traced (one in a hundred, unless you say
+otherwise), so it costs little enough to leave on.
+
+.. code-block:: python
+
+    tracer.enable(sample_rate=0.01)
+    ...
+    print(tracer.summary()['/dev/ttyUSB0']['read-handled'])
+    tracer.export('cnxman.trace.json')
+"""
+
+from collections import deque
+import itertools
+import threading
+import time
+# typing is slow to import, and only the annotations need it.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Deque, Dict, List
+
+
+class LatencyHistogram(object):
+    """
+    This is a histogram in the style of `HdrHistogram <http://hdrhistogram.org/>`_:  its buckets are laid out so that
+    every value it records is kept to a fixed number of significant figures, from a nanosecond to an hour, in a few
+    kilobytes.  Values smaller than the number of sub-buckets are recorded exactly; above that, each power of two is
+    split into the same number of sub-buckets.
+    """
+    def __init__(self, significant_figures: int = 2):
+        """
+
+        :param significant_figures: the number of significant (decimal) figures kept for each value
+        :type significant_figures:  ``int``
+        """
+        if not 1 <= significant_figures <= 5:
+            raise ValueError('The significant figures must be between 1 and 5.')
+        # We need enough sub-buckets per power of two to tell apart values that differ in the last significant figure.
+        self._sub_bits = (2 * 10 ** significant_figures - 1).bit_length()
+        self._counts: 'Dict[int, int]' = {}  # the count in each (non-empty) bucket, by the bucket's lowest value
+        self._count = 0
+        self._sum = 0
+        self._min: int = None
+        self._max: int = None
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        """
+        This is the number of values recorded.
+
+        :rtype: ``int``
+        """
+        return self._count
+
+    @property
+    def min(self) -> int or None:
+        """
+        This is the smallest value recorded.
+
+        :rtype: ``int``
+        """
+        return self._min
+
+    @property
+    def max(self) -> int or None:
+        """
+        This is the largest value recorded.
+
+        :rtype: ``int``
+        """
+        return self._max
+
+    @property
+    def mean(self) -> float or None:
+        """
+        This is the mean of the values recorded.
+
+        :rtype: ``float``
+        """
+        return self._sum / self._count if self._count else None
+
+    def _bucket(self, value: int) -> int:
+        """
+        Get the lowest value in a value's bucket.
+        """
+        shift = value.bit_length() - self._sub_bits
+        return value if shift <= 0 else (value >> shift) << shift
+
+    def record(self, value: int):
+        """
+        Record a value.
+
+        :param value: the value (which, for a latency, is in nanoseconds)
+        :type value:  ``int``
+        """
+        value = max(0, int(value))
+        bucket = self._bucket(value)
+        with self._lock:
+            self._counts[bucket] = self._counts.get(bucket, 0) + 1
+            self._count += 1
+            self._sum += value
+            if self._min is None or value < self._min:
+                self._min = value
+            if self._max is None or value > self._max:
+                self._max = value
+
+    def percentile(self, percentile: float) -> int or None:
+        """
+        Get the value below which the given percentage of the recorded values fall.
+
+        :param percentile: the percentile (e.g. ``99.9``)
+        :type percentile:  ``float``
+        :return: the value (to the histogram's precision), or ``None`` if nothing has been recorded
+        :rtype:  ``int``
+        """
+        with self._lock:
+            if not self._count:
+                return None
+            counts = sorted(self._counts.items())
+            target = max(1, -(-self._count * percentile // 100))  # (the rank of the value we're after, rounded up)
+            maximum = self._max
+        seen = 0
+        for bucket, count in counts:
+            seen += count
+            if seen >= target:
+                # Report the highest value the bucket could hold (but nothing we haven't actually seen).
+                shift = bucket.bit_length() - self._sub_bits
+                highest = bucket + (1 << shift) - 1 if shift > 0 else bucket
+                return min(highest, maximum)
+        return maximum
+
+    def summary(self) -> dict:
+        """
+        Get the count, the extremes, the mean and the usual percentiles.
+
+        :rtype: ``dict``
+        """
+        return {
+            'count': self._count,
+            'min': self._min,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p99.9': self.percentile(99.9),
+            'max': self._max
+        }
+
+    def reset(self):
+        """
+        Forget every value recorded.
+        """
+        with self._lock:
+            self._counts.clear()
+            self._count = self._sum = 0
+            self._min = self._max = None
+
+
+class Trace(object):
+    """
+    These are the times (according to :py:func:`time.perf_counter_ns`) at which a chunk reached each stage.
+    """
+    __slots__ = ('connection', 'size', 'read', 'enqueue', 'dispatch', 'handled', 'offset')
+
+    #: the stages (in the order they happen)
+    stages = ('read', 'enqueue', 'dispatch', 'handled')
+
+    def __init__(self, connection: str, size: int, read: int):
+        self.connection = connection  #: the name of the connection
+        self.size = size  #: the size of the chunk (in bytes)
+        self.read = read  #: when the chunk was read
+        self.enqueue: int = None  #: when the chunk was put in the buffer (if there is one)
+        self.dispatch: int = None  #: when the chunk was about to be sent to the subscribers
+        self.handled: int = None  #: when the last subscriber returned
+        self.offset = 0  # where the chunk ends in the buffer (if there is one)
+
+    def intervals(self) -> 'List[tuple]':
+        """
+        Get the time between each stage the chunk reached and the next.
+
+        :return: the name, start and end of each interval
+        :rtype:  ``list``
+        """
+        stamps = [(stage, getattr(self, stage)) for stage in Trace.stages if getattr(self, stage) is not None]
+        return [('{a}-{b}'.format(a=a, b=b), start, end) for (a, start), (b, end) in zip(stamps, stamps[1:])]
+
+
+class Tracer(object):
+    """
+    This object decides which chunks are traced, and keeps what their traces tell us.
+
+    :seealso:  :py:data:`tracer`
+    """
+    def __init__(self, sample_rate: float = 0.01, max_traces: int = 10000, enabled: bool = False):
+        """
+
+        :param sample_rate: the fraction of chunks that are traced
+        :type sample_rate:  ``float``
+        :param max_traces: the number of recent traces we keep to export
+        :type max_traces:  ``int``
+        :param enabled: Should we start tracing right away?
+        :type enabled:  ``bool``
+        """
+        self.enabled = False  #: Are we tracing?  (Check this before asking for a trace.)
+        self._every = 1  # We trace one chunk in this many.
+        self._counter = itertools.count()  # (Its next() is atomic, so the listeners can share it without a lock.)
+        self._traces: 'Deque[Trace]' = deque(maxlen=max_traces)  # the most recent (finished) traces
+        self._histograms: 'Dict[str, Dict[str, LatencyHistogram]]' = {}  # the histograms for each connection
+        self._lock = threading.Lock()
+        self.sample_rate = sample_rate
+        if enabled:
+            self.enable()
+
+    @property
+    def sample_rate(self) -> float:
+        """
+        This is the fraction of chunks that are traced.
+
+        :rtype: ``float``
+        """
+        return 1 / self._every
+
+    @sample_rate.setter
+    def sample_rate(self, value: float):
+        if not 0 < value <= 1:
+            raise ValueError('The sample rate must be greater than 0 and no more than 1.')
+        self._every = max(1, round(1 / value))
+
+    def enable(self, sample_rate: float = None):
+        """
+        Start tracing.
+
+        :param sample_rate: the fraction of chunks that are traced (if you'd like to change it)
+        :type sample_rate:  ``float``
+        """
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        self.enabled = True
+
+    def disable(self):
+        """
+        Stop tracing.  (What we've recorded so far is kept.)
+        """
+        self.enabled = False
+
+    def clear(self):
+        """
+        Forget every trace and histogram.
+        """
+        with self._lock:
+            self._traces.clear()
+            self._histograms = {}
+
+    def begin(self, connection: str, size: int) -> Trace or None:
+        """
+        Decide whether to trace a chunk that has just been read and, if we are, start its trace.
+
+        :param connection: the name of the connection that read it
+        :type connection:  ``str``
+        :param size: the size of the chunk (in bytes)
+        :type size:  ``int``
+        :return: the trace (or ``None`` if this chunk isn't in the sample)
+        :rtype:  :py:class:`Trace`
+        """
+        if next(self._counter) % self._every:
+            return None
+        return Trace(connection, size, time.perf_counter_ns())
+
+    def finish(self, trace: Trace):
+        """
+        Note that the subscribers have finished with a chunk, and record how long each stage took.
+
+        :param trace: the chunk's trace
+        :type trace:  :py:class:`Trace`
+        """
+        trace.handled = time.perf_counter_ns()
+        histograms = self._histograms.get(trace.connection)
+        if histograms is None:
+            with self._lock:
+                histograms = self._histograms.setdefault(trace.connection, {})
+        for name, start, end in trace.intervals():
+            self._histogram(histograms, name).record(end - start)
+        self._histogram(histograms, 'read-handled').record(trace.handled - trace.read)
+        self._traces.append(trace)
+
+    def _histogram(self, histograms: 'Dict[str, LatencyHistogram]', name: str) -> LatencyHistogram:
+        histogram = histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(name, LatencyHistogram())
+        return histogram
+
+    def histograms(self, connection: str) -> 'Dict[str, LatencyHistogram]':
+        """
+        Get a connection's histograms.
+
+        :param connection: the name of the connection
+        :type connection:  ``str``
+        :return: the histograms (of nanoseconds) for each interval (e.g. ``read-dispatch``, and ``read-handled`` from
+            start to finish)
+        :rtype:  ``dict``
+        """
+        return dict(self._histograms.get(connection, {}))
+
+    def summary(self) -> dict:
+        """
+        Summarize every connection's histograms.
+
+        :return: the :py:func:`LatencyHistogram.summary` of each interval (in nanoseconds), for each connection
+        :rtype:  ``dict``
+        """
+        return {connection: {name: histogram.summary() for name, histogram in histograms.items()}
+                for connection, histograms in list(self._histograms.items())}
+
+    def export(self, path: str):
+        """
+        Write the recent traces to a file in the `Trace Event Format
+        <https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU>`_ (which Perfetto and
+        ``chrome://tracing`` can open).  Each connection gets a track of its own.
+
+        :param path: the path to the file
+        :type path:  ``str``
+        """
+        import json
+        events = []
+        threads = {}
+        for trace in list(self._traces):
+            tid = threads.setdefault(trace.connection, len(threads) + 1)
+            for name, start, end in trace.intervals():
+                events.append({'name': name, 'cat': 'cnxman', 'ph': 'X', 'pid': 1, 'tid': tid,
+                               'ts': start / 1000, 'dur': (end - start) / 1000, 'args': {'bytes': trace.size}})
+        for connection, tid in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': connection}})
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ns'}, f)
+
+
+tracer = Tracer()  #: This is the tracer through which cnxman's listeners trace the chunks they read.
@@ -27,10 +27,9 @@ setup(
   version=cnxman.__version__,
   install_requires=[
       'automat',
-      'PyDispatcher',
       'pyserial'
   ],
-  python_requires=">=3.6.1",
+  python_requires=">=3.8",
   license='MIT',
   author='Pat Daburu',
   author_email='pat@daburu.net',
@@ -54,6 +53,11 @@ setup(
 
     # Specify the Python versions you support here. In particular, ensure
     # that you indicate whether you support Python 2, Python 3 or both.
-    'Programming Language :: Python :: 3.6',
+    'Programming Language :: Python :: 3',
+    'Programming Language :: Python :: 3 :: Only',
+    'Programming Language :: Python :: 3.8',
+    'Programming Language :: Python :: 3.9',
+    'Programming Language :: Python :: 3.10',
+    'Programming Language :: Python :: 3.11',
   ],
 )
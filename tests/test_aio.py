@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import unittest
+from cnxman.aio import AsyncConnection, AsyncConnectionManager
+from cnxman.basics import BaseConnectionManager, ManagerState
+from cnxman.events import dispatcher
+from cnxman.scheduling import Backoff, CircuitBreaker
+from cnxman.serial import AsyncSerialConnection
+
+
+class FlakyConnection(AsyncConnection):
+    """
+    This is a connection that fails a given number of times before it succeeds.
+    """
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts = 0
+        self.disconnects = 0
+        self.teardowns = 0
+
+    async def try_connect(self) -> bool:
+        self.attempts += 1
+        return self.attempts > self.failures
+
+    async def disconnect(self):
+        self.disconnects += 1
+
+    async def teardown(self):
+        self.teardowns += 1
+
+
+class TestAsyncConnectionManager(unittest.TestCase):
+    """
+    These test cases test the :py:class:`AsyncConnectionManager` class.
+    """
+    def test_recovers_after_failures(self):
+        """
+        This test verifies the manager keeps trying until the connection succeeds.
+        """
+        async def run():
+            connection = FlakyConnection(failures=2)
+            manager = AsyncConnectionManager(connection, backoff=Backoff(initial=0.01, jitter=0))
+            await manager.connect()
+            self.assertEqual(ManagerState.RECOVERING, manager.state)
+            for _ in range(100):
+                if manager.state is ManagerState.CONNECTED:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertEqual(ManagerState.CONNECTED, manager.state)
+            self.assertEqual(3, connection.attempts)
+            await manager.teardown()
+            self.assertEqual(ManagerState.TORNDOWN, manager.state)
+            self.assertEqual((1, 1), (connection.disconnects, connection.teardowns))
+        asyncio.run(run())
+
+    def test_alarm_starts_recovery(self):
+        """
+        This test verifies that raising the alarm on a connected connection sends the manager into recovery.
+        """
+        async def run():
+            connection = FlakyConnection(failures=0)
+            manager = AsyncConnectionManager(connection, backoff=Backoff(initial=0.01, jitter=0))
+            await manager.connect()
+            self.assertEqual(ManagerState.CONNECTED, manager.state)
+            connection.raise_alarm()
+            await asyncio.sleep(0)
+            self.assertEqual(ManagerState.RECOVERING, manager.state)
+            await asyncio.sleep(0.1)
+            self.assertEqual(ManagerState.CONNECTED, manager.state)
+            self.assertEqual(2, connection.attempts)
+            await manager.disconnect()
+            self.assertEqual(ManagerState.DISCONNECTED, manager.state)
+        asyncio.run(run())
+
+    def test_state_changes_are_signalled(self):
+        """
+        This test verifies the manager signals each state it enters, and stops trying once its backoff runs out of
+        attempts.
+        """
+        changes = []
+
+        def on_state_changed(sender, state, previous):
+            changes.append((previous, state))
+
+        async def run():
+            connection = FlakyConnection(failures=10)
+            manager = AsyncConnectionManager(connection,
+                                             backoff=Backoff(initial=0.01, jitter=0, max_attempts=1),
+                                             breaker=CircuitBreaker())
+            dispatcher.connect(on_state_changed, signal=BaseConnectionManager.Signals.STATE_CHANGED, sender=manager)
+            await manager.connect()
+            await asyncio.sleep(0.2)
+            self.assertEqual(ManagerState.RECOVERING, manager.state)
+            self.assertEqual((2, 2), (connection.attempts, manager.attempts))
+            await manager.teardown()
+        asyncio.run(run())
+        self.assertEqual([(ManagerState.READY, ManagerState.CONNECTING),
+                          (ManagerState.CONNECTING, ManagerState.RECOVERING),
+                          (ManagerState.RECOVERING, ManagerState.CONNECTING),
+                          (ManagerState.CONNECTING, ManagerState.RECOVERING),
+                          (ManagerState.RECOVERING, ManagerState.TORNDOWN)], changes)
+
+    def test_the_breaker_holds_back_recovery(self):
+        """
+        This test verifies the manager waits for the circuit breaker before it tries to reconnect.
+        """
+        async def run():
+            breaker = CircuitBreaker(max_concurrent=1, retry_delay=0.01)
+            connection = FlakyConnection(failures=1)
+            manager = AsyncConnectionManager(connection, backoff=Backoff(initial=0.01, jitter=0), breaker=breaker)
+            self.assertTrue(breaker.acquire())
+            await manager.connect()
+            await asyncio.sleep(0.1)
+            self.assertEqual((ManagerState.RECOVERING, 1), (manager.state, connection.attempts))
+            breaker.release(success=True)
+            await asyncio.sleep(0.1)
+            self.assertEqual((ManagerState.CONNECTED, 2), (manager.state, connection.attempts))
+            self.assertEqual(0, manager.attempts)
+            await manager.teardown()
+        asyncio.run(run())
+
+
+class TestAsyncSerialConnection(unittest.TestCase):
+    """
+    These test cases test the :py:class:`AsyncSerialConnection` class.
+    """
+    @unittest.skipUnless(hasattr(os, 'openpty'), 'This test needs a pseudo-terminal.')
+    def test_read_through_the_event_loop(self):
+        """
+        This test writes to one end of a pseudo-terminal and reads from the other through the event loop.
+        """
+        master, slave = os.openpty()
+
+        async def run():
+            connection = AsyncSerialConnection(os.ttyname(slave))
+            self.assertTrue(await connection.try_connect())
+            os.write(master, b'hello')
+            received = b''
+            async for chunk in connection:
+                received += chunk
+                if len(received) >= 5:
+                    break
+            await connection.disconnect()
+            return received
+        try:
+            self.assertEqual(b'hello', asyncio.run(run()))
+        finally:
+            os.close(master)
+            os.close(slave)
+
+    def test_poll_ports_without_file_descriptors(self):
+        """
+        This test reads from a loopback port, which has to be polled, and verifies iteration stops on disconnect.
+        """
+        async def run():
+            connection = AsyncSerialConnection('loop://', poll_interval=0.001)
+            self.assertTrue(await connection.try_connect())
+            connection.serial.write(b'abc')
+            chunks = []
+            async for chunk in connection:
+                chunks.append(chunk)
+                await connection.disconnect()
+            return chunks
+        self.assertEqual([b'abc'], asyncio.run(run()))
@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+from cnxman.basics import (BaseConnectionManager, Connection, ConnectionManager, FastConnectionManager, ManagerState,
+                            TransitionError)
+from cnxman.events import dispatcher
+from cnxman.scheduling import Backoff, CircuitBreaker, Scheduler
+
+
+class FlakyConnection(Connection):
+    """
+    This is a connection that fails a given number of times before it succeeds.
+    """
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts = 0
+        self.connected = threading.Event()
+        self.disconnects = 0
+        self.teardowns = 0
+
+    def try_connect(self) -> bool:
+        self.attempts += 1
+        if self.attempts > self.failures:
+            self.connected.set()
+            return True
+        return False
+
+    def disconnect(self):
+        self.disconnects += 1
+
+    def teardown(self):
+        self.teardowns += 1
+
+
+class TestConnectionManager(unittest.TestCase):
+    """
+    These test cases test the :py:class:`ConnectionManager` class.
+    """
+    manager_class = ConnectionManager  #: the kind of manager we're testing
+
+    def setUp(self):
+        self.scheduler = Scheduler()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_connect_does_not_block_while_recovering(self):
+        """
+        This test verifies a failed connection attempt returns right away and the scheduler keeps trying until the
+        connection succeeds.
+        """
+        connection = FlakyConnection(failures=3)
+        manager = self.manager_class(connection,
+                                      backoff=Backoff(initial=0.01, jitter=0),
+                                      scheduler=self.scheduler)
+        manager.connect()
+        self.assertEqual(1, connection.attempts)
+        self.assertTrue(connection.connected.wait(2))
+        self.assertEqual(4, connection.attempts)
+        self.assertEqual(0, manager.attempts)
+
+    def test_gives_up_after_max_attempts(self):
+        """
+        This test verifies the manager stops scheduling attempts once the backoff is exhausted.
+        """
+        connection = FlakyConnection(failures=100)
+        manager = self.manager_class(connection,
+                                      backoff=Backoff(initial=0.001, jitter=0, max_attempts=2),
+                                      scheduler=self.scheduler)
+        manager.connect()
+        threading.Event().wait(0.2)
+        self.assertEqual(3, connection.attempts)
+        self.assertEqual(0, len(self.scheduler))
+
+    def test_teardown_while_recovering(self):
+        """
+        This test verifies a recovering manager can be torn down, and that doing so cancels the pending attempt.
+        """
+        connection = FlakyConnection(failures=100)
+        manager = self.manager_class(connection, backoff=Backoff(initial=60), scheduler=self.scheduler)
+        manager.connect()
+        self.assertEqual(1, len(self.scheduler))
+        manager.teardown()
+        self.assertEqual(0, len(self.scheduler))
+        self.assertEqual((1, 1), (connection.disconnects, connection.teardowns))
+
+    def test_state_changes_are_signalled(self):
+        """
+        This test verifies the manager signals each state it enters.
+        """
+        changes = []
+
+        def handle(state, previous):
+            changes.append((previous, state))
+        connection = FlakyConnection(failures=0)
+        manager = self.manager_class(connection, scheduler=self.scheduler)
+        dispatcher.connect(handle, signal=BaseConnectionManager.Signals.STATE_CHANGED, sender=manager)
+        manager.connect()
+        manager.teardown()
+        self.assertEqual([(ManagerState.READY, ManagerState.CONNECTING),
+                          (ManagerState.CONNECTING, ManagerState.CONNECTED),
+                          (ManagerState.CONNECTED, ManagerState.TORNDOWN)], changes)
+        self.assertIs(ManagerState.TORNDOWN, manager.state)
+
+    def test_shutdown(self):
+        """
+        This test verifies a manager that's shut down lets its connection finish up and ends up torn down (whatever
+        state it was in).
+        """
+        connection = FlakyConnection(failures=0)
+        manager = self.manager_class(connection, scheduler=self.scheduler)
+        self.assertTrue(manager.shutdown(timeout=1))
+        self.assertIs(ManagerState.READY, manager.state)  # (There was nothing to shut down.)
+        manager.connect()
+        self.assertTrue(manager.shutdown(timeout=1))
+        self.assertIs(ManagerState.TORNDOWN, manager.state)
+        self.assertGreaterEqual(connection.teardowns, 1)
+        self.assertTrue(manager.shutdown(timeout=1))
+
+    def test_shutdown_while_connecting(self):
+        """
+        This test verifies a manager shut down in the middle of an attempt to connect waits to see how it goes (and, if
+        it runs out of time, tears down as soon as the attempt is over).
+        """
+        from tests.test_hub import wait_for
+        from tests.test_registry import SlowConnection
+        for timeout, finished in ((2, True), (0.01, False)):
+            connection = SlowConnection(delay=0.1)
+            manager = self.manager_class(connection, scheduler=self.scheduler)
+            connecting = threading.Thread(target=manager.connect)
+            connecting.start()
+            self.assertTrue(wait_for(lambda: manager.state is ManagerState.CONNECTING))
+            self.assertEqual(finished, manager.shutdown(timeout=timeout))
+            connecting.join(2)
+            self.assertIs(ManagerState.TORNDOWN, manager.state)
+            self.assertGreaterEqual(connection.teardowns, 1)
+
+    def test_alarms_are_coalesced(self):
+        """
+        This test verifies a storm of alarms leads to a single attempt to recover (and that alarms raised when there's
+        nothing to recover are ignored).
+        """
+        connection = FlakyConnection(failures=0)
+        manager = self.manager_class(connection, backoff=Backoff(initial=60), scheduler=self.scheduler)
+        connection.raise_alarm()
+        self.assertIs(ManagerState.READY, manager.state)
+        manager.connect()
+        for _ in range(100):
+            connection.raise_alarm()
+        self.assertIs(ManagerState.RECOVERING, manager.state)
+        self.assertEqual(1, manager.attempts)
+        self.assertEqual(1, len(self.scheduler))
+        manager.teardown()
+
+    def test_attempts_are_kept_apart(self):
+        """
+        This test verifies a connection that drops as soon as it's made isn't reconnected sooner than the minimum
+        interval allows.
+        """
+        connection = FlakyConnection(failures=0)
+        manager = self.manager_class(connection, backoff=Backoff(initial=0, jitter=0), scheduler=self.scheduler,
+                                     min_interval=0.2)
+        manager.connect()
+        connection.raise_alarm()
+        threading.Event().wait(0.1)
+        self.assertEqual(1, connection.attempts)
+        deadline = time.monotonic() + 2
+        while connection.attempts < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(2, connection.attempts)
+        manager.teardown()
+
+    def test_breaker_holds_attempts_back(self):
+        """
+        This test verifies an attempt to reconnect waits while the breaker has no room for it.
+        """
+        breaker = CircuitBreaker(max_concurrent=1, retry_delay=0.01)
+        self.assertTrue(breaker.acquire())  # (Somebody else is reconnecting.)
+        connection = FlakyConnection(failures=1)
+        manager = self.manager_class(connection, backoff=Backoff(initial=0.01, jitter=0), scheduler=self.scheduler,
+                                     breaker=breaker)
+        manager.connect()
+        threading.Event().wait(0.1)
+        self.assertEqual(1, connection.attempts)
+        self.assertIs(ManagerState.RECOVERING, manager.state)
+        breaker.release(success=True)
+        self.assertTrue(connection.connected.wait(2))
+        self.assertEqual(0, breaker.in_flight)
+
+
+class TestFastConnectionManager(TestConnectionManager):
+    """
+    These test cases test the :py:class:`FastConnectionManager` class (which should behave just like a
+    :py:class:`ConnectionManager`).
+    """
+    manager_class = FastConnectionManager
+
+    def test_invalid_transitions_are_refused(self):
+        """
+        This test verifies the manager refuses to do what it can't do in its current state.
+        """
+        manager = FastConnectionManager(FlakyConnection(failures=0), scheduler=self.scheduler)
+        with self.assertRaises(TransitionError) as context:
+            manager.disconnect()
+        self.assertEqual('Cannot disconnect while ready.', str(context.exception))
+        self.assertIs(ManagerState.READY, manager.state)
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import unittest
+from cnxman.buffers import OverflowPolicy, RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+    """
+    These test cases test the :py:class:`RingBuffer` class.
+    """
+    def test_wrap_around(self):
+        """
+        This test writes and reads enough to wrap around the end of the buffer and verifies the data is intact.
+        """
+        ring = RingBuffer(8)
+        self.assertEqual(6, ring.write(b'abcdef'))
+        self.assertEqual(b'abcd', ring.read(4))
+        self.assertEqual(6, ring.write(b'ghijkl'))
+        self.assertEqual(8, ring.available)
+        self.assertEqual(b'efghijkl', ring.read())
+        self.assertEqual(8, ring.high_water_mark)
+
+    def test_drop_newest(self):
+        """
+        This test verifies that a full buffer with the 'drop newest' policy throws away the new data.
+        """
+        ring = RingBuffer(8, OverflowPolicy.DROP_NEWEST)
+        ring.write(b'abcdef')
+        self.assertEqual(0, ring.write(b'ghi'))
+        self.assertEqual(3, ring.dropped)
+        self.assertEqual(b'abcdef', ring.read())
+
+    def test_drop_oldest(self):
+        """
+        This test verifies that a full buffer with the 'drop oldest' policy throws away the old data.
+        """
+        ring = RingBuffer(8, OverflowPolicy.DROP_OLDEST)
+        ring.write(b'abcdef')
+        ring.write(b'ghijk')
+        self.assertEqual(b'defghijk', ring.read())
+        self.assertEqual(3, ring.dropped)
+        ring.write(b'0123456789')
+        self.assertEqual(b'23456789', ring.read())
+        self.assertEqual(5, ring.dropped)
+
+    def test_block_times_out(self):
+        """
+        This test verifies that a full buffer with the 'block' policy gives up after the timeout.
+        """
+        ring = RingBuffer(4)
+        self.assertEqual(4, ring.write(b'abcdef', timeout=0.01))
+        self.assertEqual(0, ring.dropped)
+
+    def test_read_times_out(self):
+        """
+        This test verifies that reading from an empty buffer gives up after the timeout.
+        """
+        self.assertEqual(b'', RingBuffer(4).read(timeout=0.01))
+
+    def test_close_wakes_the_reader(self):
+        """
+        This test verifies that closing the buffer lets the reader drain what's left and then stop.
+        """
+        ring = RingBuffer(4)
+        ring.write(b'ab')
+        ring.close()
+        self.assertEqual(0, ring.write(b'cd'))
+        self.assertEqual(b'ab', ring.read())
+        self.assertEqual(b'', ring.read())
+
+    def test_threaded_transfer(self):
+        """
+        This test pushes a lot of data through a small blocking buffer from one thread to another and verifies every
+        byte arrives in order.
+        """
+        data = os.urandom(1 << 16)
+        ring = RingBuffer(97)
+        received = bytearray()
+
+        def consume():
+            while True:
+                chunk = ring.read(50)
+                if not chunk:
+                    return
+                received.extend(chunk)
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        for i in range(0, len(data), 61):
+            ring.write(data[i:i + 61])
+        ring.close()
+        consumer.join(5)
+        self.assertEqual(data, bytes(received))
+        self.assertEqual(0, ring.dropped)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import time
+import unittest
+from cnxman.capture import CaptureReader, CaptureWriter
+from cnxman.events import dispatcher
+from cnxman.framing import DelimitedFrameDecoder
+from cnxman.replay import ReplayConnection
+from cnxman.serial import SerialConnection
+
+
+class CaptureTestCase(unittest.TestCase):
+    """
+    These test cases each get a fresh path for a capture file.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test.cap')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+
+class TestCapture(CaptureTestCase):
+    """
+    These test cases test the :py:class:`CaptureWriter` and :py:class:`CaptureReader` classes.
+    """
+    def test_round_trip(self):
+        """
+        This test verifies what's written is read back (including from a file that has been appended to).
+        """
+        with CaptureWriter(self.path) as writer:
+            writer.write(b'one', timestamp=1)
+            writer.write(b'', timestamp=2)
+        with CaptureWriter(self.path) as writer:
+            writer.write(b'three', timestamp=3)
+        with CaptureReader(self.path) as reader:
+            self.assertEqual([(1, b'one'), (2, b''), (3, b'three')], list(reader))
+
+    def test_truncated_records_are_ignored(self):
+        """
+        This test verifies a record that was cut short is ignored.
+        """
+        with CaptureWriter(self.path) as writer:
+            writer.write(b'whole', timestamp=1)
+            writer.write(b'partial', timestamp=2)
+        os.truncate(self.path, os.path.getsize(self.path) - 1)
+        with CaptureReader(self.path) as reader:
+            self.assertEqual([(1, b'whole')], list(reader))
+
+    def test_other_files_are_refused(self):
+        """
+        This test verifies files that aren't capture files are refused.
+        """
+        with open(self.path, 'wb') as f:
+            f.write(b'something else entirely')
+        with self.assertRaises(ValueError):
+            CaptureReader(self.path)
+        with self.assertRaises(ValueError):
+            CaptureWriter(self.path)
+
+    def test_serial_connection_captures(self):
+        """
+        This test verifies a serial connection writes what it reads to its capture file.
+        """
+        writer = CaptureWriter(self.path)
+        connection = SerialConnection('loop://', timeout=0.05, capture=writer)
+        self.assertTrue(connection.try_connect())
+        connection.serial.write(b'hello')
+        deadline = time.monotonic() + 2
+        while writer.records == 0 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        connection.teardown()
+        writer.close()
+        with CaptureReader(self.path) as reader:
+            self.assertEqual([b'hello'], [data for _, data in reader])
+
+
+class TestReplayConnection(CaptureTestCase):
+    """
+    These test cases test the :py:class:`ReplayConnection` class.
+    """
+    def setUp(self):
+        super().setUp()
+        with CaptureWriter(self.path) as writer:
+            for i, chunk in enumerate((b'one\nt', b'wo\n', b'three\n')):
+                writer.write(chunk, timestamp=i * 50000000)  # (They're 50ms apart.)
+        self.frames = []
+
+    def _handle_frame(self, frame):
+        self.frames.append(frame)
+
+    def _replay(self, speed: float or None) -> float:
+        """
+        Replay the file and return how long it took.
+        """
+        connection = ReplayConnection(self.path, speed=speed, frame_decoder=DelimitedFrameDecoder())
+        dispatcher.connect(self._handle_frame, signal=SerialConnection.Signals.FRAME_RECEIVED, sender=connection)
+        start = time.perf_counter()
+        self.assertTrue(connection.try_connect())
+        self.assertTrue(connection.wait(2))
+        elapsed = time.perf_counter() - start
+        connection.teardown()
+        self.assertEqual(3, connection.chunks)
+        self.assertEqual([b'one', b'two', b'three'], self.frames)
+        return elapsed
+
+    def test_replay_as_fast_as_possible(self):
+        """
+        This test verifies a file can be replayed without any delays.
+        """
+        self.assertLess(self._replay(speed=None), 0.05)
+
+    def test_replay_in_real_time(self):
+        """
+        This test verifies the original timing is kept (at twice the speed).
+        """
+        self.assertGreaterEqual(self._replay(speed=2.0), 0.05)
+
+    def test_replayed_data_goes_out_as_events(self):
+        """
+        This test verifies replayed chunks go out just as live ones do:  as events, stamped with the time they were
+        captured.
+        """
+        received = []
+
+        def handle(event):
+            received.append((event.timestamp, bytes(event.data)))
+        connection = ReplayConnection(self.path, speed=None)
+        dispatcher.connect(handle, signal=SerialConnection.Signals.DATA_RECEIVED, sender=connection)
+        self.assertTrue(connection.try_connect())
+        self.assertTrue(connection.wait(2))
+        connection.teardown()
+        self.assertEqual([(0, b'one\nt'), (50000000, b'wo\n'), (100000000, b'three\n')], received)
+
+    def test_missing_file(self):
+        """
+        This test verifies a connection to a missing file fails.
+        """
+        self.assertFalse(ReplayConnection(os.path.join(self.directory.name, 'missing.cap')).try_connect())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+import unittest
+from enum import Enum
+from cnxman.events import Any, Event, EventBus
+
+
+class Signals(Enum):
+    PING = 'ping'
+    PONG = 'pong'
+
+
+class Sender(object):
+    pass
+
+
+class Recorder(object):
+    """
+    This object records the signals its methods receive.
+    """
+    def __init__(self):
+        self.received = []
+
+    def data_only(self, data):
+        self.received.append(data)
+
+    def everything(self, **kwargs):
+        self.received.append(kwargs)
+
+    def signal_and_sender(self, signal, sender):
+        self.received.append((signal, sender))
+
+    def nothing(self):
+        self.received.append(None)
+
+    def event_only(self, event):
+        self.received.append((event.data, event.timestamp))
+
+
+class TestEventBus(unittest.TestCase):
+    """
+    These test cases test the :py:class:`EventBus` class.
+    """
+    def setUp(self):
+        self.bus = EventBus()
+        self.sender = Sender()
+        self.recorder = Recorder()
+
+    def test_receivers_get_only_the_arguments_they_accept(self):
+        """
+        This test verifies each receiver is passed just the arguments in its signature.
+        """
+        for receiver in (self.recorder.data_only, self.recorder.everything,
+                         self.recorder.signal_and_sender, self.recorder.nothing):
+            self.bus.connect(receiver, signal=Signals.PING, sender=self.sender)
+        self.bus.send(signal=Signals.PING, sender=self.sender, data=b'x')
+        self.assertEqual([b'x',
+                          {'signal': Signals.PING, 'sender': self.sender, 'data': b'x'},
+                          (Signals.PING, self.sender),
+                          None],
+                         self.recorder.received)
+
+    def test_senders_and_signals_are_matched(self):
+        """
+        This test verifies receivers only hear the signals (and senders) they're connected to, including 'Any'.
+        """
+        other = Sender()
+        self.bus.connect(self.recorder.signal_and_sender, signal=Signals.PING, sender=self.sender)
+        any_sender = Recorder()
+        self.bus.connect(any_sender.signal_and_sender, signal=Signals.PONG, sender=Any)
+        self.bus.send(signal=Signals.PING, sender=other)
+        self.bus.send(signal=Signals.PONG, sender=self.sender)
+        self.bus.send(signal=Signals.PING, sender=self.sender)
+        self.assertEqual([(Signals.PING, self.sender)], self.recorder.received)
+        self.assertEqual([(Signals.PONG, self.sender)], any_sender.received)
+
+    def test_connecting_twice_connects_once(self):
+        """
+        This test verifies that connecting the same bound method twice doesn't call it twice.
+        """
+        self.bus.connect(self.recorder.nothing, signal=Signals.PING)
+        self.bus.connect(self.recorder.nothing, signal=Signals.PING)
+        self.bus.send(signal=Signals.PING, sender=self.sender)
+        self.assertEqual([None], self.recorder.received)
+
+    def test_disconnect(self):
+        """
+        This test verifies receivers stop hearing signals once they're disconnected (including after a signal has
+        already been sent, so its receivers have been remembered).
+        """
+        self.bus.connect(self.recorder.nothing, signal=Signals.PING, sender=self.sender)
+        self.bus.send(signal=Signals.PING, sender=self.sender)
+        self.bus.disconnect(self.recorder.nothing, signal=Signals.PING, sender=self.sender)
+        self.bus.send(signal=Signals.PING, sender=self.sender)
+        self.bus.connect(self.recorder.nothing, signal=Signals.PING, sender=self.sender)
+        self.bus.disconnect_sender(self.sender)
+        self.bus.send(signal=Signals.PING, sender=self.sender)
+        self.assertEqual([None], self.recorder.received)
+
+    def test_dead_receivers_are_forgotten(self):
+        """
+        This test verifies that weakly-referenced receivers are disconnected when they're garbage-collected.
+        """
+        recorder = Recorder()
+        self.bus.connect(recorder.nothing, signal=Signals.PING, sender=self.sender)
+        self.assertEqual(1, len(self.bus.receivers(signal=Signals.PING, sender=self.sender)))
+        del recorder
+        gc.collect()
+        self.assertEqual([], self.bus.receivers(signal=Signals.PING, sender=self.sender))
+
+    def test_strong_receivers_are_kept(self):
+        """
+        This test verifies that receivers connected with 'weak=False' stay connected.
+        """
+        received = []
+        self.bus.connect(lambda data: received.append(data), signal=Signals.PING, weak=False)
+        gc.collect()
+        self.bus.send(signal=Signals.PING, data=1)
+        self.assertEqual([1], received)
+
+    def test_responses_are_returned(self):
+        """
+        This test verifies that sending a signal returns each receiver with its response, as PyDispatcher does.
+        """
+        def double(data):
+            return data * 2
+        self.bus.connect(double, signal=Signals.PING, sender=self.sender)
+        self.bus.connect(self.recorder.nothing, signal=Signals.PING, sender=self.sender)
+        self.assertEqual([(double, 2), (self.recorder.nothing, None)],
+                         self.bus.send(signal=Signals.PING, sender=self.sender, data=1))
+        self.assertEqual([], self.bus.send(signal=Signals.PONG, sender=self.sender))
+
+    def test_senders_without_weak_references_are_held(self):
+        """
+        This test verifies that a sender that can't be weakly referenced is kept alive (so its ID can't be handed to
+        another object) until its last receiver is disconnected.
+        """
+        sender = object()
+        self.bus.connect(self.recorder.nothing, signal=Signals.PING, sender=sender)
+        self.assertIs(sender, self.bus._senders[id(sender)])
+        self.bus.disconnect(self.recorder.nothing, signal=Signals.PING, sender=sender)
+        self.assertNotIn(id(sender), self.bus._senders)
+
+    def test_events_are_sent_like_signals(self):
+        """
+        This test verifies receivers of an :py:class:`Event` get the same arguments they'd get from an ordinary signal
+        (plus the timestamp and the event itself, if they ask), and that the same event can be sent again.
+        """
+        for receiver in (self.recorder.data_only, self.recorder.event_only, self.recorder.signal_and_sender,
+                         self.recorder.nothing):
+            self.bus.connect(receiver, signal=Signals.PING, sender=self.sender)
+        everything = Recorder()
+        self.bus.connect(everything.everything, signal=Signals.PING, sender=self.sender)
+        event = Event(signal=Signals.PING, sender=self.sender)
+        for i in range(2):
+            event.data, event.timestamp = i, i * 10
+            self.bus.send_event(event)
+        self.assertEqual([0, (0, 0), (Signals.PING, self.sender), None,
+                          1, (1, 10), (Signals.PING, self.sender), None],
+                         self.recorder.received)
+        self.assertEqual({'signal': Signals.PING, 'sender': self.sender, 'data': 1, 'timestamp': 10, 'event': event},
+                         everything.received[-1])
+        self.assertFalse(hasattr(event, '__dict__'))
+
+
+if __name__ == '__main__':
+    unittest.main()
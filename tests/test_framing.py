@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+from cnxman.framing import (CobsFrameDecoder, DelimitedFrameDecoder, FixedSizeFrameDecoder, FrameDecoder,
+                            LengthPrefixedFrameDecoder, SlipFrameDecoder)
+
+
+def feed_bytewise(decoder, data: bytes):
+    """
+    Feed data to a decoder one byte at a time and collect all the frames.
+    """
+    frames = []
+    for i in range(len(data)):
+        frames.extend(decoder.feed(data[i:i + 1]))
+    return frames
+
+
+class TestFrameDecoders(unittest.TestCase):
+    """
+    These test cases test the frame decoders in :py:mod:`cnxman.framing`.
+    """
+    payloads = [b'hello', b'', b'\x00\x01\xc0\xdb\xdc\xdd\x00', bytes(range(1, 255)) * 2, b'\x00' * 3]
+
+    def test_delimited_frames(self):
+        """
+        This test verifies that delimited frames are found whether they arrive together or a byte at a time.
+        """
+        data = b'one\r\ntwo\r\n\r\nthr'
+        self.assertEqual([b'one', b'two', b''], DelimitedFrameDecoder(b'\r\n').feed(data))
+        self.assertEqual([b'one\r\n', b'two\r\n', b'\r\n'],
+                         feed_bytewise(DelimitedFrameDecoder(b'\r\n', strip=False), data))
+
+    def test_delimited_frames_leave_partial_frames_pending(self):
+        """
+        This test verifies that a partial frame waits for the rest of its bytes.
+        """
+        decoder = DelimitedFrameDecoder()
+        self.assertEqual([], decoder.feed(b'par'))
+        self.assertEqual(3, decoder.pending)
+        self.assertEqual([b'partial'], decoder.feed(b'tial\nnext'))
+        self.assertEqual(4, decoder.pending)
+
+    def test_oversized_delimited_frames_are_discarded(self):
+        """
+        This test verifies that a frame larger than the maximum is discarded and the decoder resynchronizes at the
+        next delimiter.
+        """
+        decoder = DelimitedFrameDecoder(max_frame_size=8)
+        self.assertEqual([], decoder.feed(b'0123456789'))
+        self.assertEqual([b'ok'], decoder.feed(b'abc\nok\n'))
+        self.assertEqual(14, decoder.discarded)
+
+    def test_fixed_size_frames(self):
+        """
+        This test verifies fixed-size frames are cut at the right boundaries.
+        """
+        decoder = FixedSizeFrameDecoder(4)
+        self.assertEqual([b'abcd'], decoder.feed(b'abcdef'))
+        self.assertEqual([b'efgh', b'ijkl'], decoder.feed(b'ghijklm'))
+
+    def test_length_prefixed_frames(self):
+        """
+        This test verifies length-prefixed frames survive a round trip through the encoder and decoder.
+        """
+        for decoder in [LengthPrefixedFrameDecoder(),
+                        LengthPrefixedFrameDecoder(header_size=4, byteorder='little', include_header=True)]:
+            data = b''.join(decoder.encode(p) for p in self.payloads)
+            self.assertEqual(self.payloads, feed_bytewise(decoder, data))
+
+    def test_slip_frames(self):
+        """
+        This test verifies SLIP frames survive a round trip through the encoder and decoder.
+        """
+        decoder = SlipFrameDecoder()
+        data = b''.join(decoder.encode(p) for p in self.payloads)
+        # SLIP doesn't report empty frames.
+        self.assertEqual([p for p in self.payloads if p], feed_bytewise(decoder, data))
+
+    def test_cobs_frames(self):
+        """
+        This test verifies COBS frames survive a round trip through the encoder and decoder.
+        """
+        decoder = CobsFrameDecoder()
+        payloads = self.payloads + [bytes(range(1, 255)), bytes(range(1, 255)) + b'\x00']
+        data = b''.join(decoder.encode(p) for p in payloads)
+        self.assertEqual(payloads, decoder.feed(data))
+        self.assertEqual(payloads, feed_bytewise(CobsFrameDecoder(), data))
+        self.assertEqual(b'\x03\x11\x22\x02\x33\x00', decoder.encode(b'\x11\x22\x00\x33'))
+
+    def test_decoders_must_encode(self):
+        """
+        This test verifies a decoder that doesn't say how to encode frames can't be created.
+        """
+        class DecodeOnly(FrameDecoder):
+            def _decode(self, buffer: bytearray, frames) -> int:
+                return 0
+        with self.assertRaises(TypeError):
+            DecodeOnly()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+from enum import Enum
+from cnxman.basics import Connection, FastConnectionManager, ManagerState
+from cnxman.events import dispatcher
+from cnxman.heartbeat import HeartbeatMonitor
+from cnxman.scheduling import Backoff, Scheduler
+from tests.test_basics import FlakyConnection
+
+
+class ChattyConnection(FlakyConnection):
+    """
+    This is a connection that says something whenever it's told to.
+    """
+    class Signals(Enum):
+        DATA_RECEIVED = 'data-received'
+
+    def __init__(self):
+        super().__init__(failures=0)
+        self.alarms = threading.Semaphore(0)
+        dispatcher.connect(self._handle_raise_alarm, signal=Connection.Signals.RAISE_ALARM, sender=self)
+
+    def _handle_raise_alarm(self):
+        self.alarms.release()
+
+    def speak(self):
+        dispatcher.send(signal=ChattyConnection.Signals.DATA_RECEIVED, sender=self, data=b'hello')
+
+
+class TestHeartbeatMonitor(unittest.TestCase):
+    """
+    These test cases test the :py:class:`HeartbeatMonitor` class.
+    """
+    def setUp(self):
+        self.scheduler = Scheduler(max_workers=2)
+        self.monitor = HeartbeatMonitor(scheduler=self.scheduler)
+
+    def tearDown(self):
+        self.monitor.stop()
+        self.scheduler.stop()
+
+    def test_silence_raises_the_alarm(self):
+        """
+        This test verifies a connection that goes quiet has its alarm raised.
+        """
+        connection = ChattyConnection()
+        heartbeat = self.monitor.watch(connection, silence=0.05)
+        self.assertTrue(connection.alarms.acquire(timeout=2))
+        self.assertEqual(1, heartbeat.alarms)
+
+    def test_activity_keeps_the_alarm_quiet(self):
+        """
+        This test verifies a connection that keeps talking doesn't have its alarm raised.
+        """
+        connection = ChattyConnection()
+        self.monitor.watch(connection, silence=0.1)
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            connection.speak()
+            time.sleep(0.01)
+        self.assertFalse(connection.alarms.acquire(timeout=0))
+
+    def test_failed_probes_raise_the_alarm(self):
+        """
+        This test verifies a probe that fails (or raises an exception) raises the alarm each time.
+        """
+        connection = ChattyConnection()
+        outcomes = iter([True, False, True])
+
+        def probe(c: Connection) -> bool:
+            try:
+                return next(outcomes)
+            except StopIteration:
+                raise RuntimeError('The probe is broken.')
+        self.monitor.watch(connection, interval=0.01, probe=probe)
+        self.assertTrue(connection.alarms.acquire(timeout=2))
+        self.assertTrue(connection.alarms.acquire(timeout=2))
+
+    def test_unwatched_connections_are_left_alone(self):
+        """
+        This test verifies we stop checking a connection once we're told to.
+        """
+        connection = ChattyConnection()
+        self.monitor.watch(connection, silence=0.05)
+        self.monitor.unwatch(connection)
+        self.assertNotIn(connection, self.monitor)
+        self.assertFalse(connection.alarms.acquire(timeout=0.15))
+
+    def test_manager_reconnects_a_silent_connection(self):
+        """
+        This test verifies a manager answers a heartbeat's alarm by reconnecting.
+        """
+        connection = ChattyConnection()
+        manager = FastConnectionManager(connection, backoff=Backoff(initial=0.01, jitter=0), scheduler=self.scheduler)
+        manager.connect()
+        self.assertIs(ManagerState.CONNECTED, manager.state)
+        self.monitor.watch(connection, silence=0.05)
+        deadline = time.monotonic() + 2
+        while connection.attempts < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertGreaterEqual(connection.attempts, 2)
+        manager.teardown()
+
+    def test_many_connections_share_one_scheduler(self):
+        """
+        This test verifies a thousand connections are watched without a thread apiece.
+        """
+        connections = [ChattyConnection() for _ in range(1000)]
+        threads = threading.active_count()
+        for connection in connections:
+            self.monitor.watch(connection, silence=0.05)
+        self.assertEqual(1000, len(self.monitor))
+        for connection in connections:
+            self.assertTrue(connection.alarms.acquire(timeout=5))
+        self.assertLessEqual(threading.active_count(), threads + 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+import unittest
+import serial as pyserial
+from cnxman.basics import Connection
+from cnxman.events import dispatcher
+from cnxman.hub import SerialHub
+from cnxman.serial import SerialConnection
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+class Received(object):
+    """
+    This object records the data each connection receives.
+    """
+    def __init__(self, connections):
+        self.data = {connection: b'' for connection in connections}
+        self._handlers = []
+        for connection in connections:
+            def handle(data, sender):
+                self.data[sender] += data
+            self._handlers.append(handle)
+            dispatcher.connect(handle, signal=SerialConnection.Signals.DATA_RECEIVED, sender=connection)
+
+
+@unittest.skipUnless(hasattr(os, 'openpty'), 'These tests need pseudo-terminals.')
+class TestSerialHub(unittest.TestCase):
+    """
+    These test cases test the :py:class:`SerialHub` class with pseudo-terminals.
+    """
+    def setUp(self):
+        self.hub = SerialHub()
+        self.ptys = [os.openpty() for _ in range(8)]
+        self.connections = [SerialConnection(os.ttyname(slave), hub=self.hub) for _, slave in self.ptys]
+
+    def tearDown(self):
+        for connection in self.connections:
+            connection.teardown()
+        self.hub.close()
+        for master, slave in self.ptys:
+            os.close(master)
+            os.close(slave)
+
+    def test_many_ports_one_thread(self):
+        """
+        This test verifies one thread reads all the ports and each connection hears only its own port.
+        """
+        threads = threading.active_count()
+        received = Received(self.connections)
+        for connection in self.connections:
+            self.assertTrue(connection.try_connect())
+        self.assertEqual(threads + 1, threading.active_count())
+        self.assertEqual(len(self.connections), self.hub.ports)
+        for i, (master, _) in enumerate(self.ptys):
+            os.write(master, b'port %d' % i)
+        self.assertTrue(wait_for(lambda: all(received.data.values())))
+        self.assertEqual([b'port %d' % i for i in range(len(self.ptys))],
+                         [received.data[connection] for connection in self.connections])
+
+    def test_disconnected_ports_are_released(self):
+        """
+        This test verifies the hub lets go of a port when its connection disconnects.
+        """
+        connection = self.connections[0]
+        self.assertTrue(connection.try_connect())
+        connection.disconnect()
+        self.assertEqual(0, self.hub.ports)
+        self.assertIsNone(connection.serial)
+
+    def test_read_errors_raise_the_alarm(self):
+        """
+        This test verifies a connection raises the alarm when its port goes away.
+        """
+        alarms = []
+
+        def handle(sender):
+            alarms.append(sender)
+        dispatcher.connect(handle, signal=Connection.Signals.RAISE_ALARM)
+        try:
+            connection = self.connections[0]
+            self.assertTrue(connection.try_connect())
+            master, slave = self.ptys.pop(0)
+            os.close(master)
+            os.close(slave)
+            self.assertTrue(wait_for(lambda: alarms))
+            self.assertEqual([connection], alarms)
+        finally:
+            dispatcher.disconnect(handle, signal=Connection.Signals.RAISE_ALARM)
+
+
+class TestSerialHubPolling(unittest.TestCase):
+    """
+    These test cases test the :py:class:`SerialHub` class with ports that don't have file descriptors.
+    """
+    def test_loopback_ports_are_polled(self):
+        """
+        This test verifies the hub reads loopback ports (which it has to poll).
+        """
+        hub = SerialHub(poll_interval=0.001)
+        connections = [SerialConnection('loop://', hub=hub) for _ in range(2)]
+        received = Received(connections)
+        for i, connection in enumerate(connections):
+            self.assertTrue(connection.try_connect())
+            connection.serial.write(b'loop %d' % i)
+        self.assertTrue(wait_for(lambda: all(received.data.values())))
+        for connection in connections:
+            connection.teardown()
+        hub.close()
+        self.assertEqual([b'loop 0', b'loop 1'], [received.data[connection] for connection in connections])
+
+    def test_ports_that_fail_are_reconnected(self):
+        """
+        This test verifies a port the hub can no longer read is released, so that reconnecting opens it again (and the
+        hub reads the new one).
+        """
+        hub = SerialHub(poll_interval=0.001)
+        connection = SerialConnection('loop://', hub=hub)
+        received = Received([connection])
+        alarms = threading.Event()
+
+        def handle():
+            alarms.set()
+        dispatcher.connect(handle, signal=Connection.Signals.RAISE_ALARM, sender=connection)
+        try:
+            self.assertTrue(connection.try_connect())
+            failed = connection.serial
+
+            def read(size=1):
+                raise pyserial.SerialException('The port went away.')
+            failed.read = read
+            failed.write(b'lost')
+            self.assertTrue(alarms.wait(2))
+            self.assertIsNone(connection.serial)
+            self.assertFalse(failed.is_open)
+            self.assertEqual(0, hub.ports)
+            self.assertTrue(connection.try_connect())
+            self.assertIsNot(failed, connection.serial)
+            self.assertEqual(1, hub.ports)
+            connection.serial.write(b'found')
+            self.assertTrue(wait_for(lambda: received.data[connection] == b'found'))
+        finally:
+            dispatcher.disconnect(handle, signal=Connection.Signals.RAISE_ALARM, sender=connection)
+            connection.teardown()
+            hub.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
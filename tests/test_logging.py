@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import logging
+import threading
 import unittest
-from cnxman.logging import loggable_class as loggable
+from cnxman.logging import BackgroundLogging, loggable_class as loggable, rate_limit, RateLimitFilter
 
 
 class TestLoggable(unittest.TestCase):
@@ -40,3 +42,110 @@ class TestLoggable(unittest.TestCase):
         self.assertTrue(hasattr(test_obj, 'logger'))
         # Verify the test object logger's name meets the value we supplied.
         self.assertTrue('yabba.dabba.doo', test_obj.logger.name)
+
+    def test_loggers_are_rate_limited(self):
+        """
+        This test verifies a class's logger is a real logger (once it's been asked for) that passes its records through
+        the rate limit.
+        """
+        @loggable(logger_name='cnxman.tests.limited')
+        class TestClass(object):
+            pass
+        logger = TestClass().logger
+        self.assertIsInstance(logger, logging.Logger)
+        self.assertIs(logger, TestClass.__dict__['logger'])
+        self.assertIn(rate_limit, logger.filters)
+
+
+class RecordingHandler(logging.Handler):
+    """
+    This handler keeps the records it's given (and notes the threads on which it was given them).
+    """
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.records.append(record)
+        self.threads.add(threading.current_thread())
+
+
+class TestRateLimitFilter(unittest.TestCase):
+    """
+    These test cases test the :py:class:`RateLimitFilter` class.
+    """
+    @staticmethod
+    def record(msg: str, *args) -> logging.LogRecord:
+        return logging.LogRecord('cnxman.tests', logging.ERROR, __file__, 1, msg, args, None)
+
+    def test_bursts_are_let_through_and_the_rest_are_counted(self):
+        """
+        This test verifies identical messages beyond the burst are held back (and counted when the next period starts),
+        while different messages are counted separately.
+        """
+        limit = RateLimitFilter(burst=2, period=0.05)
+        self.assertEqual([True, True, False, False],
+                         [limit.filter(self.record('%s failed.', 'COM1')) for _ in range(4)])
+        self.assertTrue(limit.filter(self.record('%s failed.', 'COM2')))
+        threading.Event().wait(0.06)
+        record = self.record('%s failed.', 'COM1')
+        self.assertTrue(limit.filter(record))
+        self.assertEqual(2, record.suppressed)
+        self.assertEqual('COM1 failed. (2 more like this were suppressed)', record.getMessage())
+
+    def test_changing_arguments_are_limited(self):
+        """
+        This test verifies messages from the same source are held back however their other arguments change.
+        """
+        limit = RateLimitFilter(burst=3, period=60)
+        self.assertEqual([True] * 3 + [False] * 97,
+                         [limit.filter(self.record('%s sent %d bytes.', 'COM1', n)) for n in range(100)])
+        records = [self.record('Could not read: %s', 'error %d' % n) for n in range(5)]
+        for record in records:
+            record.source = 'COM1'
+        self.assertEqual([True] * 3 + [False] * 2, [limit.filter(record) for record in records])
+
+    def test_messages_are_forgotten_least_recent_first(self):
+        """
+        This test verifies the filter keeps track of a bounded number of messages, forgetting the least recent first.
+        """
+        limit = RateLimitFilter(burst=1, period=60)
+        limit._max_keys = 2
+        for msg in ('one', 'two', 'one', 'three'):
+            limit.filter(self.record(msg))
+        self.assertEqual(['one', 'three'], [key[2] for key in limit._counts])
+
+    def test_invalid_arguments(self):
+        """
+        This test verifies nonsensical bursts and periods are refused.
+        """
+        with self.assertRaises(ValueError):
+            RateLimitFilter(burst=0)
+        with self.assertRaises(ValueError):
+            RateLimitFilter(period=0)
+
+
+class TestBackgroundLogging(unittest.TestCase):
+    """
+    These test cases test the :py:class:`BackgroundLogging` class.
+    """
+    def test_records_are_handled_on_another_thread(self):
+        """
+        This test verifies records are handed to the handlers on a thread of their own, and that the logger is put back
+        the way it was afterward.
+        """
+        handler = RecordingHandler()
+        logger = logging.getLogger('cnxman.tests.background')
+        with BackgroundLogging(handler, level=logging.INFO, logger_name='cnxman.tests.background'):
+            self.assertFalse(logger.propagate)
+            logger.debug('Nobody wants to hear this.')
+            logger.info('Hello from %s.', 'here')
+        self.assertTrue(logger.propagate)
+        self.assertEqual(logging.NOTSET, logger.level)
+        self.assertEqual(['Hello from here.'], [record.getMessage() for record in handler.records])
+        self.assertNotIn(threading.current_thread(), handler.threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
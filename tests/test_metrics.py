@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import unittest
+from cnxman.basics import ConnectionManager, ManagerState
+from cnxman.metrics import MetricsRegistry, registry
+from cnxman.scheduling import Backoff, Scheduler
+from cnxman.serial import SerialConnection
+from tests.test_basics import FlakyConnection
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """
+    These test cases test the :py:class:`MetricsRegistry` class.
+    """
+    def setUp(self):
+        self.registry = MetricsRegistry(enabled=True)
+
+    def test_same_name_and_labels_get_the_same_metric(self):
+        """
+        This test verifies the registry hands back the metric it already has (and a new one for new labels).
+        """
+        counter = self.registry.counter('reads_total', port='a')
+        self.assertIs(counter, self.registry.counter('reads_total', port='a'))
+        self.assertIsNot(counter, self.registry.counter('reads_total', port='b'))
+
+    def test_histogram_buckets_are_cumulative(self):
+        """
+        This test verifies observations land in the right buckets, and the buckets are reported cumulatively.
+        """
+        histogram = self.registry.histogram('sizes', buckets=(1, 10, 100))
+        for value in (1, 5, 50, 500):
+            histogram.observe(value)
+        self.assertEqual(((1, 1), (10, 2), (100, 3), (float('inf'), 4)), histogram.buckets())
+        self.assertEqual(4, histogram.count)
+        self.assertEqual(556, histogram.sum)
+
+    def test_snapshot(self):
+        """
+        This test verifies a snapshot reports every metric by its key.
+        """
+        self.registry.counter('reads_total', port='/dev/ttyS0').inc(3)
+        self.registry.histogram('sizes', buckets=(10,)).observe(4)
+        self.assertEqual({
+            'counters': {'reads_total{port="/dev/ttyS0"}': 3},
+            'histograms': {'sizes': {'count': 1, 'sum': 4, 'buckets': [[10, 1], [float('inf'), 1]]}}
+        }, self.registry.snapshot())
+
+    def test_to_prometheus(self):
+        """
+        This test verifies the Prometheus text format.
+        """
+        self.registry.counter('reads_total', 'reads', port='a').inc()
+        self.registry.histogram('sizes', buckets=(10,)).observe(4)
+        self.assertEqual('# HELP reads_total reads\n'
+                         '# TYPE reads_total counter\n'
+                         'reads_total{port="a"} 1\n'
+                         '# TYPE sizes histogram\n'
+                         'sizes_bucket{le="10"} 1\n'
+                         'sizes_bucket{le="+Inf"} 1\n'
+                         'sizes_sum 4.0\n'
+                         'sizes_count 1\n',
+                         self.registry.to_prometheus())
+
+
+class TestInstrumentation(unittest.TestCase):
+    """
+    These test cases verify cnxman records metrics in the shared registry (when it's enabled).
+    """
+    def setUp(self):
+        registry.clear()
+        registry.enable()
+
+    def tearDown(self):
+        registry.disable()
+        registry.clear()
+
+    @staticmethod
+    def _wait_for(condition, timeout: float = 2.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            if time.monotonic() > deadline:
+                return False
+            time.sleep(0.001)
+        return True
+
+    def test_manager_records_states_alarms_and_attempts(self):
+        """
+        This test verifies managers count the states they enter, the time they spend in them and their attempts to
+        reconnect, and that connections count their alarms.
+        """
+        scheduler = Scheduler()
+        connection = FlakyConnection(failures=2)
+        manager = ConnectionManager(connection, backoff=Backoff(initial=0.01, jitter=0), scheduler=scheduler)
+        manager.connect()
+        self.assertTrue(self._wait_for(lambda: manager.state is ManagerState.CONNECTED))
+        # Once we're connected, the connection raises the alarm and the manager gets it back.
+        connection.raise_alarm()
+        self.assertTrue(self._wait_for(lambda: connection.attempts == 4 and manager.state is ManagerState.CONNECTED))
+        manager.teardown()
+        scheduler.stop()
+        counters = registry.snapshot()['counters']
+        self.assertEqual(1, counters['cnxman_alarms_raised_total{connection="FlakyConnection"}'])
+        self.assertEqual(3, counters['cnxman_reconnect_attempts_total{connection="FlakyConnection"}'])
+        self.assertEqual(3, counters['cnxman_manager_transitions_total{connection="FlakyConnection",state="recovering"}'])
+        self.assertEqual(1, counters['cnxman_manager_transitions_total{connection="FlakyConnection",state="torndown"}'])
+        histograms = registry.snapshot()['histograms']
+        self.assertEqual(4, histograms['cnxman_manager_state_seconds{connection="FlakyConnection",state="connecting"}']
+                         ['count'])
+
+    def test_serial_listener_counts_bytes(self):
+        """
+        This test verifies serial listeners count the bytes they read.
+        """
+        connection = SerialConnection('loop://')
+        connection.try_connect()
+        counter = registry.counter('cnxman_serial_bytes_read_total', port=connection.serial.port)
+        connection.serial.write(b'hello')
+        self._wait_for(lambda: counter.value >= 5)
+        connection.teardown()
+        self.assertEqual(5, counter.value)
+
+    def test_nothing_is_recorded_while_disabled(self):
+        """
+        This test verifies the instrumented code leaves the registry alone while it's disabled.
+        """
+        registry.disable()
+        FlakyConnection(failures=0).raise_alarm()
+        self.assertEqual({}, registry.snapshot()['counters'])
+
+
+if __name__ == '__main__':
+    unittest.main()
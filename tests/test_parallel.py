@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+from cnxman.events import dispatcher
+from cnxman.framing import DelimitedFrameDecoder
+from cnxman.metrics import registry
+from cnxman.parallel import ParallelDecoder
+from cnxman.scheduling import Scheduler
+from cnxman.serial import SerialConnection
+from tests.test_hub import wait_for
+
+
+def parse(payload: bytes) -> int:
+    """
+    This is the decoding function the worker processes run.
+    """
+    return int(payload)
+
+
+class TestParallelDecoder(unittest.TestCase):
+    """
+    These test cases test the :py:class:`ParallelDecoder` class.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.decoder = ParallelDecoder(parse, max_workers=2, batch_size=8)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.decoder.shutdown()
+
+    def test_batches(self):
+        """
+        This test verifies payloads are split into batches and decoded.
+        """
+        futures = self.decoder.submit([b'%d' % i for i in range(20)])
+        self.assertEqual(3, len(futures))
+        self.assertEqual(list(range(20)), [n for future in futures for n in future.result(10)])
+
+    def test_shared_memory_is_reused(self):
+        """
+        This test verifies one batch after another goes through the same block of shared memory, which is only replaced
+        when a batch won't fit in it.
+        """
+        decoder = ParallelDecoder(parse, batch_size=8, executor=self.decoder._get_executor())
+        names = set()
+        for payloads in ([b'1', b'22'], [b'333'], [b'4444']):
+            self.assertEqual([int(p) for p in payloads], decoder.submit(payloads)[0].result(10))
+            self.assertTrue(wait_for(lambda: decoder._free_blocks))
+            names.update(block.name for block in decoder._free_blocks)
+        self.assertEqual(1, len(names))
+        self.assertEqual([int(b'7' * 1000)], decoder.submit([b'7' * 1000])[0].result(10))
+        self.assertTrue(wait_for(lambda: decoder._free_blocks))
+        self.assertEqual(1, len(decoder._free_blocks))
+        self.assertNotIn(decoder._free_blocks[0].name, names)
+        decoder.shutdown()
+        self.assertEqual([], decoder._free_blocks)
+
+    def test_stream_delivers_in_order(self):
+        """
+        This test verifies a stream delivers results in the order the payloads were submitted.
+        """
+        results = []
+        done = threading.Event()
+
+        def deliver(n):
+            results.append(n)
+            if len(results) == 500:
+                done.set()
+        stream = self.decoder.stream(deliver)
+        for start in range(0, 500, 50):
+            stream.submit([b'%d' % i for i in range(start, start + 50)])
+        self.assertTrue(done.wait(10))
+        self.assertEqual(list(range(500)), results)
+        self.assertEqual(0, stream.pending)
+
+    def test_errors_are_reported(self):
+        """
+        This test verifies a batch that can't be decoded is reported, and the batches after it are still delivered.
+        """
+        results = []
+        errors = []
+        done = threading.Event()
+
+        def deliver(n):
+            results.append(n)
+            done.set()
+        stream = self.decoder.stream(deliver, on_error=errors.append)
+        stream.submit([b'not a number'])
+        stream.flush()
+        stream.submit([b'1'])
+        self.assertTrue(done.wait(10))
+        self.assertEqual([1], results)
+        self.assertEqual([ValueError], [type(error) for error in errors])
+
+    def test_small_reads_are_batched(self):
+        """
+        This test verifies payloads submitted one read at a time go to the workers together, once the batch is full or
+        the first of them has waited long enough.
+        """
+        results = []
+        done = threading.Event()
+
+        def deliver(n):
+            results.append(n)
+            if len(results) == 11:
+                done.set()
+        scheduler = Scheduler()
+        decoder = ParallelDecoder(parse, max_workers=1, batch_size=8, max_delay=0.05,
+                                  executor=self.decoder._get_executor(), scheduler=scheduler)
+        stream = decoder.stream(deliver)
+        registry.clear()
+        registry.enable()
+        try:
+            for i in range(11):
+                stream.submit([b'%d' % i])
+            self.assertEqual((3, 1), (stream.waiting, len(scheduler)))
+            self.assertTrue(done.wait(10))
+            batches = registry.snapshot()['counters']['cnxman_parallel_batches_total']
+        finally:
+            registry.disable()
+            registry.clear()
+            scheduler.stop()
+        self.assertEqual(list(range(11)), results)
+        self.assertEqual(2, batches)
+        self.assertEqual((0, 0), (stream.pending, stream.waiting))
+
+    def test_invalid_delay(self):
+        """
+        This test verifies a decoder won't hold on to payloads for a negative time.
+        """
+        with self.assertRaises(ValueError):
+            ParallelDecoder(parse, max_delay=-1)
+
+
+class TestSerialConnectionDecoding(unittest.TestCase):
+    """
+    These test cases test decoding a :py:class:`SerialConnection`'s frames in parallel.
+    """
+    def test_decoded_frames_are_signalled(self):
+        """
+        This test writes frames to a loopback port and verifies the decoded frames are signalled in order.
+        """
+        results = []
+        done = threading.Event()
+
+        def handle(decoded):
+            results.append(decoded)
+            if len(results) == 100:
+                done.set()
+        decoder = ParallelDecoder(parse, max_workers=2, batch_size=4)
+        connection = SerialConnection('loop://', timeout=0.05,
+                                      frame_decoder=DelimitedFrameDecoder(),
+                                      parallel_decoder=decoder)
+        dispatcher.connect(handle, signal=SerialConnection.Signals.DECODED, sender=connection)
+        self.assertTrue(connection.try_connect())
+        connection.serial.write(b''.join(b'%d\n' % i for i in range(100)))
+        self.assertTrue(done.wait(10))
+        connection.teardown()
+        decoder.shutdown()
+        self.assertEqual(list(range(100)), results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+from cnxman.basics import Connection, ConnectionException
+from cnxman.pool import ConnectionPool
+from cnxman.scheduling import Backoff, Scheduler
+
+
+class CountingConnection(Connection):
+    """
+    This is a connection that keeps track of what has been done to it.
+    """
+    def __init__(self, succeed: bool = True):
+        self.succeed = succeed
+        self.healthy = True
+        self.attempts = 0
+        self.torndown = False
+
+    def try_connect(self) -> bool:
+        self.attempts += 1
+        return self.succeed and self.healthy
+
+    def disconnect(self):
+        pass
+
+    def teardown(self):
+        self.torndown = True
+
+
+class TestConnectionPool(unittest.TestCase):
+    """
+    These test cases test the :py:class:`ConnectionPool` class.
+    """
+    def setUp(self):
+        self.scheduler = Scheduler()
+        self.created = []
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def _factory(self, succeed: bool = True):
+        def create():
+            connection = CountingConnection(succeed=succeed)
+            self.created.append(connection)
+            return connection
+        return create
+
+    def _pool(self, **kwargs) -> ConnectionPool:
+        return ConnectionPool(self._factory(kwargs.pop('succeed', True)),
+                              backoff=Backoff(initial=60),
+                              scheduler=self.scheduler,
+                              **kwargs)
+
+    def test_connections_are_reused(self):
+        """
+        This test verifies that a connection that's checked back in is handed out again.
+        """
+        pool = self._pool(max_size=2)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            self.assertIs(first, second)
+        self.assertEqual(1, len(self.created))
+        self.assertEqual((1, 1, 0), (pool.size, pool.idle, pool.in_use))
+
+    def test_fill_opens_warm_connections(self):
+        """
+        This test verifies that filling the pool opens its minimum number of connections.
+        """
+        pool = self._pool(min_size=3, max_size=5)
+        pool.fill()
+        self.assertEqual((3, 3), (pool.size, pool.idle))
+
+    def test_checkout_waits_for_a_connection(self):
+        """
+        This test verifies that a full pool makes callers wait (and eventually time out).
+        """
+        pool = self._pool(max_size=1)
+        connection = pool.checkout()
+        with self.assertRaises(ConnectionException):
+            pool.checkout(timeout=0.01)
+        threading.Timer(0.05, pool.checkin, args=(connection,)).start()
+        self.assertIs(connection, pool.checkout(timeout=2))
+
+    def test_unhealthy_connections_are_replaced(self):
+        """
+        This test verifies that an idle connection that fails its health check is torn down and replaced.
+        """
+        pool = self._pool()
+        connection = pool.checkout()
+        pool.checkin(connection)
+        connection.healthy = False
+        replacement = pool.checkout()
+        self.assertIsNot(connection, replacement)
+        self.assertTrue(connection.torndown)
+        self.assertEqual(1, pool.size)
+
+    def test_failed_connections_are_reported(self):
+        """
+        This test verifies that a connection that can't be made raises an exception and doesn't take up room.
+        """
+        pool = self._pool(succeed=False, idle_timeout=None)
+        with self.assertRaises(ConnectionException):
+            pool.checkout()
+        self.assertEqual(0, pool.size)
+        self.assertEqual(0, len(self.scheduler))
+
+    def test_idle_connections_are_pruned(self):
+        """
+        This test verifies that connections idle for too long are torn down, but never below the minimum size.
+        """
+        pool = self._pool(min_size=1, idle_timeout=0)
+        connections = [pool.checkout() for _ in range(3)]
+        for connection in connections:
+            pool.checkin(connection)
+        pool.prune()
+        self.assertEqual(1, pool.size)
+        self.assertEqual([True, True, False], [c.torndown for c in connections])
+        pool.close()
+        self.assertTrue(connections[2].torndown)
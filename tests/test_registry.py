@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from cnxman.basics import ManagerState
+from cnxman.buffers import OverflowPolicy
+from cnxman.registry import ConnectionRegistry
+from cnxman.scheduling import Scheduler
+from cnxman.serial import SerialConnection
+from tests.test_basics import FlakyConnection
+
+
+class SlowConnection(FlakyConnection):
+    """
+    This is a connection that takes its time to connect (or to fail to connect).
+    """
+    def __init__(self, failures: int = 0, delay: float = 0.2):
+        super().__init__(failures=failures)
+        self.delay = delay
+
+    def try_connect(self) -> bool:
+        time.sleep(self.delay)
+        return super().try_connect()
+
+
+class StuckConnection(FlakyConnection):
+    """
+    This is a connection that never finishes shutting down.
+    """
+    def __init__(self):
+        super().__init__(failures=0)
+        self.release = threading.Event()
+
+    def shutdown(self, timeout: float = None) -> bool:
+        self.release.wait()
+        return True
+
+
+class RecordingConnection(FlakyConnection):
+    """
+    This is a connection that records the threads it's shut down on.
+    """
+    def __init__(self, threads: set):
+        super().__init__(failures=0)
+        self.threads = threads
+
+    def shutdown(self, timeout: float = None) -> bool:
+        self.threads.add(threading.current_thread().name)
+        time.sleep(0.01)
+        return super().shutdown(timeout=timeout)
+
+
+class TestConnectionRegistry(unittest.TestCase):
+    """
+    These test cases test the :py:class:`ConnectionRegistry` class.
+    """
+    def setUp(self):
+        self.scheduler = Scheduler(max_workers=2)
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.scheduler.stop()
+        self.directory.cleanup()
+
+    def _write(self, filename: str, text: str) -> str:
+        path = os.path.join(self.directory.name, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def test_connections_are_built_from_json(self):
+        """
+        This test verifies connections are built (with the defaults filled in) from a JSON file.
+        """
+        path = self._write('connections.json', json.dumps({
+            'defaults': {'type': 'serial', 'baudrate': 115200},
+            'connections': [
+                {'name': 'gps', 'port': 'loop://', 'baudrate': 4800, 'buffer_size': 1024,
+                 'overflow_policy': 'drop_oldest'},
+                {'name': 'modem', 'port': 'loop://',
+                 'manager': {'backoff': {'initial': 0.01, 'jitter': 0}, 'min_interval': 0.5}}
+            ]
+        }))
+        connections = ConnectionRegistry.load(path, scheduler=self.scheduler)
+        self.assertEqual(['gps', 'modem'], list(connections))
+        gps = connections['gps']
+        self.assertIsInstance(gps, SerialConnection)
+        self.assertEqual(4800, gps._baudrate)
+        self.assertIs(OverflowPolicy.DROP_OLDEST, gps._overflow_policy)
+        self.assertEqual(115200, connections['modem']._baudrate)
+        self.assertEqual(0.5, connections.manager('modem')._min_interval)
+
+    def test_connections_are_built_from_toml(self):
+        """
+        This test verifies connections are built from a TOML file (whose connections are a table of tables).
+        """
+        try:
+            import tomllib  # noqa: F401
+        except ImportError:
+            self.skipTest('This Python cannot read TOML.')
+        path = self._write('connections.toml', '\n'.join([
+            '[connections.first]',
+            'type = "tests.test_basics.FlakyConnection"',
+            'failures = 0',
+            '[connections.second]',
+            'type = "tests.test_basics.FlakyConnection"',
+            'failures = 3'
+        ]))
+        connections = ConnectionRegistry.load(path, scheduler=self.scheduler)
+        self.assertEqual(3, connections['second'].failures)
+
+    def test_bad_definitions_are_refused(self):
+        """
+        This test verifies definitions we can't make sense of are refused.
+        """
+        with self.assertRaises(ValueError):
+            ConnectionRegistry.from_config({'connections': [{'name': 'nameless'}]})
+        with self.assertRaises(ValueError):
+            ConnectionRegistry.from_config({'connections': [{'name': 'x', 'type': 'carrier-pigeon'}]})
+        with self.assertRaises(ValueError):
+            ConnectionRegistry.from_config({'connections': [{'name': 'x', 'type': 'tests.test_basics.FlakyConnection',
+                                                             'pigeons': 3}]})
+        with self.assertRaises(ValueError):
+            ConnectionRegistry.load(self._write('connections.ini', '[gps]'))
+        connections = ConnectionRegistry(scheduler=self.scheduler)
+        connections.add('twin', FlakyConnection, failures=0)
+        with self.assertRaises(ValueError):
+            connections.add('twin', FlakyConnection, failures=0)
+
+    def test_connections_are_started_side_by_side(self):
+        """
+        This test verifies slow connections are started at the same time (and their start-up times reported), and
+        the ones that don't come up are left recovering.
+        """
+        ConnectionRegistry.register_type('slow', SlowConnection)
+        connections = ConnectionRegistry.from_config({
+            'defaults': {'type': 'slow', 'manager': {'backoff': {'initial': 60}}},
+            'connections': {'port{n}'.format(n=n): {'failures': n % 2} for n in range(20)}
+        }, scheduler=self.scheduler)
+        started = time.monotonic()
+        startups = connections.start(max_concurrent=20)
+        self.assertLess(time.monotonic() - started, 2.0)  # (One at a time, it would take four seconds.)
+        self.assertEqual(20, len(startups))
+        for n in range(20):
+            startup = startups['port{n}'.format(n=n)]
+            self.assertGreaterEqual(startup.seconds, 0.2)
+            self.assertEqual(n % 2 == 0, startup.connected)
+            self.assertIs(ManagerState.RECOVERING if n % 2 else ManagerState.CONNECTED, startup.state)
+        self.assertEqual({}, connections.start())  # (They've all been started.)
+        connections.teardown()
+        self.assertIs(ManagerState.TORNDOWN, connections.manager('port0').state)
+
+
+    def test_shutdown_keeps_to_the_deadline(self):
+        """
+        This test verifies connections are shut down all at once, and a connection that won't finish doesn't hold up
+        the rest (or keep us past the deadline).
+        """
+        connections = ConnectionRegistry(scheduler=self.scheduler)
+        for n in range(10):
+            connections.add('slow{n}'.format(n=n), SlowConnection, delay=0)
+        stuck = connections.add('stuck', StuckConnection)
+        connections.start()
+        started = time.monotonic()
+        finished = connections.shutdown(timeout=0.2)
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertFalse(finished.pop('stuck'))
+        self.assertEqual({'slow{n}'.format(n=n): True for n in range(10)}, finished)
+        self.assertIs(ManagerState.TORNDOWN, connections.manager('slow0').state)
+        stuck.release.set()
+
+    def test_shutdown_uses_a_bounded_pool(self):
+        """
+        This test verifies connections are shut down on no more threads than we allow.
+        """
+        connections = ConnectionRegistry(scheduler=self.scheduler)
+        threads = set()
+        for n in range(10):
+            connections.add('port{n}'.format(n=n), RecordingConnection, threads=threads)
+        connections.start()
+        finished = connections.shutdown(timeout=5, max_concurrent=2)
+        self.assertEqual({'port{n}'.format(n=n): True for n in range(10)}, finished)
+        self.assertLessEqual(len(threads), 2)
+        with self.assertRaises(ValueError):
+            connections.shutdown(max_concurrent=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+from cnxman.scheduling import Backoff, CircuitBreaker, Scheduler
+
+
+class TestBackoff(unittest.TestCase):
+    """
+    These test cases test the :py:class:`Backoff` class.
+    """
+    def test_delays_grow_exponentially_to_the_maximum(self):
+        """
+        This test verifies the delays double with each attempt until they reach the maximum.
+        """
+        backoff = Backoff(initial=1, multiplier=2, maximum=10, jitter=0)
+        self.assertEqual([1, 2, 4, 8, 10, 10], [backoff.delay(a) for a in range(1, 7)])
+        self.assertEqual(10, backoff.delay(10000))
+
+    def test_jitter(self):
+        """
+        This test verifies that jittered delays stay within bounds.
+        """
+        backoff = Backoff(initial=10, jitter=0.5)
+        delays = [backoff.delay(1) for _ in range(100)]
+        self.assertTrue(all(5 <= d <= 15 for d in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """
+    These test cases test the :py:class:`CircuitBreaker` class.
+    """
+    def test_concurrent_attempts_are_capped(self):
+        """
+        This test verifies no more than the maximum number of attempts are let through at once.
+        """
+        breaker = CircuitBreaker(max_concurrent=2)
+        self.assertEqual([True, True, False], [breaker.acquire() for _ in range(3)])
+        breaker.release(success=False)
+        self.assertTrue(breaker.acquire())
+        self.assertEqual(2, breaker.in_flight)
+
+    def test_too_many_failures_open_the_breaker(self):
+        """
+        This test verifies that once enough attempts fail in a row, no attempts are let through until the cooldown is
+        over, after which they're let through one at a time until one succeeds.
+        """
+        breaker = CircuitBreaker(max_concurrent=10, failure_threshold=2, cooldown=0.05, retry_delay=0)
+        for _ in range(2):
+            self.assertTrue(breaker.acquire())
+            breaker.release(success=False)
+        self.assertTrue(breaker.is_open)
+        self.assertFalse(breaker.acquire())
+        self.assertGreater(breaker.retry_after(), 0)
+        threading.Event().wait(0.06)
+        self.assertTrue(breaker.acquire())
+        self.assertFalse(breaker.acquire())
+        breaker.release(success=True)
+        self.assertFalse(breaker.is_open)
+        self.assertEqual([True, True], [breaker.acquire() for _ in range(2)])
+
+
+class TestScheduler(unittest.TestCase):
+    """
+    These test cases test the :py:class:`Scheduler` class.
+    """
+    def test_calls_are_made_in_order(self):
+        """
+        This test schedules calls out of order and verifies they're made in order of their due times.
+        """
+        scheduler = Scheduler()
+        made = []
+        done = threading.Event()
+        scheduler.call_later(0.03, made.append, 3)
+        scheduler.call_later(0.01, made.append, 1)
+        cancelled = scheduler.call_later(0.02, made.append, 2)
+        scheduler.call_later(0.04, done.set)
+        cancelled.cancel()
+        self.assertTrue(done.wait(2))
+        scheduler.stop()
+        self.assertEqual([1, 3], made)
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import unittest
+import serial as pyserial
+from cnxman.events import dispatcher
+from cnxman.buffers import RingBuffer
+from cnxman.framing import DelimitedFrameDecoder
+from cnxman.basics import ConnectionException
+from cnxman.serial import SerialConnection, SerialListener, SerialWriter
+
+
+class TestSerialListener(unittest.TestCase):
+    """
+    These test cases test the :py:class:`SerialListener` class against a loopback serial port.
+    """
+    def setUp(self):
+        self.serial = pyserial.serial_for_url('loop://', timeout=0.05)
+        self.received = []
+        self.done = threading.Event()
+
+    def tearDown(self):
+        self.serial.close()
+
+    def _listen(self, listener: SerialListener, expected: int):
+        """
+        Start the listener and wait until it has delivered the expected number of bytes.
+        """
+        def handle(data):
+            self.received.append(data)
+            if sum(len(d) for d in self.received) >= expected:
+                self.done.set()
+        # Keep a reference to the handler so the dispatcher's weak reference stays alive.
+        self._handler = handle
+        dispatcher.connect(handle, signal=SerialListener.Signals.DATA_RECEIVED, sender=listener)
+        listener.start()
+        self.assertTrue(self.done.wait(2))
+        listener.terminate()
+        listener.join(2)
+
+    def test_waiting_bytes_are_delivered_in_one_chunk(self):
+        """
+        This test writes a block of data before the listener starts, then verifies it arrives in a single chunk.
+        """
+        self.serial.write(b'x' * 100)
+        listener = SerialListener(self.serial, chunk_size=4096)
+        self._listen(listener, expected=100)
+        self.assertEqual([b'x' * 100], self.received)
+
+    def test_chunk_size_is_respected(self):
+        """
+        This test verifies that no chunk is larger than the configured chunk size.
+        """
+        self.serial.write(bytes(range(100)))
+        listener = SerialListener(self.serial, chunk_size=32)
+        self._listen(listener, expected=100)
+        self.assertEqual([32, 32, 32, 4], [len(d) for d in self.received])
+        self.assertEqual(bytes(range(100)), b''.join(self.received))
+
+    def test_max_latency_gathers_late_bytes(self):
+        """
+        This test writes data in two bursts and verifies the listener's time window gathers both into one chunk.
+        """
+        listener = SerialListener(self.serial, chunk_size=4096, max_latency=0.5)
+        self.serial.write(b'abc')
+        threading.Timer(0.05, self.serial.write, args=(b'def',)).start()
+        self._listen(listener, expected=6)
+        self.assertEqual([b'abcdef'], self.received)
+
+    def test_invalid_chunk_size(self):
+        """
+        This test verifies that a chunk size of less than one byte is rejected.
+        """
+        with self.assertRaises(ValueError):
+            SerialListener(self.serial, chunk_size=0)
+
+    def test_buffered_data_is_dispatched_on_another_thread(self):
+        """
+        This test verifies that a listener with a buffer delivers its data from the dispatch thread.
+        """
+        threads = set()
+
+        def record_thread(data):
+            threads.add(threading.current_thread())
+        dispatcher.connect(record_thread, signal=SerialListener.Signals.DATA_RECEIVED, sender=dispatcher.Any)
+        try:
+            self.serial.write(b'x' * 100)
+            listener = SerialListener(self.serial, buffer=RingBuffer(16))
+            self._listen(listener, expected=100)
+        finally:
+            dispatcher.disconnect(record_thread, signal=SerialListener.Signals.DATA_RECEIVED, sender=dispatcher.Any)
+        self.assertEqual(b'x' * 100, b''.join(self.received))
+        self.assertTrue(all(len(d) <= 16 for d in self.received))
+        self.assertNotIn(listener, threads)
+
+    def test_stopping_drains_waiting_data(self):
+        """
+        This test verifies a listener that's told to stop gracefully stops waiting on the port at once, but sends along
+        whatever the port already had waiting (without complaining about a read error).
+        """
+        self.serial.timeout = None  # (Without a timeout, only cancelling the read can stop it.)
+        errors = []
+
+        def slow(data):
+            self.received.append(data)
+            time.sleep(0.01)
+
+        def handle_read_error():
+            errors.append(True)
+        listener = SerialListener(self.serial, chunk_size=10)
+        dispatcher.connect(slow, signal=SerialListener.Signals.DATA_RECEIVED, sender=listener)
+        dispatcher.connect(handle_read_error, signal=SerialListener.Signals.READ_ERROR, sender=listener)
+        listener.start()
+        self.serial.write(bytes(range(100)))
+        started = time.monotonic()
+        self.assertTrue(listener.stop(timeout=2))
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(bytes(range(100)), b''.join(self.received))
+        self.assertEqual([], errors)
+        self.assertFalse(self.serial.is_open)
+        # An idle listener stops just as promptly.
+        self.serial = pyserial.serial_for_url('loop://', timeout=None)
+        listener = SerialListener(self.serial)
+        listener.start()
+        self.assertTrue(listener.stop(timeout=1))
+
+
+class RecordingSerial(object):
+    """
+    This is a stand-in for a serial port that records what's written to it.
+    """
+    port = 'recording'
+
+    def __init__(self):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+        return len(data)
+
+
+class TestSerialWriter(unittest.TestCase):
+    """
+    These test cases test the :py:class:`SerialWriter` class.
+    """
+    def setUp(self):
+        self.serial = RecordingSerial()
+
+    def test_small_messages_are_coalesced(self):
+        """
+        This test verifies that messages sent within the flush deadline go out in a single write.
+        """
+        writer = SerialWriter(self.serial, flush_deadline=0.05)
+        writer.start()
+        self.assertEqual(10, writer.send_many(b'%d' % i for i in range(10)))
+        self.assertTrue(writer.flush(2))
+        writer.terminate()
+        self.assertEqual([b'0123456789'], [bytes(w) for w in self.serial.writes])
+
+    def test_chunk_size_is_respected(self):
+        """
+        This test verifies that messages are gathered up to the chunk size (but never split), and a large message
+        goes out as it is.
+        """
+        writer = SerialWriter(self.serial, chunk_size=4)
+        big = bytearray(b'x' * 10)
+        writer.send_many([b'ab', b'cd', b'e', memoryview(big)])
+        writer.start()
+        self.assertTrue(writer.flush(2))
+        writer.terminate()
+        self.assertEqual([b'abcd', b'e', b'x' * 10], [bytes(w) for w in self.serial.writes])
+        # The large message wasn't copied on its way through.
+        self.assertIs(big, self.serial.writes[-1].obj)
+
+    def test_full_queue_pushes_back(self):
+        """
+        This test verifies that a sender is told when there's no room in the queue.
+        """
+        writer = SerialWriter(self.serial, queue_size=4)
+        self.assertTrue(writer.send(b'abcd'))
+        self.assertFalse(writer.send(b'e', timeout=0))
+        self.assertFalse(writer.send(b'e', timeout=0.01))
+        self.assertEqual(4, writer.queued)
+        writer.start()
+        self.assertTrue(writer.send(b'e', timeout=2))
+        self.assertTrue(writer.flush(2))
+        writer.terminate()
+        self.assertEqual(b'abcde', b''.join(self.serial.writes))
+
+
+class TestSerialConnection(unittest.TestCase):
+    """
+    These test cases test the :py:class:`SerialConnection` class against a loopback serial port.
+    """
+    def test_frames_are_received(self):
+        """
+        This test connects to a loopback port, writes some delimited frames and verifies they're received.
+        """
+        frames = []
+        done = threading.Event()
+
+        def handle(frame):
+            frames.append(frame)
+            if len(frames) == 3:
+                done.set()
+        connection = SerialConnection('loop://', timeout=0.05, frame_decoder=DelimitedFrameDecoder())
+        dispatcher.connect(handle, signal=SerialConnection.Signals.FRAME_RECEIVED, sender=connection)
+        self.assertTrue(connection.try_connect())
+        connection.serial.write(b'one\ntwo\nthree\n')
+        self.assertTrue(done.wait(2))
+        connection.teardown()
+        self.assertEqual([b'one', b'two', b'three'], frames)
+        self.assertIsNone(connection.serial)
+
+    def test_sent_data_is_written(self):
+        """
+        This test sends data through a loopback port and verifies it comes back.
+        """
+        frames = []
+        done = threading.Event()
+
+        def handle(frame):
+            frames.append(frame)
+            if len(frames) == 2:
+                done.set()
+        connection = SerialConnection('loop://', timeout=0.05, frame_decoder=DelimitedFrameDecoder())
+        dispatcher.connect(handle, signal=SerialConnection.Signals.FRAME_RECEIVED, sender=connection)
+        with self.assertRaises(ConnectionException):
+            connection.send(b'too soon\n')
+        self.assertTrue(connection.try_connect())
+        self.assertTrue(connection.send(b'one\n'))
+        self.assertEqual(1, connection.send_many([memoryview(b'two\n')]))
+        self.assertTrue(connection.flush(2))
+        self.assertTrue(done.wait(2))
+        connection.teardown()
+        self.assertEqual([b'one', b'two'], frames)
+
+    def test_data_events_carry_timestamps(self):
+        """
+        This test verifies data arrives with the time it was read, and that connections don't carry a ``__dict__``.
+        """
+        received = []
+        done = threading.Event()
+
+        def handle(data, timestamp):
+            received.append((data, timestamp))
+            done.set()
+        connection = SerialConnection('loop://', timeout=0.05)
+        self.assertFalse(hasattr(connection, '__dict__'))
+        dispatcher.connect(handle, signal=SerialConnection.Signals.DATA_RECEIVED, sender=connection)
+        self.assertTrue(connection.try_connect())
+        before = time.monotonic_ns()
+        connection.serial.write(b'hello')
+        self.assertTrue(done.wait(2))
+        connection.teardown()
+        (data, timestamp), = received
+        self.assertEqual(b'hello', data)
+        self.assertLessEqual(before, timestamp)
+
+    def test_shutdown_finishes_what_is_in_flight(self):
+        """
+        This test verifies a connection that's shut down writes what was sent, and passes along what was read, first.
+        """
+        frames = []
+
+        def handle(frame):
+            frames.append(frame)
+        connection = SerialConnection('loop://', frame_decoder=DelimitedFrameDecoder(), flush_deadline=0.05)
+        dispatcher.connect(handle, signal=SerialConnection.Signals.FRAME_RECEIVED, sender=connection)
+        self.assertTrue(connection.try_connect())
+        self.assertEqual(3, connection.send_many([b'one\n', b'two\n', b'three\n']))
+        self.assertTrue(connection.shutdown(timeout=2))
+        self.assertEqual([b'one', b'two', b'three'], frames)
+        self.assertIsNone(connection.serial)
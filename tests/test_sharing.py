@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import subprocess
+import sys
+import unittest
+from cnxman.sharing import SharedRingPublisher, SharedRingReader, SharedRingWriter
+from tests.test_subscriptions import TalkingConnection
+
+# This is what the other process runs:  it attaches to the ring, says so, and reports what it reads.
+READ_RING = """
+import sys
+from cnxman.sharing import SharedRingReader
+with SharedRingReader(sys.argv[1], from_start=True) as reader:
+    print('ready', flush=True)
+    print(','.join(bytes(chunk).hex() for chunk in reader), flush=True)
+"""
+
+
+class TestSharedRing(unittest.TestCase):
+    """
+    These test cases test the :py:class:`SharedRingWriter` and :py:class:`SharedRingReader` classes.
+    """
+    def setUp(self):
+        self.writer = SharedRingWriter(capacity=256)
+
+    def tearDown(self):
+        self.writer.close()
+
+    def test_chunks_are_read_in_place(self):
+        """
+        This test verifies a reader gets each chunk as a view of the shared memory, in the order they were written.
+        """
+        with SharedRingReader(self.writer.name) as reader:
+            self.assertIsNone(reader.read(timeout=0.01))
+            for chunk in (b'one', b'two', bytearray(b'three'), memoryview(b'four')):
+                self.writer.write(chunk)
+            chunk = reader.read(timeout=1)
+            self.assertIsInstance(chunk, memoryview)
+            self.assertEqual(b'one', chunk)
+            self.assertTrue(reader.intact())
+            self.assertEqual([b'two', b'three', b'four'], [bytes(reader.read(timeout=1)) for _ in range(3)])
+            self.assertEqual((0, 0), (reader.overruns, reader.lost))
+
+    def test_chunks_wrap_around_the_ring(self):
+        """
+        This test verifies a reader that keeps up gets every chunk, however many times the writer goes round.
+        """
+        with SharedRingReader(self.writer.name) as reader:
+            for n in range(100):
+                chunk = bytes([n]) * (n % 50 + 1)
+                self.writer.write(chunk)
+                self.assertEqual(chunk, reader.read(timeout=1))
+            self.assertEqual(0, reader.lost)
+
+    def test_big_chunks_are_split(self):
+        """
+        This test verifies a chunk bigger than half the ring is written in pieces.
+        """
+        with SharedRingReader(self.writer.name) as reader:
+            self.writer.write(bytes(range(200)))
+            self.assertEqual(2, self.writer.sequence)
+            self.assertEqual(bytes(range(200)), reader.read(timeout=1).tobytes() + reader.read(timeout=1).tobytes())
+
+    def test_slow_readers_are_overrun(self):
+        """
+        This test verifies a reader that falls a ring's length behind notices, counts what it lost, and picks up from
+        the newest chunk.
+        """
+        with SharedRingReader(self.writer.name) as reader:
+            self.writer.write(b'first')
+            first = reader.read(timeout=1)
+            for n in range(20):
+                self.writer.write(bytes([n]) * 32)
+            self.assertFalse(reader.intact())
+            self.assertIsNone(reader.read(timeout=0.01))
+            self.assertEqual(1, reader.overruns)
+            self.assertEqual(20, reader.lost)
+            self.writer.write(b'next')
+            self.assertEqual(b'next', reader.read(timeout=1))
+
+    def test_readers_see_the_writer_close(self):
+        """
+        This test verifies a reader finishes what's left once the writer has closed the ring.
+        """
+        reader = SharedRingReader(self.writer.name)
+        self.writer.write(b'last')
+        self.writer.close()
+        self.assertEqual([b'last'], [bytes(chunk) for chunk in reader])
+        self.assertTrue(reader.closed)
+        reader.close()
+
+    def test_other_blocks_are_refused(self):
+        """
+        This test verifies a reader won't attach to shared memory that isn't a ring.
+        """
+        self.writer._buf[:4] = b'ring'
+        with self.assertRaises(ValueError):
+            SharedRingReader(self.writer.name)
+
+    def test_other_processes_can_read(self):
+        """
+        This test verifies a reader in another process gets what the writer wrote.
+        """
+        process = subprocess.Popen([sys.executable, '-c', READ_RING, self.writer.name],
+                                   stdout=subprocess.PIPE, universal_newlines=True)
+        try:
+            self.assertEqual('ready', process.stdout.readline().strip())
+            expected = [bytes([n]) * (n + 1) for n in range(10)]
+            for chunk in expected:
+                self.writer.write(chunk)
+            self.writer.close()
+            self.assertEqual(expected, [bytes.fromhex(chunk) for chunk in process.stdout.readline().strip().split(',')])
+            self.assertEqual(0, process.wait(10))
+        finally:
+            process.stdout.close()
+            if process.poll() is None:
+                process.kill()
+
+
+class TestSharedRingPublisher(unittest.TestCase):
+    """
+    These test cases test the :py:class:`SharedRingPublisher` class.
+    """
+    def test_received_data_is_published(self):
+        """
+        This test verifies the data a connection receives is written to the ring (until the publisher is closed).
+        """
+        connection = TalkingConnection()
+        with SharedRingPublisher(connection, capacity=1024) as publisher:
+            with SharedRingReader(publisher.name) as reader:
+                connection.receive(memoryview(b'hello'))
+                self.assertEqual(b'hello', reader.read(timeout=1))
+        connection.receive(b'nobody')  # (Nobody's publishing now, so this goes nowhere.)
+
+    def test_connections_without_data(self):
+        """
+        This test verifies we can't publish a connection that doesn't send data.
+        """
+        from tests.test_basics import FlakyConnection
+        with self.assertRaises(ValueError):
+            SharedRingPublisher(FlakyConnection(failures=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import socket
+import threading
+import unittest
+from cnxman.basics import Connection, ConnectionException
+from cnxman.events import dispatcher
+from cnxman.framing import DelimitedFrameDecoder
+from cnxman.socket import SocketConnection
+from tests.test_hub import wait_for
+
+
+class LoopbackServer(object):
+    """
+    This is a server on the loopback interface that accepts one connection at a time and keeps what it receives.
+    """
+    def __init__(self):
+        self.listening = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listening.bind(('127.0.0.1', 0))
+        self.listening.listen(1)
+        self.port = self.listening.getsockname()[1]
+        self.client: socket.socket = None
+        self.received = b''
+        self._accepted = threading.Event()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        try:
+            self.client, _ = self.listening.accept()
+        except OSError:
+            return
+        self._accepted.set()
+        while True:
+            try:
+                data = self.client.recv(4096)
+            except OSError:
+                return
+            if not data:
+                return
+            self.received += data
+
+    def accepted(self, timeout: float = 2.0) -> bool:
+        return self._accepted.wait(timeout)
+
+    def close(self):
+        self.listening.close()
+        if self.client is not None:
+            try:
+                self.client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.client.close()
+
+
+class TestSocketConnection(unittest.TestCase):
+    """
+    These test cases test the :py:class:`SocketConnection` class against a loopback server.
+    """
+    def setUp(self):
+        self.server = LoopbackServer()
+        self.connection = SocketConnection('127.0.0.1', self.server.port, keepalive=True, keepalive_idle=30,
+                                           frame_decoder=DelimitedFrameDecoder())
+        self.frames = []
+        self.chunks = []
+        self.alarms = threading.Event()
+        dispatcher.connect(self._handle_frame, signal=SocketConnection.Signals.FRAME_RECEIVED, sender=self.connection)
+        dispatcher.connect(self._handle_data, signal=SocketConnection.Signals.DATA_RECEIVED, sender=self.connection)
+        dispatcher.connect(self._handle_raise_alarm, signal=Connection.Signals.RAISE_ALARM, sender=self.connection)
+
+    def tearDown(self):
+        self.connection.teardown()
+        self.server.close()
+
+    def _handle_frame(self, frame):
+        self.frames.append(frame)
+
+    def _handle_data(self, data):
+        self.chunks.append(type(data))
+
+    def _handle_raise_alarm(self):
+        self.alarms.set()
+
+    def test_frames_are_received(self):
+        """
+        This test verifies data sent by the server arrives (as views of the listener's buffer) and is framed.
+        """
+        self.assertTrue(self.connection.try_connect())
+        self.assertTrue(self.server.accepted())
+        self.server.client.sendall(b'one\ntw')
+        self.server.client.sendall(b'o\nthree\n')
+        self.assertTrue(wait_for(lambda: len(self.frames) == 3))
+        self.assertEqual([b'one', b'two', b'three'], self.frames)
+        self.assertEqual({memoryview}, set(self.chunks))
+
+    def test_sent_data_arrives(self):
+        """
+        This test verifies what we send (including several messages at once) reaches the server.
+        """
+        with self.assertRaises(ConnectionException):
+            self.connection.send(b'too soon')
+        self.assertTrue(self.connection.try_connect())
+        self.connection.send(b'one,')
+        self.connection.send_many([b'two,', bytearray(b'three,'), memoryview(b'four')])
+        self.assertTrue(wait_for(lambda: self.server.received == b'one,two,three,four'))
+
+    def test_send_more_buffers_than_one_call_takes(self):
+        """
+        This test verifies that sending more messages than one system call can gather sends them all, in order.
+        """
+        self.assertTrue(self.connection.try_connect())
+        messages = [bytes([n % 256]) for n in range(3000)]
+        self.connection.send_many(messages)
+        self.assertTrue(wait_for(lambda: self.server.received == b''.join(messages)))
+
+    def test_options_are_applied(self):
+        """
+        This test verifies the socket options we asked for are set.
+        """
+        self.assertTrue(self.connection.try_connect())
+        sock = self.connection.socket
+        self.assertTrue(sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+        self.assertTrue(sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE))
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            self.assertEqual(30, sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE))
+
+    def test_server_going_away_raises_the_alarm(self):
+        """
+        This test verifies the alarm is raised when the server closes the connection (but not when we do).
+        """
+        self.assertTrue(self.connection.try_connect())
+        self.assertTrue(self.server.accepted())
+        self.server.close()
+        self.assertTrue(self.alarms.wait(2))
+        # Once we've reconnected to a new server, disconnecting on purpose is no cause for alarm.
+        self.alarms.clear()
+        self.server = LoopbackServer()
+        self.connection = SocketConnection('127.0.0.1', self.server.port)
+        dispatcher.connect(self._handle_raise_alarm, signal=Connection.Signals.RAISE_ALARM, sender=self.connection)
+        self.assertTrue(self.connection.try_connect())
+        self.connection.disconnect()
+        self.assertFalse(self.alarms.wait(0.1))
+
+    def test_shutdown_passes_along_what_has_arrived(self):
+        """
+        This test verifies a connection that's shut down passes along the data that had already arrived (and isn't
+        alarmed about it).
+        """
+        self.assertTrue(self.connection.try_connect())
+        self.assertTrue(self.server.accepted())
+        self.server.client.sendall(b'one\ntwo\nthree\n')
+        self.assertTrue(wait_for(lambda: len(self.frames) >= 1))
+        self.assertTrue(self.connection.shutdown(timeout=2))
+        self.assertEqual([b'one', b'two', b'three'], self.frames)
+        self.assertIsNone(self.connection.socket)
+        self.assertFalse(self.alarms.is_set())
+
+    def test_nobody_listening(self):
+        """
+        This test verifies we can't connect when there's nobody to connect to.
+        """
+        # (A port we've bound but aren't listening on is a port nobody's listening on.)
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as unused:
+            unused.bind(('127.0.0.1', 0))
+            connection = SocketConnection('127.0.0.1', unused.getsockname()[1], timeout=1)
+            self.assertFalse(connection.try_connect())
+        self.assertIsNone(connection.socket)
+
+
+if __name__ == '__main__':
+    unittest.main()
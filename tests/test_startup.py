@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import subprocess
+import sys
+import unittest
+
+# This is what a fresh interpreter runs to time an import and see which modules came along with it.
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'modules': sorted(sys.modules)}}))
+"""
+
+
+def probe(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter.
+
+    :param module: the module
+    :return: how long the import took (``elapsed``) and the names of the modules that were loaded afterward
+        (``modules``)
+    """
+    output = subprocess.run([sys.executable, '-c', _PROBE.format(module=module)],
+                            check=True, stdout=subprocess.PIPE).stdout
+    return json.loads(output.decode())
+
+
+class TestStartup(unittest.TestCase):
+    """
+    These test cases keep an eye on how long it takes to import the package.
+    """
+    def test_basics_leaves_the_heavy_modules_alone(self):
+        """
+        This test verifies importing :py:mod:`cnxman.basics` doesn't import anything it can do without.
+        """
+        modules = probe('cnxman.basics')['modules']
+        for heavy in ('automat', 'serial', 'asyncio', 'concurrent.futures', 'typing', 'logging'):
+            self.assertNotIn(heavy, modules)
+
+    def test_serial_leaves_the_heavy_modules_alone(self):
+        """
+        This test verifies importing :py:mod:`cnxman.serial` waits for a connection before it imports pyserial (and
+        doesn't import the asynchronous machinery at all).
+        """
+        modules = probe('cnxman.serial')['modules']
+        for heavy in ('automat', 'serial', 'asyncio', 'concurrent.futures', 'multiprocessing'):
+            self.assertNotIn(heavy, modules)
+
+    def test_basics_imports_quickly(self):
+        """
+        This test verifies importing :py:mod:`cnxman.basics` stays within its budget.  (The budget is generous so a
+        busy machine doesn't fail the test; it's there to catch somebody putting a heavy import back at the top of a
+        module.)
+        """
+        elapsed = min(probe('cnxman.basics')['elapsed'] for _ in range(3))
+        self.assertLess(elapsed, 0.1)
+
+    def test_lazy_names_are_still_importable(self):
+        """
+        This test verifies the classes that moved can still be imported from where they used to live.
+        """
+        from cnxman.aio import AsyncSerialConnection
+        from cnxman.basics import ConnectionManager
+        from cnxman.methodical import ConnectionManager as MethodicalConnectionManager
+        from cnxman.serial import AsyncSerialConnection as SerialAsyncSerialConnection
+        self.assertIs(MethodicalConnectionManager, ConnectionManager)
+        self.assertIs(AsyncSerialConnection, SerialAsyncSerialConnection)
+
+
+if __name__ == '__main__':
+    unittest.main()
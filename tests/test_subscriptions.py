@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+import time
+import unittest
+from enum import Enum
+from cnxman.buffers import OverflowPolicy
+from cnxman.events import dispatcher, Event
+from cnxman.metrics import registry
+from tests.test_basics import FlakyConnection
+
+
+class TalkingConnection(FlakyConnection):
+    """
+    This is a connection that receives whatever it's told to.
+    """
+    class Signals(Enum):
+        DATA_RECEIVED = 'data-received'
+
+    def __init__(self):
+        super().__init__(failures=0)
+        self.event = Event(signal=TalkingConnection.Signals.DATA_RECEIVED, sender=self)
+
+    def receive(self, data):
+        self.event.data, self.event.timestamp = data, time.monotonic_ns()
+        dispatcher.send_event(self.event)
+        self.event.data = None
+
+
+class TestSubscription(unittest.TestCase):
+    """
+    These test cases test the :py:class:`Subscription` class.
+    """
+    def setUp(self):
+        self.connection = TalkingConnection()
+
+    def test_slow_subscribers_dont_hold_up_the_rest(self):
+        """
+        This test verifies a subscriber that never takes anything loses its oldest chunks, while the others get them
+        all.
+        """
+        slow = self.connection.subscribe(max_chunks=2, name='slow')
+        fast = self.connection.subscribe()
+        received = []
+        reader = threading.Thread(target=lambda: received.extend(fast))
+        reader.start()
+        for n in range(10):
+            self.connection.receive(bytes([n]))
+        fast.close()
+        reader.join(2)
+        self.assertEqual([bytes([n]) for n in range(10)], received)
+        self.assertEqual((2, 8, 8), (slow.pending, slow.dropped, slow.dropped_bytes))
+        self.assertEqual([b'\x08', b'\x09'], [slow.get(), slow.get()])
+        self.assertIsNone(slow.get(timeout=0.01))
+
+    def test_subscribers_share_one_copy(self):
+        """
+        This test verifies a view of the reader's buffer is copied once, and every subscriber gets the same copy.
+        """
+        subscriptions = [self.connection.subscribe() for _ in range(3)]
+        buffer = bytearray(b'hello')
+        self.connection.receive(memoryview(buffer))
+        buffer[:] = b'jello'  # (The reader reuses its buffer.)
+        chunks = [subscription.get(timeout=1) for subscription in subscriptions]
+        self.assertEqual(b'hello', chunks[0])
+        self.assertIs(bytes, type(chunks[0]))
+        self.assertTrue(all(chunk is chunks[0] for chunk in chunks))
+
+    def test_drop_newest(self):
+        """
+        This test verifies a subscriber whose queue is full (of bytes, in this case) can keep its oldest chunks.
+        """
+        subscription = self.connection.subscribe(max_bytes=4, policy=OverflowPolicy.DROP_NEWEST)
+        for chunk in (b'ab', b'cd', b'ef'):
+            self.connection.receive(chunk)
+        self.assertEqual((2, 4, 1), (subscription.pending, subscription.pending_bytes, subscription.dropped))
+        self.assertEqual(b'ab', subscription.get())
+        self.assertGreater(subscription.lag, 0)
+
+    def test_blocking_subscribers_hold_up_the_reader(self):
+        """
+        This test verifies the reader waits for room in the queue of a subscriber who would rather not lose anything.
+        """
+        subscription = self.connection.subscribe(max_chunks=1, policy=OverflowPolicy.BLOCK)
+        self.connection.receive(b'one')
+        writer = threading.Thread(target=self.connection.receive, args=(b'two',))
+        writer.start()
+        writer.join(0.05)
+        self.assertTrue(writer.is_alive())
+        self.assertEqual(b'one', subscription.get())
+        writer.join(2)
+        self.assertFalse(writer.is_alive())
+        self.assertEqual(b'two', subscription.get())
+        self.assertEqual((2, 0, 1), (subscription.delivered, subscription.dropped, subscription.high_water_mark))
+
+    def test_async_iteration(self):
+        """
+        This test verifies a coroutine can iterate over a subscription fed from another thread.
+        """
+        subscription = self.connection.subscribe()
+
+        def talk():
+            for chunk in (b'one', b'two', b'three'):
+                time.sleep(0.01)
+                self.connection.receive(chunk)
+            subscription.close()
+
+        async def listen():
+            threading.Thread(target=talk).start()
+            return [chunk async for chunk in subscription]
+        self.assertEqual([b'one', b'two', b'three'], asyncio.run(asyncio.wait_for(listen(), 2)))
+
+    def test_lag_is_measured(self):
+        """
+        This test verifies how long chunks wait for their subscribers is measured (and what's dropped is counted).
+        """
+        registry.clear()
+        registry.enable()
+        try:
+            subscription = self.connection.subscribe(max_chunks=1, name='measured')
+            self.connection.receive(b'dropped')
+            self.connection.receive(b'kept')
+            subscription.get()
+            snapshot = registry.snapshot()
+        finally:
+            registry.disable()
+            registry.clear()
+        labels = '{connection="TalkingConnection",subscriber="measured"}'
+        self.assertEqual(7, snapshot['counters']['cnxman_subscriber_dropped_bytes_total' + labels])
+        self.assertEqual(1, snapshot['histograms']['cnxman_subscriber_lag_seconds' + labels]['count'])
+
+    def test_connections_without_data(self):
+        """
+        This test verifies we can't subscribe to a connection that doesn't send data.
+        """
+        with self.assertRaises(ValueError):
+            FlakyConnection(failures=0).subscribe()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+import serial as pyserial
+from cnxman.buffers import RingBuffer
+from cnxman.events import dispatcher
+from cnxman.serial import SerialListener
+from cnxman.tracing import LatencyHistogram, Tracer, tracer
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """
+    These test cases test the :py:class:`LatencyHistogram` class.
+    """
+    def test_percentiles_are_precise(self):
+        """
+        This test verifies percentiles are kept to two significant figures (and small values exactly).
+        """
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(50))
+        for value in range(1, 100001):
+            histogram.record(value)
+        self.assertEqual((100000, 1, 100000), (histogram.count, histogram.min, histogram.max))
+        self.assertAlmostEqual(50000.5, histogram.mean)
+        for percentile in (1, 50, 90, 99, 99.9):
+            expected = percentile * 1000
+            self.assertAlmostEqual(expected, histogram.percentile(percentile), delta=expected / 100)
+        self.assertEqual(100000, histogram.percentile(100))
+        small = LatencyHistogram()
+        for value in (3, 7, 200):
+            small.record(value)
+        self.assertEqual([3, 7, 200], [small.percentile(p) for p in (33, 66, 100)])
+
+    def test_invalid_precision(self):
+        """
+        This test verifies a histogram can't be asked for an unreasonable number of significant figures.
+        """
+        with self.assertRaises(ValueError):
+            LatencyHistogram(significant_figures=0)
+
+
+class TestTracer(unittest.TestCase):
+    """
+    These test cases test the :py:class:`Tracer` class (and the tracing done by serial listeners).
+    """
+    def setUp(self):
+        self.serial = pyserial.serial_for_url('loop://', timeout=0.05)
+        self.received = threading.Semaphore(0)
+        tracer.clear()
+        tracer.enable(sample_rate=1)
+
+    def tearDown(self):
+        tracer.disable()
+        tracer.clear()
+        self.serial.close()
+
+    def _handle_data(self):
+        self.received.release()
+
+    def _listen(self, listener: SerialListener, chunks: int):
+        dispatcher.connect(self._handle_data, signal=SerialListener.Signals.DATA_RECEIVED, sender=listener)
+        listener.start()
+        for _ in range(chunks):
+            self.serial.write(b'x' * 10)
+            self.assertTrue(self.received.acquire(timeout=2))
+        listener.stop(timeout=1)
+
+    def test_sampling(self):
+        """
+        This test verifies only the sampled fraction of chunks is traced.
+        """
+        sampled = Tracer(sample_rate=0.25)
+        self.assertFalse(sampled.enabled)
+        traces = [sampled.begin('port', 1) for _ in range(100)]
+        self.assertEqual(25, sum(1 for trace in traces if trace is not None))
+        with self.assertRaises(ValueError):
+            sampled.sample_rate = 0
+
+    def test_chunks_are_traced_to_their_handlers(self):
+        """
+        This test verifies the chunks a listener reads are traced from the read until the handlers are finished, and
+        the traces can be exported.
+        """
+        self._listen(SerialListener(self.serial), chunks=5)
+        histograms = tracer.histograms('loop://')
+        self.assertEqual({'read-dispatch', 'dispatch-handled', 'read-handled'}, set(histograms))
+        self.assertEqual(5, histograms['read-handled'].count)
+        self.assertEqual(5, tracer.summary()['loop://']['read-handled']['count'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.json')
+            tracer.export(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                events = json.load(f)['traceEvents']
+        spans = [event for event in events if event['ph'] == 'X']
+        self.assertEqual(10, len(spans))
+        self.assertTrue(all(span['args']['bytes'] == 10 for span in spans))
+        self.assertIn({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1, 'args': {'name': 'loop://'}}, events)
+
+    def test_buffered_chunks_are_traced_through_the_buffer(self):
+        """
+        This test verifies a chunk that goes through a listener's buffer is traced on both sides of it.
+        """
+        self._listen(SerialListener(self.serial, buffer=RingBuffer(4096)), chunks=5)
+        histograms = tracer.histograms('loop://')
+        self.assertEqual({'read-enqueue', 'enqueue-dispatch', 'dispatch-handled', 'read-handled'}, set(histograms))
+        self.assertEqual(5, histograms['read-handled'].count)
+
+    def test_nothing_is_traced_when_disabled(self):
+        """
+        This test verifies a disabled tracer leaves the chunks alone.
+        """
+        tracer.disable()
+        self._listen(SerialListener(self.serial), chunks=2)
+        self.assertEqual({}, tracer.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()